@@ -0,0 +1,291 @@
+"""
+Single-threaded acquisition hub for all serial devices.
+
+Instead of one blocking reader thread (or one blocking open) per Arduino, the
+hub owns every port and runs them from one asyncio event loop. Ports are opened
+non-blocking and registered with loop.add_reader(), so the process sleeps in
+select() until any device has bytes and no thread spins on a readline timeout.
+
+Every parsed frame is stamped with one host clock (time.monotonic()) at the
+moment its bytes arrived, which makes samples from different Arduinos directly
+comparable, and is published to any number of subscribers (logger, filter,
+renderer) through bounded asyncio queues or plain callbacks.
+
+Example:
+    hub = AcquisitionHub(default_devices())
+    frames = hub.subscribe()
+
+    async def consume():
+        while True:
+            frame = await frames.get()
+            print(frame.device, frame.t, frame.values)
+
+    asyncio.run(hub.run(consume()))
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import namedtuple
+
+import serial
+
+# One parsed sample from one device. t is time.monotonic() at byte arrival,
+# seq counts frames per device starting at 0.
+Frame = namedtuple('Frame', ['device', 't', 'seq', 'values'])
+
+
+class SerialDevice:
+    """
+    Description of one serial device owned by the hub.
+
+    Parameters:
+        name (str): Name used in published frames (e.g. 'imu', 'flex').
+        port (str): Serial port path.
+        baud_rate (int): Baud rate.
+        parse (callable): Maps one decoded text line to a tuple of values, or
+            None if the line is not a valid sample.
+        decoder (object): Optional imu_protocol.FrameDecoder-like object for
+            binary streams. When given, parse is ignored and every decoded
+            frame is published.
+        frame_rows (callable): Optional; maps the decoder's output to an
+            iterable of value tuples (e.g. imu_protocol.frames_to_rows).
+        settle_time (float): Seconds to wait after opening for the board to
+            reset. All devices settle concurrently.
+    """
+
+    def __init__(self, name, port, baud_rate, parse=None, decoder=None, frame_rows=None,
+                 settle_time=2.0):
+        self.name = name
+        self.port = port
+        self.baud_rate = baud_rate
+        self.parse = parse
+        self.decoder = decoder
+        self.frame_rows = frame_rows
+        self.settle_time = settle_time
+
+        self.serial = None
+        self._partial = b''
+        self.seq = 0
+        self.bytes_received = 0
+        self.parse_errors = 0
+
+
+class AcquisitionHub:
+    def __init__(self, devices, poll_interval=0.002):
+        """
+        Parameters:
+            devices (list): SerialDevice instances.
+            poll_interval (float): Only used on event loops without
+                add_reader() support (Windows), where ports are polled.
+        """
+        self.devices = {device.name: device for device in devices}
+        self.poll_interval = poll_interval
+        self._queues = []
+        self._callbacks = []
+        self._loop = None
+        self._poll_tasks = []
+        self._stopped = None
+
+    # ——— subscribers ———
+    def subscribe(self, devices=None, maxsize=1024):
+        """
+        Returns an asyncio.Queue that receives Frame objects.
+
+        Parameters:
+            devices (iterable): Only deliver frames from these device names
+                (default: all devices).
+            maxsize (int): Queue bound; when a slow subscriber falls behind,
+                its oldest frame is dropped so the hub never blocks.
+        """
+        queue = asyncio.Queue(maxsize=maxsize)
+        queue.dropped = 0
+        wanted = None if devices is None else set(devices)
+        self._queues.append((wanted, queue))
+        return queue
+
+    def add_callback(self, callback, devices=None):
+        """Registers callback(frame), called on the event loop for every frame."""
+        wanted = None if devices is None else set(devices)
+        self._callbacks.append((wanted, callback))
+
+    def _publish(self, frame):
+        for wanted, queue in self._queues:
+            if wanted is not None and frame.device not in wanted:
+                continue
+            if queue.full():
+                queue.get_nowait()
+                queue.dropped += 1
+            queue.put_nowait(frame)
+        for wanted, callback in self._callbacks:
+            if wanted is None or frame.device in wanted:
+                callback(frame)
+
+    # ——— reading ———
+    def _on_readable(self, device):
+        try:
+            data = device.serial.read(device.serial.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            print(f"[{device.name} Serial error] {e}")
+            self._close_device(device)
+            return
+        if data:
+            self._handle_bytes(device, data, time.monotonic())
+
+    def _handle_bytes(self, device, data, t):
+        device.bytes_received += len(data)
+
+        if device.decoder is not None:
+            frames = device.decoder.feed(data)
+            device.parse_errors = device.decoder.bad_frames
+            if len(frames):
+                rows = device.frame_rows(frames) if device.frame_rows else frames
+                for values in rows:
+                    self._publish(Frame(device.name, t, device.seq, values))
+                    device.seq += 1
+            return
+
+        lines = (device._partial + data).split(b'\n')
+        device._partial = lines.pop()
+        for raw in lines:
+            line = raw.decode('utf-8', errors="ignore").strip()
+            if not line:
+                continue
+            values = device.parse(line)
+            if values is None:
+                device.parse_errors += 1
+                continue
+            self._publish(Frame(device.name, t, device.seq, values))
+            device.seq += 1
+
+    async def _poll_device(self, device):
+        # Fallback for event loops without add_reader (e.g. Windows Proactor)
+        while device.serial is not None:
+            if device.serial.in_waiting:
+                self._on_readable(device)
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(self.poll_interval)
+
+    # ——— lifecycle ———
+    async def start(self):
+        """Opens every port and starts reading them on the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+
+        for device in self.devices.values():
+            device.serial = serial.Serial(device.port, device.baud_rate, timeout=0)
+
+        # Let every board reset at the same time rather than one after another
+        settle = max((d.settle_time for d in self.devices.values()), default=0)
+        if settle:
+            await asyncio.sleep(settle)
+
+        for device in self.devices.values():
+            device.serial.reset_input_buffer()
+            try:
+                self._loop.add_reader(device.serial.fileno(), self._on_readable, device)
+            except (NotImplementedError, AttributeError):
+                self._poll_tasks.append(asyncio.ensure_future(self._poll_device(device)))
+
+    def _close_device(self, device):
+        if device.serial is None:
+            return
+        try:
+            self._loop.remove_reader(device.serial.fileno())
+        except (NotImplementedError, AttributeError, ValueError, serial.SerialException):
+            pass
+        device.serial.close()
+        device.serial = None
+
+    def stop(self):
+        """Stops reading and closes every port."""
+        for device in self.devices.values():
+            self._close_device(device)
+        for task in self._poll_tasks:
+            task.cancel()
+        self._poll_tasks = []
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run(self, *consumers):
+        """
+        Starts the hub, runs the given consumer coroutines alongside it and
+        stops when they finish (or forever if none are given, until stop()).
+        """
+        await self.start()
+        try:
+            if consumers:
+                await asyncio.gather(*consumers)
+            else:
+                await self._stopped.wait()
+        finally:
+            self.stop()
+
+    def stats(self):
+        """Per-device counters: frames, bytes and parse errors."""
+        return {name: {'frames': d.seq, 'bytes': d.bytes_received, 'parse_errors': d.parse_errors}
+                for name, d in self.devices.items()}
+
+
+def default_devices(imu_port='COM6', flex_port='/dev/arduino_flex',
+                    sheet_port='/dev/arduino_conductive', binary_imu=False):
+    """
+    The three Arduinos used by the simulator, with the same ports, baud rates
+    and parsers as imu_reader, force_reader_threading and
+    conductive_reader_threading. Binary IMU frames carry a tenth value, the
+    device timestamp in seconds.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    for folder in ('imu', 'force_sensing'):
+        path = os.path.join(here, folder)
+        if path not in sys.path:
+            sys.path.append(path)
+
+    import conductive_reader_threading
+    import force_reader_threading
+    from imu_reader import try_parse
+
+    def parse_flex(line):
+        dire = force_reader_threading.parse(line)
+        if not dire:
+            return None
+        return (dire.get("North", 0.0), dire.get("South", 0.0),
+                dire.get("East", 0.0), dire.get("West", 0.0))
+
+    def parse_sheet(line):
+        parsed = conductive_reader_threading.parse(line)
+        if not parsed:
+            return None
+        return tuple(parsed.get(i, 0.0) for i in range(15))
+
+    if binary_imu:
+        import numpy as np
+        from imu_protocol import FrameDecoder, frames_to_rows
+        # Nine values in parse() order, then the unwrapped device time (s)
+        imu = SerialDevice('imu', imu_port, 115200, decoder=FrameDecoder(),
+                           frame_rows=lambda frames: map(tuple, np.column_stack(
+                               (frames_to_rows(frames), frames['t'])).tolist()))
+    else:
+        imu = SerialDevice('imu', imu_port, 115200, parse=try_parse)
+
+    return [
+        imu,
+        SerialDevice('flex', flex_port, 9600, parse=parse_flex),
+        SerialDevice('sheet', sheet_port, 115200, parse=parse_sheet),
+    ]
+
+
+async def print_frames(hub):
+    frames = hub.subscribe()
+    while True:
+        frame = await frames.get()
+        print(f"{frame.t:.4f} {frame.device:>5} #{frame.seq}: {frame.values}")
+
+
+if __name__ == "__main__":
+    hub = AcquisitionHub(default_devices())
+    try:
+        asyncio.run(hub.run(print_frames(hub)))
+    except KeyboardInterrupt:
+        print(hub.stats())
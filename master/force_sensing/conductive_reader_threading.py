@@ -2,11 +2,16 @@ import serial
 import time
 import re
 from threading import Thread
+from snapshot import Snapshot
 
 # Regex pattern to parse "Raw: 512  V: 2.502  %: 45.3"
 pattern = re.compile(r"Rel(\d+):\s*([\d.]+)")
 
-latest_sheet = [0.0] * 15
+# Latest 15 sheet values with sequence number and timestamp
+sheet = Snapshot([0.0] * 15)
+
+# Extra stream_policy consumers (logger queues, decimated UI feeds, ...)
+consumers = []
 
 stop_flag = False 
 
@@ -16,8 +21,7 @@ def parse(data: str):
 
 
 def serial_loop(port='/dev/arduino_conductive', baud_rate=115200):
-    """ Continuously read serial and update latest_sheet """
-    global latest_sheet, stop_flag
+    """ Continuously read serial and publish to sheet """
     try:
         with serial.Serial(port, baud_rate, timeout=0.01) as arduino:
             time.sleep(2)
@@ -27,9 +31,17 @@ def serial_loop(port='/dev/arduino_conductive', baud_rate=115200):
                     continue
                 parsed = parse(inline)
                 if parsed:
-                    latest_sheet = [parsed.get(i, 0.0) for i in range(15)]
+                    values = [parsed.get(i, 0.0) for i in range(15)]
+                    sheet.publish(values)
+                    t = time.monotonic()
+                    for consumer in consumers:
+                        consumer.put(values, t)
     except Exception as e:
         print(f"[Sheet Serial error] {e}")
+    finally:
+        # Release frames a policy is still holding (e.g. a partial Decimate group)
+        for consumer in consumers:
+            consumer.flush()
 
 
 def start_serial_thread(port='/dev/arduino_conductive', baud_rate=115200):
@@ -43,18 +55,40 @@ def start_serial_thread(port='/dev/arduino_conductive', baud_rate=115200):
 
 def get_latest_sheet():
     """ Get the most recent conductive sheet values (raw, voltage, percent) """
-    return latest_sheet
+    return sheet.get().values
+
+
+def get_sheet_snapshot():
+    """ Get the latest sheet values as (seq, t, values) """
+    return sheet.get()
+
+
+def wait_for_sheet(seq, timeout=None):
+    """ Block until sheet values newer than seq arrive; None on timeout """
+    return sheet.wait_newer(seq, timeout)
 
 
 def stop_serial_thread():
     """ Signal the serial loop to stop """
     global stop_flag
     stop_flag = True
+
+def add_consumer(policy):
+    """ Deliver every frame to a stream_policy (e.g. DropOldestQueue, Decimate) as well """
+    consumers.append(policy)
+    return policy
+
+def remove_consumer(policy):
+    consumers.remove(policy)
     
 def scan_angles():
+    seq = 0
     while True:
-        print(latest_sheet)
-        time.sleep(0.2)
+        snap = wait_for_sheet(seq, timeout=1.0)
+        if snap is None:
+            continue
+        seq = snap.seq
+        print(snap.values)
 
 if __name__ == "__main__":
     start_serial_thread()
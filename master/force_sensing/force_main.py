@@ -1,55 +1,61 @@
-from force_reader_threading import get_latest_angles, start_serial_thread as start_force_thread, stop_serial_thread as stop_force_thread
+from force_reader_threading import add_consumer as add_flex_consumer, start_serial_thread as start_force_thread, stop_serial_thread as stop_force_thread
 from quadrant_detection import determine_quadrant
-from conductive_reader_threading import get_latest_sheet, start_serial_thread as start_conductive_thread, stop_serial_thread as stop_conductive_thread
+from conductive_reader_threading import get_latest_sheet, add_consumer as add_sheet_consumer, start_serial_thread as start_conductive_thread, stop_serial_thread as stop_conductive_thread
+from stream_policy import DropOldestQueue
+from session_recorder import SessionRecorder, export_csv
 import time
 import os
-import shutil
-import csv
+
+# Durability: frames reach disk after at most FLUSH_FRAMES frames or FLUSH_SECONDS
+FLUSH_FRAMES = 2000
+FLUSH_SECONDS = 5.0
+
+# The logger gets every flex and every sheet frame, not just the latest ones
+flex_log = add_flex_consumer(DropOldestQueue(maxsize=10000))
+sheet_log = add_sheet_consumer(DropOldestQueue(maxsize=10000))
 
 start_force_thread()
 start_conductive_thread()
 
-def store_data(file_path, name):
+def store_data(session_dir, name):
+    """ Appends the session to bootcamp_data/<name>/quadrant_log.csv and force_log.csv """
     directory_path = "bootcamp_data/" + name
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
-    
-    shutil.move(file_path, os.path.join(directory_path, os.path.basename(file_path)))
-    
-
-def scan_angles():
-    new_file_1 = not os.path.exists("quadrant_log.csv")
-    new_file_2 = not os.path.exists("force_log.csv")
 
-    with open("quadrant_log.csv", "a", newline='') as f1, open("force_log.csv", "a", newline='') as f2:
-        quadrant_writer = csv.writer(f1)
-        force_writer = csv.writer(f2)
-
-        if new_file_1:
-            quadrant_writer.writerow(["timestamp", "quadrant", "bend_angle", "N", "S", "E", "W"])
-        if new_file_2:
-            force_writer.writerow(["timestamp", "force_Array"])
+    export_csv(session_dir, directory_path)
+    
 
-        while True:
-            n, s, e, w = get_latest_angles()
-            latest_sheet = get_latest_sheet()
+def scan_angles(recorder):
+    quadrant = None
+    while True:
+        # Chunks go to disk on the recorder's thread; this loop only copies
+        # frames into its buffers
+        frames = flex_log.get_all(timeout=0.5)
+        sheets = sheet_log.get_all(timeout=0)
+        # Stamp each frame with its arrival time on the wall clock
+        offset = time.time() - time.monotonic()
+        for snap in frames:
+            n, s, e, w = snap.values
             quadrant = determine_quadrant(n, s, e, w)
-            timestamp = time.time()
-
-            print(quadrant)
-            print(latest_sheet)
-            quadrant_writer.writerow([timestamp, quadrant, n, s, e, w])
-            force_writer.writerow([timestamp, *latest_sheet])
-            f1.flush()
-            f2.flush()
-
-            time.sleep(0.5)
+            recorder.record('quadrant', (snap.t + offset, quadrant, n, s, e, w))
+        for snap in sheets:
+            recorder.record('sheet', (snap.t + offset, snap.values))
+
+        print(quadrant)
+        print(get_latest_sheet())
+        if flex_log.dropped or sheet_log.dropped:
+            print(f"[log] {flex_log.dropped} flex / {sheet_log.dropped} sheet frames dropped")
         
 
 if __name__ == "__main__":
     ID = "f1"
+    session_dir = os.path.join("bootcamp_data", ID, time.strftime("session_%Y%m%d_%H%M%S"))
+    recorder = SessionRecorder(session_dir, flush_frames=FLUSH_FRAMES, flush_interval=FLUSH_SECONDS)
     try:
-        scan_angles()
+        scan_angles(recorder)
     except KeyboardInterrupt:
-        store_data("quadrant_log.csv", ID)
-        store_data("force_log.csv", ID)
+        pass
+    finally:
+        recorder.close()
+        store_data(session_dir, ID)
@@ -2,22 +2,28 @@ import serial
 import time
 import re
 from quadrant_detection import determine_quadrant
+from snapshot import Snapshot
 from threading import Thread, Lock
 
 pattern = re.compile(r"(\w+):(-?\d+(?:\.\d+)?)")
 
-latest_angles = (0.0, 0.0, 0.0, 0.0)
+# Latest (north, south, east, west) with sequence number and timestamp
+angles = Snapshot((0.0, 0.0, 0.0, 0.0))
+
+# Extra stream_policy consumers (logger queues, decimated UI feeds, ...)
+consumers = []
+
+stop_flag = False
 
 def parse(data: str):
     matches = pattern.findall(data)
     return {d: float(v) for d, v in matches}
 
 def serial_loop(port='/dev/arduino_flex', baud_rate=9600):
-    """ Continuously read serial and update latest_angles """
-    global latest_angles, stop_flag
+    """ Continuously read serial and publish to angles """
     try:
         with serial.Serial(port, baud_rate, timeout=0.5) as arduino:
-            while True:
+            while not stop_flag:
                 inline = arduino.readline().decode('utf-8', errors="ignore").strip()
                 #print(inline)
                 #time.sleep(0.2)
@@ -29,29 +35,59 @@ def serial_loop(port='/dev/arduino_flex', baud_rate=9600):
                     south = dire.get("South", 0.0)
                     east = dire.get("East", 0.0)
                     west = dire.get("West",0.0)
-            
-                    latest_angles = (north, south, east, west)
+
+                    values = (north, south, east, west)
+                    angles.publish(values)
+                    t = time.monotonic()
+                    for consumer in consumers:
+                        consumer.put(values, t)
     except Exception as e:
         print(f"[Serial error] {e}")
+    finally:
+        # Release frames a policy is still holding (e.g. a partial Decimate group)
+        for consumer in consumers:
+            consumer.flush()
 
 def start_serial_thread(port='/dev/arduino_flex', baud_rate=9600):
+    global stop_flag
+    stop_flag = False
     thread = Thread(target=serial_loop, args=(port, baud_rate), daemon=True)
     thread.start()
     return thread
 
 def get_latest_angles():
-    return latest_angles
+    return angles.get().values
+
+def get_angles_snapshot():
+    """ Get the latest angles as (seq, t, values) """
+    return angles.get()
+
+def wait_for_angles(seq, timeout=None):
+    """ Block until angles newer than seq arrive; None on timeout """
+    return angles.wait_newer(seq, timeout)
 
 def stop_serial_thread():
     """ Signal the serial loop to stop """
     global stop_flag
     stop_flag = True
+
+def add_consumer(policy):
+    """ Deliver every frame to a stream_policy (e.g. DropOldestQueue, Decimate) as well """
+    consumers.append(policy)
+    return policy
+
+def remove_consumer(policy):
+    consumers.remove(policy)
 def scan_angles():
+    seq = 0
     while True:
-        n,s,e,w = get_latest_angles()
+        snap = wait_for_angles(seq, timeout=1.0)
+        if snap is None:
+            continue
+        seq = snap.seq
+        n,s,e,w = snap.values
         quadrant = determine_quadrant(n,s,e,w)
         print(n,s,e,w, quadrant)
-        time.sleep(0.2)
 
 if __name__ == "__main__":
     start_serial_thread()
@@ -0,0 +1,338 @@
+"""
+Buffered, columnar session recording for the force sensing boards.
+
+force_main used to write one CSV row per frame to two files and flush both on
+every loop iteration, formatting each of the 15 sheet readings as text. A
+SessionRecorder instead appends frames to preallocated NumPy buffers (one per
+stream, with a structured dtype) and hands full buffers to a background
+thread. That thread writes each chunk as one compressed NPZ file with one
+array per column:
+
+    <session>/<stream>_00000.npz, <stream>_00001.npz, ...
+
+so logging costs one tuple assignment per frame on the reader side and one
+file write per chunk. Durability is set by flush_frames (a chunk is cut after
+that many frames) and flush_interval (or after that many seconds, whichever
+comes first). Chunks are written to a temporary name and renamed, so a crash
+loses at most the unflushed frames and never leaves a half-written chunk.
+
+Example:
+    with SessionRecorder('bootcamp_data/f1/session_01', SESSION_STREAMS) as recorder:
+        recorder.record('quadrant', (t, quadrant, n, s, e, w))
+        recorder.record('sheet', (t, values))
+
+    session = load_session('bootcamp_data/f1/session_01')
+    session['sheet']['values']        # (N, 15)
+    export_csv('bootcamp_data/f1/session_01', 'bootcamp_data/f1')   # legacy CSVs
+
+Usage:
+    python session_recorder.py SESSION_DIR [OUT_DIR]    # export the legacy CSVs
+    python session_recorder.py --bench                  # compare with per-row CSV
+"""
+import csv
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+QUADRANT_DTYPE = np.dtype([('timestamp', 'f8'), ('quadrant', 'U10'),
+                           ('N', 'f8'), ('S', 'f8'), ('E', 'f8'), ('W', 'f8')])
+SHEET_DTYPE = np.dtype([('timestamp', 'f8'), ('values', 'f8', (15,))])
+
+# Streams force_main records: every flex frame and every conductive sheet frame
+SESSION_STREAMS = {'quadrant': QUADRANT_DTYPE, 'sheet': SHEET_DTYPE}
+
+# <stream>_<index>.npz, index zero-padded to at least five digits
+_CHUNK_NAME = re.compile(r'(.+)_(\d{5,})\.npz')
+
+
+def _chunk_paths(directory):
+    """Stream name -> chunk file paths in index order."""
+    chunks = {}
+    for entry in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = _CHUNK_NAME.fullmatch(entry)
+        if match:
+            chunks.setdefault(match.group(1), []).append((int(match.group(2)), entry))
+    return {name: [os.path.join(directory, entry) for _, entry in sorted(found)]
+            for name, found in chunks.items()}
+
+
+class SessionRecorder:
+    def __init__(self, directory, streams=SESSION_STREAMS, flush_frames=2000, flush_interval=5.0,
+                 compress=True):
+        """
+        Parameters:
+            directory (str): Session folder (created if missing).
+            streams (dict): Stream name -> structured dtype of one frame.
+            flush_frames (int): Frames per chunk; a stream is written out once
+                it has buffered this many.
+            flush_interval (float): Longest time (s) a frame may stay unwritten.
+                None flushes on flush_frames and close() only.
+            compress (bool): np.savez_compressed instead of np.savez.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.dtypes = dict(streams)
+        self.flush_frames = flush_frames
+        self.flush_interval = flush_interval
+        self._save = np.savez_compressed if compress else np.savez
+
+        self._lock = threading.Lock()
+        self._buffers = {name: np.empty(flush_frames, dtype) for name, dtype in self.dtypes.items()}
+        self._counts = dict.fromkeys(self.dtypes, 0)
+        existing = _chunk_paths(directory)
+        self._chunks = {name: len(existing.get(name, ())) for name in self.dtypes}
+        self._last_flush = time.monotonic()
+
+        self.frames = dict.fromkeys(self.dtypes, 0)
+        self.chunks_written = 0
+        self.bytes_written = 0
+        self.write_time = 0.0
+        self.error = None
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    # ——— reader side ———
+    def record(self, stream, frame):
+        """Appends one frame (a tuple in the stream's field order)."""
+        with self._lock:
+            self._check_open()
+            i = self._counts[stream]
+            self._buffers[stream][i] = frame
+            self._counts[stream] = i + 1
+            self.frames[stream] += 1
+            if i + 1 == self.flush_frames:
+                self._cut(stream)
+
+    def record_many(self, stream, frames):
+        """Appends a structured array (or list of tuples) of frames."""
+        frames = np.asarray(frames, dtype=self.dtypes[stream])
+        start = 0
+        while start < len(frames):
+            with self._lock:
+                self._check_open()
+                i = self._counts[stream]
+                n = min(self.flush_frames - i, len(frames) - start)
+                self._buffers[stream][i:i + n] = frames[start:start + n]
+                self._counts[stream] = i + n
+                self.frames[stream] += n
+                if i + n == self.flush_frames:
+                    self._cut(stream)
+            start += n
+
+    def flush(self):
+        """Queues every buffered frame for writing (does not wait for the write)."""
+        with self._lock:
+            for stream in self.dtypes:
+                self._cut(stream)
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        """Writes everything still buffered and stops the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            # Under the lock, so no frame can slip in after the last cut
+            self._closed = True
+            for stream in self.dtypes:
+                self._cut(stream)
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError("SessionRecorder is closed")
+
+    def _cut(self, stream):
+        # Called with the lock held: hand the filled part over, start a new buffer
+        n = self._counts[stream]
+        if n == 0:
+            return
+        chunk = self._buffers[stream][:n]
+        self._buffers[stream] = np.empty(self.flush_frames, self.dtypes[stream])
+        self._counts[stream] = 0
+        index = self._chunks[stream]
+        self._chunks[stream] = index + 1
+        self._queue.put((stream, index, chunk))
+
+    # ——— writer thread ———
+    def _writer(self):
+        interval = self.flush_interval
+        while True:
+            timeout = None if interval is None else max(0.0, self._last_flush + interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            # Time-based flush of whatever is buffered, even while chunks keep coming
+            if interval is not None and not self._closed and time.monotonic() - self._last_flush >= interval:
+                self.flush()
+            if item is False:
+                continue
+            if item is None:
+                return
+            stream, index, chunk = item
+            try:
+                self._write(stream, index, chunk)
+            except Exception as e:
+                print(f"[session recorder] {e}")
+                self.error = e
+
+    def _write(self, stream, index, chunk):
+        t0 = time.perf_counter()
+        path = os.path.join(self.directory, f'{stream}_{index:05d}.npz')
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            self._save(f, **{name: chunk[name] for name in chunk.dtype.names})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.bytes_written += os.path.getsize(path)
+        self.chunks_written += 1
+        self.write_time += time.perf_counter() - t0
+
+    def stats(self):
+        pending = sum(self._counts.values())
+        return {'frames': dict(self.frames), 'buffered': pending, 'queued': self._queue.qsize(),
+                'chunks': self.chunks_written, 'bytes': self.bytes_written,
+                'write_ms': self.write_time * 1e3}
+
+
+def load_session(directory, streams=None):
+    """
+    Reads a session back.
+
+    Returns:
+        dict: Stream name -> structured array of every frame, in order.
+    """
+    out = {}
+    paths = _chunk_paths(directory)
+    for name in streams or sorted(paths):
+        chunks = []
+        for path in paths.get(name, ()):
+            with np.load(path) as npz:
+                columns = {k: npz[k] for k in npz.files}
+            dtype = np.dtype([(k, v.dtype, v.shape[1:]) for k, v in columns.items()])
+            chunk = np.empty(len(next(iter(columns.values()))), dtype)
+            for k, v in columns.items():
+                chunk[k] = v
+            chunks.append(chunk)
+        if chunks:
+            out[name] = np.concatenate(chunks)
+    return out
+
+
+def export_csv(directory, out_dir=None):
+    """
+    Writes a session as the CSVs force_main used to produce, appending to
+    existing files like before: quadrant_log.csv (one row per flex frame) and
+    force_log.csv (each flex frame's timestamp with the sheet values last
+    received at that time, as get_latest_sheet() gave them).
+
+    Returns:
+        list: Paths written.
+    """
+    out_dir = out_dir or directory
+    os.makedirs(out_dir, exist_ok=True)
+    session = load_session(directory)
+    quadrant = session.get('quadrant', np.empty(0, QUADRANT_DTYPE))
+    sheet = session.get('sheet', np.empty(0, SHEET_DTYPE))
+
+    t = quadrant['timestamp']
+    # Latest sheet frame at or before each flex frame; zeros before the first
+    latest = np.searchsorted(sheet['timestamp'], t, side='right') - 1
+    values = np.zeros((len(t), 15))
+    has_sheet = latest >= 0
+    values[has_sheet] = sheet['values'][latest[has_sheet]]
+
+    quadrant_path = os.path.join(out_dir, 'quadrant_log.csv')
+    force_path = os.path.join(out_dir, 'force_log.csv')
+    new_1 = not os.path.exists(quadrant_path)
+    new_2 = not os.path.exists(force_path)
+    with open(quadrant_path, 'a', newline='') as f1, open(force_path, 'a', newline='') as f2:
+        quadrant_writer = csv.writer(f1)
+        force_writer = csv.writer(f2)
+        if new_1:
+            quadrant_writer.writerow(["timestamp", "quadrant", "bend_angle", "N", "S", "E", "W"])
+        if new_2:
+            force_writer.writerow(["timestamp", "force_Array"])
+        quadrant_writer.writerows(zip(t.tolist(), quadrant['quadrant'].tolist(), quadrant['N'].tolist(),
+                                      quadrant['S'].tolist(), quadrant['E'].tolist(), quadrant['W'].tolist()))
+        force_writer.writerows([ts, *v] for ts, v in zip(t.tolist(), values.tolist()))
+    return [quadrant_path, force_path]
+
+
+def _benchmark(n=100000, batch=10):
+    """Per-row CSV writes with a flush per batch (old force_main) vs SessionRecorder."""
+    import shutil
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    angles = rng.normal(scale=20, size=(n, 4)).tolist()
+    sheet = rng.random((n, 15)).tolist()
+    t = (time.time() + np.arange(n) * 0.001).tolist()
+    tmp = tempfile.mkdtemp()
+    try:
+        t0 = time.perf_counter()
+        with open(os.path.join(tmp, 'q.csv'), 'w', newline='') as f1, \
+                open(os.path.join(tmp, 'f.csv'), 'w', newline='') as f2:
+            w1, w2 = csv.writer(f1), csv.writer(f2)
+            for i in range(n):
+                w1.writerow([t[i], "Center", *angles[i]])
+                w2.writerow([t[i], *sheet[i]])
+                if i % batch == batch - 1:
+                    f1.flush()
+                    f2.flush()
+        t_csv = time.perf_counter() - t0
+        csv_bytes = sum(os.path.getsize(os.path.join(tmp, p)) for p in ('q.csv', 'f.csv'))
+
+        session = os.path.join(tmp, 'session')
+        t0 = time.perf_counter()
+        recorder = SessionRecorder(session, flush_frames=2000, flush_interval=1.0)
+        for i in range(n):
+            recorder.record('quadrant', (t[i], "Center", *angles[i]))
+            recorder.record('sheet', (t[i], sheet[i]))
+        t_record = time.perf_counter() - t0
+        recorder.close()
+        t_total = time.perf_counter() - t0
+        stats = recorder.stats()
+
+        loaded = load_session(session)
+        same = (np.array_equal(loaded['sheet']['values'], sheet) and
+                np.array_equal(loaded['quadrant']['timestamp'], t))
+    finally:
+        shutil.rmtree(tmp)
+
+    print(f"{n} flex + {n} sheet frames")
+    print(f"per-row CSV, flush every {batch} frames: {t_csv * 1e3:8.1f} ms, "
+          f"{n // batch * 2} flushes, {csv_bytes / 1e6:.1f} MB")
+    print(f"SessionRecorder:                  {t_record * 1e3:8.1f} ms in record(), "
+          f"{t_total * 1e3:.1f} ms including the last write; {stats['chunks']} chunks, "
+          f"{stats['bytes'] / 1e6:.1f} MB, {stats['write_ms']:.1f} ms on the writer thread")
+    print(f"round trip exact: {same}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+    elif sys.argv[1] == '--bench':
+        _benchmark()
+    else:
+        for path in export_csv(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None):
+            print(path)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import namedtuple
+
+# seq increases by one on every publish (0 means "initial value, nothing
+# received yet"); t is time.monotonic() when the value was published.
+SnapshotValue = namedtuple('SnapshotValue', ['seq', 't', 'values'])
+
+
+class Snapshot:
+    """
+    Latest-value channel shared between a reader thread and its consumers.
+
+    The reader calls publish() for every parsed frame; consumers call get()
+    for the current value or wait_newer() to block until a value newer than
+    the one they already have arrives, instead of polling on a fixed sleep.
+
+    Example:
+        seq = 0
+        while True:
+            snap = angles.wait_newer(seq, timeout=0.5)
+            if snap is None:
+                continue  # no new data within the timeout
+            seq = snap.seq
+            n, s, e, w = snap.values
+    """
+
+    def __init__(self, initial):
+        self._cond = threading.Condition()
+        self._value = SnapshotValue(0, time.monotonic(), initial)
+
+    def publish(self, values):
+        """Stores a new value and wakes every waiting consumer."""
+        with self._cond:
+            self._value = SnapshotValue(self._value.seq + 1, time.monotonic(), values)
+            self._cond.notify_all()
+
+    def get(self):
+        """Returns the current SnapshotValue without blocking."""
+        return self._value
+
+    @property
+    def seq(self):
+        return self._value.seq
+
+    def wait_newer(self, seq, timeout=None):
+        """
+        Blocks until a value with a sequence number greater than seq has been
+        published.
+
+        Parameters:
+            seq (int): Sequence number the caller has already seen.
+            timeout (float): Maximum seconds to wait (None waits forever).
+
+        Returns:
+            SnapshotValue, or None if the timeout expired first.
+        """
+        with self._cond:
+            if self._cond.wait_for(lambda: self._value.seq > seq, timeout):
+                return self._value
+            return None
+
+    def age(self):
+        """Seconds since the current value was published."""
+        return time.monotonic() - self._value.t
@@ -0,0 +1,222 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+from snapshot import SnapshotValue
+
+
+class StreamPolicy(ABC):
+    """
+    Delivery policy between a reader thread and one consumer.
+
+    The reader calls put() for every parsed frame; the consumer calls get()
+    for one frame or get_all() for everything pending, both blocking up to a
+    timeout. Frames are SnapshotValue(seq, t, values), where seq counts the
+    frames the reader has put, so gaps show exactly what was skipped. When
+    its stream stops the reader calls flush() to release anything a policy
+    is still holding back.
+
+    Counters (see stats()):
+        received   frames put by the reader
+        delivered  frames handed to the consumer
+        dropped    frames discarded because the consumer fell behind
+        merged     frames folded into another frame (Decimate)
+
+    Example:
+        logger = force_reader_threading.add_consumer(DropOldestQueue(10000))
+        ui = force_reader_threading.add_consumer(Decimate(5))
+        for seq, t, values in logger.get_all(timeout=0.5):
+            ...
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.merged = 0
+
+    # ——— reader side ———
+    def put(self, values, t=None):
+        t = time.monotonic() if t is None else t
+        with self._cond:
+            self._seq += 1
+            self.received += 1
+            self._store(SnapshotValue(self._seq, t, values))
+            self._cond.notify_all()
+
+    def flush(self):
+        """Called by the reader when its stream stops."""
+        with self._cond:
+            self._flush()
+            self._cond.notify_all()
+
+    # ——— consumer side ———
+    def get(self, timeout=None):
+        """Oldest pending frame, or None if nothing arrives within timeout."""
+        with self._cond:
+            if not self._cond.wait_for(self._pending, timeout):
+                return None
+            frame = self._take()
+            self.delivered += 1
+            self._cond.notify_all()
+            return frame
+
+    def get_all(self, timeout=None):
+        """Every pending frame (waiting for at least one), oldest first."""
+        with self._cond:
+            if not self._cond.wait_for(self._pending, timeout):
+                return []
+            frames = self._take_all()
+            self.delivered += len(frames)
+            self._cond.notify_all()
+            return frames
+
+    def stats(self):
+        with self._cond:
+            return {'received': self.received, 'delivered': self.delivered,
+                    'dropped': self.dropped, 'merged': self.merged,
+                    'pending': self._count()}
+
+    # ——— storage, called with the lock held ———
+    @abstractmethod
+    def _store(self, frame):
+        ...
+
+    @abstractmethod
+    def _take(self):
+        ...
+
+    @abstractmethod
+    def _take_all(self):
+        ...
+
+    @abstractmethod
+    def _count(self):
+        ...
+
+    def _flush(self):
+        pass
+
+    def _pending(self):
+        return self._count() > 0
+
+
+class LatestOnly(StreamPolicy):
+    """
+    Keeps only the newest frame (the old Snapshot behaviour). A frame replaced
+    before the consumer read it counts as dropped.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._frame = None
+
+    def _store(self, frame):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+
+    def _take(self):
+        frame, self._frame = self._frame, None
+        return frame
+
+    def _take_all(self):
+        return [self._take()]
+
+    def _count(self):
+        return 0 if self._frame is None else 1
+
+
+class DropOldestQueue(StreamPolicy):
+    """Bounded FIFO; when full, the oldest frame is dropped to make room."""
+
+    def __init__(self, maxsize=1024):
+        super().__init__()
+        self._frames = deque(maxlen=maxsize)
+
+    def _store(self, frame):
+        if len(self._frames) == self._frames.maxlen:
+            self.dropped += 1
+        self._frames.append(frame)
+
+    def _take(self):
+        return self._frames.popleft()
+
+    def _take_all(self):
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+    def _count(self):
+        return len(self._frames)
+
+
+class BlockingQueue(DropOldestQueue):
+    """
+    Bounded FIFO that makes the reader wait while it is full, so no frame is
+    lost on the host side; the backlog moves into the OS serial buffer
+    instead. A frame that still finds no room after put_timeout seconds is
+    dropped, so a stalled consumer cannot stop the reader thread (which
+    would also never see its stop flag).
+    """
+
+    def __init__(self, maxsize=1024, put_timeout=1.0):
+        if put_timeout is None or put_timeout < 0:
+            raise ValueError("put_timeout must be a finite number of seconds")
+        super().__init__(maxsize)
+        self.put_timeout = put_timeout
+
+    def put(self, values, t=None):
+        t = time.monotonic() if t is None else t
+        with self._cond:
+            self._seq += 1
+            self.received += 1
+            has_room = lambda: len(self._frames) < self._frames.maxlen
+            if not self._cond.wait_for(has_room, self.put_timeout):
+                self.dropped += 1
+                return
+            self._frames.append(SnapshotValue(self._seq, t, values))
+            self._cond.notify_all()
+
+
+class Decimate(DropOldestQueue):
+    """
+    N-to-1 reduction into a bounded drop-oldest queue.
+
+    mode='mean' averages every n frames element-wise, mode='last' keeps the
+    last of every n (plain decimation). The output frame carries the seq and
+    t of the last input frame; the other n - 1 count as merged. A partial
+    group left when the stream stops is flushed the same way over the frames
+    it has.
+    """
+
+    def __init__(self, n, mode='mean', maxsize=1024):
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        if mode not in ('mean', 'last'):
+            raise ValueError("mode must be 'mean' or 'last'")
+        super().__init__(maxsize)
+        self.n = n
+        self.mode = mode
+        self._group = []
+
+    def _store(self, frame):
+        self._group.append(frame)
+        if len(self._group) == self.n:
+            self._flush()
+
+    def _flush(self):
+        if not self._group:
+            return
+        last = self._group[-1]
+        if self.mode == 'mean':
+            values = tuple(sum(column) / len(self._group)
+                           for column in zip(*(frame.values for frame in self._group)))
+        else:
+            values = last.values
+        self.merged += len(self._group) - 1
+        self._group = []
+        super()._store(SnapshotValue(last.seq, last.t, values))
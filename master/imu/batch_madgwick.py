@@ -0,0 +1,224 @@
+"""
+Madgwick filter for K recordings at once.
+
+BatchMadgwick keeps a (K, 4) quaternion array and advances K independent
+streams per step with NumPy broadcasting, doing exactly the arithmetic of
+MadgwickFilter.update() on every row. batch_compute_position() reproduces
+MadgwickFilter.compute_position() for a whole archive of recordings in one
+vectorized pass: the time loop runs once over the longest recording instead
+of once per file, and shorter recordings are masked out once they end.
+
+Example:
+    trials = load_trials('../../old_data/*cm_trial*_extracted.csv')
+    result = batch_compute_position(list(trials.values()), beta=0.1, L=0.1)
+    result['position']       # (K, 3), same as compute_position() per file
+
+    # Every recording at every gain, still one pass
+    betas = np.linspace(0.01, 0.5, 10)
+    datasets = [d for d in trials.values() for _ in betas]
+    result = batch_compute_position(datasets, beta=np.tile(betas, len(trials)))
+
+Usage:
+    python batch_madgwick.py [glob ...]
+"""
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import quaternions
+from dof9_filter import MadgwickFilter
+
+COLUMNS = ['Timestamp',
+           'Accel_X', 'Accel_Y', 'Accel_Z',
+           'Gyro_X', 'Gyro_Y', 'Gyro_Z',
+           'Mag_X', 'Mag_Y', 'Mag_Z']
+
+
+class BatchMadgwick:
+    def __init__(self, k, beta=0.1):
+        """
+        Parameters:
+            k (int): Number of independent streams.
+            beta (float or ndarray): Filter gain, shared by all streams or
+                one per stream (K,), e.g. to sweep several gains in one pass.
+        """
+        self.beta = np.broadcast_to(np.asarray(beta, dtype=float), (k,))[:, None]
+        self.q = np.zeros((k, 4))
+        self.q[:, 0] = 1.0
+
+    def update(self, gyro, accel, mag, dt, mask=None):
+        """
+        Advances every stream by one sample.
+
+        Parameters:
+            gyro, accel, mag (ndarray): (K, 3) measurements, one row per stream.
+            dt (ndarray): (K,) sample periods.
+            mask (ndarray): Optional (K,) bool; streams where it is False keep
+                their quaternion (e.g. recordings that already ended).
+
+        Returns:
+            ndarray: The (K, 4) quaternions (self.q).
+        """
+        q1, q2, q3, q4 = self.q.T
+
+        accel_norm = np.sqrt(np.einsum('ij,ij->i', accel, accel))
+        mag_norm = np.sqrt(np.einsum('ij,ij->i', mag, mag))
+        # Like update(), a zero accel or mag vector leaves the stream unchanged
+        valid = (accel_norm != 0) & (mag_norm != 0)
+        if mask is not None:
+            valid &= mask
+        a = accel / np.where(accel_norm == 0, 1.0, accel_norm)[:, None]
+        ax, ay, az = a.T
+
+        _2q1 = 2.0 * q1
+        _2q2 = 2.0 * q2
+        _2q3 = 2.0 * q3
+        _2q4 = 2.0 * q4
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        q2q4 = q2 * q4
+
+        e1 = 2.0 * q2q4 - _2q1 * q3 - ax
+        e2 = 2.0 * q1 * q2 + _2q3 * q4 - ay
+        e3 = 1.0 - 2.0 * q2q2 - 2.0 * q3q3 - az
+        s = np.stack([-_2q3 * e1 + _2q2 * e2,
+                      _2q4 * e1 + _2q1 * e2 - 4.0 * q2 * e3,
+                      -_2q1 * e1 + _2q4 * e2 - 4.0 * q3 * e3,
+                      _2q2 * e1 + _2q3 * e2], axis=1)
+        norm_s = np.sqrt(np.einsum('ij,ij->i', s, s))
+        s /= np.where(norm_s == 0, 1.0, norm_s)[:, None]
+
+        gx, gy, gz = gyro.T
+        q_dot = np.stack([0.5 * (-q2 * gx - q3 * gy - q4 * gz),
+                          0.5 * (q1 * gx + q3 * gz - q4 * gy),
+                          0.5 * (q1 * gy - q2 * gz + q4 * gx),
+                          0.5 * (q1 * gz + q2 * gy - q3 * gx)], axis=1) - self.beta * s
+        q_new = self.q + q_dot * dt[:, None]
+        q_new /= np.sqrt(np.einsum('ij,ij->i', q_new, q_new))[:, None]
+
+        self.q = np.where(valid[:, None], q_new, self.q)
+        return self.q
+
+    def rotation_matrices(self):
+        """(K, 3, 3) rotation matrices, as MadgwickFilter.get_rotation_matrix()."""
+        return quaternions.to_rotation_matrix(self.q)
+
+
+def stack_trials(datasets):
+    """
+    Pads K recordings of (N_k, 10) rows [dt, accel, gyro, mag] into one
+    (K, N_max, 10) array, applying the same preprocessing as compute_position()
+    (initial accel offset removal, magnetometer calibration, dt fallback).
+
+    Returns:
+        data (ndarray): (K, N_max, 10), zero-padded.
+        mask (ndarray): (K, N_max) bool, True where a recording has a sample.
+    """
+    datasets = [np.asarray(d, dtype=float).reshape(-1, 10) for d in datasets]
+    lengths = np.array([len(d) for d in datasets])
+    data = np.zeros((len(datasets), lengths.max(), 10))
+    mask = np.arange(lengths.max())[None, :] < lengths[:, None]
+
+    calibrator = MadgwickFilter(sample_period=0.1)
+    for k, d in enumerate(datasets):
+        d = d.copy()
+        dts = d[:, 0]
+        d[:, 0] = np.where(dts > 0, dts, np.mean(dts))
+        if len(d) > 1:
+            d[:, 1:4] -= d[0, 1:4]
+        d[:, 7:10] = calibrator.calibrate_magnetometer(d[:, 7:10])
+        data[k, :len(d)] = d
+    return data, mask
+
+
+def batch_compute_position(datasets, beta=0.1, L=0.1):
+    """
+    MadgwickFilter.compute_position() for many recordings in lockstep.
+
+    Parameters:
+        datasets (list): (N_k, 10) arrays of [dt, accel, gyro, mag] rows;
+            lengths may differ.
+        beta (float or ndarray): Filter gain, or one gain per recording.
+        L (float): Rod length in meters.
+
+    Returns:
+        dict with
+            'position'     (K, 3) last position of each recording, as returned
+                           by compute_position()
+            'quaternions'  (K, N_max, 4) orientation per sample, NaN after a
+                           recording ends
+            'rod_tip'      (K, N_max, 3) position plus the rotated rod offset
+            'mask'         (K, N_max) valid samples
+    """
+    data, mask = stack_trials(datasets)
+    k, n_max, _ = data.shape
+    madgwick = BatchMadgwick(k, beta)
+
+    quaternions = np.full((k, n_max, 4), np.nan)
+    rod_tip = np.full((k, n_max, 3), np.nan)
+    position = np.zeros((k, 3))
+    rod_offset = np.array([0.0, 0.0, L])
+
+    for i in range(n_max):
+        row = data[:, i]
+        valid = mask[:, i]
+        dt = row[:, 0]
+        accel = row[:, 1:4]
+        q = madgwick.update(row[:, 4:7], accel, row[:, 7:10], dt, valid)
+        R = madgwick.rotation_matrices()
+        global_acc = np.einsum('kij,kj->ki', R, accel)
+        # compute_position() keeps only this step's displacement
+        step_position = 0.5 * global_acc * (dt ** 2)[:, None]
+        position = np.where(valid[:, None], step_position, position)
+
+        quaternions[valid, i] = q[valid]
+        rod_tip[valid, i] = step_position[valid] + (R[valid] @ rod_offset)
+
+    return {'position': position, 'quaternions': quaternions, 'rod_tip': rod_tip, 'mask': mask}
+
+
+def load_trials(*patterns):
+    """Reads every matching IMU CSV into a {path: (N, 10) array} dict."""
+    trials = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            df = pd.read_csv(path, skipinitialspace=True)
+            df.columns = df.columns.str.strip()
+            trials[path] = df[COLUMNS].to_numpy(dtype=float)
+    return trials
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    patterns = sys.argv[1:] or [os.path.join(here, '..', '..', 'old_data', '*cm_trial*_extracted.csv'),
+                                os.path.join(here, '..', '..', 'testing', 'data', '4_24_25', '*.csv')]
+    trials = load_trials(*patterns)
+    if not trials:
+        print("No recordings found")
+        return 1
+    datasets = list(trials.values())
+
+    t0 = time.perf_counter()
+    result = batch_compute_position(datasets, beta=0.1, L=0.1)
+    t_batch = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    serial = np.array([MadgwickFilter(sample_period=0.1).compute_position(d.copy(), beta=0.1, L=0.1)
+                       for d in datasets])
+    t_serial = time.perf_counter() - t0
+
+    err = np.abs(result['position'] - serial).max()
+    samples = sum(len(d) for d in datasets)
+    print(f"{len(datasets)} recordings, {samples} samples")
+    print(f"compute_position per file: {t_serial:8.3f} s")
+    print(f"batch_compute_position:    {t_batch:8.3f} s  ({t_serial / t_batch:.1f}x)")
+    print(f"max |position difference|: {err:.3e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
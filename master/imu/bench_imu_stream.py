@@ -0,0 +1,110 @@
+"""
+Throughput benchmark for IMUStream vs. the per-sample read_imu_data().
+
+A pseudo-terminal stands in for the Arduino: a writer thread pushes IMU lines
+in the exact format printed by IMU_Arduino into the master side, and the
+readers open the slave side as if it were /dev/ttyACM0. Linux/macOS only.
+The binary run writes imu_protocol frames instead of text lines.
+
+Usage:
+    python bench_imu_stream.py [seconds] [legacy_calls]
+"""
+import os
+import sys
+import threading
+import time
+import tty
+
+from imu_protocol import encode_frame
+from imu_reader import read_imu_data
+from imu_stream import IMUStream
+
+SAMPLE_LINE = ("Accel X: 0.14 Y: 0.73 Z: 0.26 m/s^2 //"
+               "Mag X: -5.70 Y: 7.20 Z: -8.00 uT //"
+               "Gyro X: -0.00 Y: -0.01 Z: 0.01 radians/s\r\n").encode()
+SAMPLE_FRAME = encode_frame(0, 0, (0.14, 0.73, 0.26, -0.00, -0.01, 0.01, -5.70, 7.20, -8.00))
+
+
+def open_fake_arduino():
+    """Returns (master_fd, slave_fd, slave_path) of a raw pseudo-terminal pair."""
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    return master_fd, slave_fd, os.ttyname(slave_fd)
+
+
+def writer_loop(master_fd, stop_event, counter, rate_hz=None, payload=SAMPLE_LINE):
+    """Write IMU samples into the pty until stopped (as fast as possible if rate_hz is None)."""
+    period = 1.0 / rate_hz if rate_hz else 0.0
+    next_t = time.perf_counter()
+    while not stop_event.is_set():
+        try:
+            os.write(master_fd, payload)
+        except OSError:
+            # pty buffer full; give the reader a moment to catch up
+            time.sleep(0.0005)
+            continue
+        counter[0] += 1
+        if period:
+            next_t += period
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def bench_stream(slave_path, master_fd, seconds, binary=False):
+    stop_event = threading.Event()
+    written = [0]
+    payload = SAMPLE_FRAME if binary else SAMPLE_LINE
+    writer = threading.Thread(target=writer_loop, args=(master_fd, stop_event, written, None, payload),
+                              daemon=True)
+
+    received = 0
+    with IMUStream(slave_path, settle_time=0, buffer_size=4096, binary=binary) as imu:
+        writer.start()
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            received += len(imu.read_all())
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+        stop_event.set()
+        writer.join()
+        time.sleep(0.05)
+        received += len(imu.read_all())
+        dropped, errors = imu.samples_dropped, imu.parse_errors
+
+    label = "IMUStream bin:" if binary else "IMUStream:    "
+    print(f"{label}  {received / elapsed:10.1f} samples/s "
+          f"({received} received, {written[0]} written, {dropped} dropped, {errors} parse errors)")
+
+
+def bench_legacy(slave_path, master_fd, calls):
+    stop_event = threading.Event()
+    written = [0]
+    writer = threading.Thread(target=writer_loop, args=(master_fd, stop_event, written, 100), daemon=True)
+    writer.start()
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        read_imu_data(port=slave_path)
+    elapsed = time.perf_counter() - t0
+    stop_event.set()
+    writer.join()
+    print(f"read_imu_data:  {calls / elapsed:10.1f} samples/s ({calls} calls)")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    legacy_calls = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    master_fd, slave_fd, slave_path = open_fake_arduino()
+    try:
+        bench_stream(slave_path, master_fd, seconds)
+        bench_stream(slave_path, master_fd, seconds, binary=True)
+        if legacy_calls:
+            bench_legacy(slave_path, master_fd, legacy_calls)
+    finally:
+        os.close(master_fd)
+        os.close(slave_fd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark and equivalence check for MadgwickFilter.update_fast() against
+MadgwickFilter.update().
+
+Both kernels are run over the same sample sequence from a fresh filter; the
+quaternions must agree to within 1e-12 at every step. Samples come from an
+IMU CSV (Timestamp,Accel_*,Gyro_*,Mag_* columns) if one is given, otherwise
+from a synthetic random walk.
+
+Usage:
+    python bench_madgwick.py [samples] [csv_path]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dof9_filter import MadgwickFilter
+
+TOLERANCE = 1e-12
+
+
+def synthetic_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    accel = np.array([0.0, 0.0, 9.81]) + rng.normal(0, 0.5, (n, 3))
+    gyro = rng.normal(0, 0.3, (n, 3))
+    mag = np.array([20.0, -5.0, 40.0]) + rng.normal(0, 2.0, (n, 3))
+    return gyro, accel, mag
+
+
+def csv_samples(path, n):
+    df = pd.read_csv(path)
+    gyro = df[['Gyro_X', 'Gyro_Y', 'Gyro_Z']].to_numpy(dtype=float)
+    accel = df[['Accel_X', 'Accel_Y', 'Accel_Z']].to_numpy(dtype=float)
+    mag = df[['Mag_X', 'Mag_Y', 'Mag_Z']].to_numpy(dtype=float)
+    # Repeat short recordings up to n samples
+    reps = -(-n // len(df))
+    return tuple(np.tile(a, (reps, 1))[:n] for a in (gyro, accel, mag))
+
+
+def run_update(gyro, accel, mag, dt=0.01):
+    madgwick = MadgwickFilter(sample_period=dt, beta=0.1)
+    out = np.empty((len(gyro), 4))
+    t0 = time.perf_counter()
+    for i in range(len(gyro)):
+        out[i] = madgwick.update(gyro[i], accel[i], mag[i])
+    return out, time.perf_counter() - t0
+
+
+def run_update_fast(gyro, accel, mag, dt=0.01):
+    madgwick = MadgwickFilter(sample_period=dt, beta=0.1)
+    gyro, accel, mag = gyro.tolist(), accel.tolist(), mag.tolist()
+    out = np.empty((len(gyro), 4))
+    t0 = time.perf_counter()
+    for i in range(len(gyro)):
+        out[i] = madgwick.update_fast(gyro[i], accel[i], mag[i])
+    return out, time.perf_counter() - t0
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    if len(sys.argv) > 2:
+        gyro, accel, mag = csv_samples(sys.argv[2], n)
+    else:
+        gyro, accel, mag = synthetic_samples(n)
+
+    q_ref, t_ref = run_update(gyro, accel, mag)
+    q_fast, t_fast = run_update_fast(gyro, accel, mag)
+    err = np.abs(q_ref - q_fast).max()
+
+    print(f"update():      {n / t_ref:12.0f} samples/s")
+    print(f"update_fast(): {n / t_fast:12.0f} samples/s  ({t_ref / t_fast:.1f}x)")
+    print(f"max |dq|:      {err:.3e}  ({'ok' if err <= TOLERANCE else 'MISMATCH'})")
+    return 0 if err <= TOLERANCE else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,12 @@
+import math
 import numpy as np
 import pandas as pd
 import csv
+from mag_calibration import load_calibration
+import quaternions
 
 class MadgwickFilter:
-    def __init__(self, sample_period, beta=0.1):
+    def __init__(self, sample_period, beta=0.1, mag_calibration=None, dtype=float):
         """
         Initializes the Madgwick filter.
         
@@ -13,11 +16,18 @@ class MadgwickFilter:
             The sample period (in seconds) between measurements.
         beta : float
             The filter gain; higher beta gives more weight to the correction.
+        mag_calibration : mag_calibration.MagCalibration, optional
+            Hard/soft-iron correction used by calibrate_magnetometer();
+            defaults to the cached 'default' device calibration.
+        dtype : numpy dtype, optional
+            Precision of the quaternion; update_fast(), update_imu() and
+            correct_heading() keep it (np.float32 in fixed_budget.py).
         """
         self.sample_period = sample_period
         self.beta = beta
+        self.mag_calibration = mag_calibration if mag_calibration is not None else load_calibration()
         # Initialize quaternion: [q0, q1, q2, q3]
-        self.q = np.array([1.0, 0.0, 0.0, 0.0])
+        self.q = np.array([1.0, 0.0, 0.0, 0.0], dtype=dtype)
         self.position = 0
     
     def update(self, gyro, accel, mag):
@@ -104,6 +114,141 @@ class MadgwickFilter:
         self.q = q_new / np.linalg.norm(q_new)
         return self.q
 
+    def update_fast(self, gyro, accel, mag):
+        """
+        Same step as update(), computed on plain Python floats.
+
+        update() spends most of its time in np.linalg.norm and temporary
+        arrays on 3- and 4-element vectors; this version uses math.sqrt and
+        scalar arithmetic and writes the result into self.q in place. The
+        quaternion matches update() to within 1e-12. Inputs are best passed
+        as lists or tuples of floats (e.g. row.tolist()); NumPy scalars work
+        but are slower.
+
+        Parameters:
+        -----------
+        gyro, accel, mag : sequence of 3 floats
+            Same as update().
+
+        Returns:
+        --------
+        q : ndarray, shape (4,)
+            self.q, updated in place.
+        """
+        mx, my, mz = mag
+        # The magnetometer only gates the update (as in update())
+        if mx * mx + my * my + mz * mz == 0:
+            return self.q
+        return self.update_imu(gyro, accel)
+
+    def update_imu(self, gyro, accel):
+        """
+        Gyroscope + accelerometer step of update_fast(), without the
+        magnetometer.
+
+        The magnetometer does not enter update()'s gradient step (it only
+        skips samples where it reads zero), so this is the same orientation
+        update. It lets the gyro/accel step run at the full IMU rate while
+        correct_heading() applies the compass at a lower rate (see
+        multirate.py).
+
+        Parameters:
+        -----------
+        gyro, accel : sequence of 3 floats
+            Same as update().
+
+        Returns:
+        --------
+        q : ndarray, shape (4,)
+            self.q, updated in place.
+        """
+        q = self.q
+        q1, q2, q3, q4 = q.tolist()
+        ax, ay, az = accel
+        gx, gy, gz = gyro
+
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm == 0:
+            return q
+        ax /= norm
+        ay /= norm
+        az /= norm
+
+        _2q1 = 2.0 * q1
+        _2q2 = 2.0 * q2
+        _2q3 = 2.0 * q3
+        _2q4 = 2.0 * q4
+        q2q2 = q2 * q2
+        q3q3 = q3 * q3
+        q2q4 = q2 * q4
+
+        # Gradient descent corrective step (same terms as update())
+        e1 = 2.0 * q2q4 - _2q1 * q3 - ax
+        e2 = 2.0 * q1 * q2 + _2q3 * q4 - ay
+        e3 = 1.0 - 2.0 * q2q2 - 2.0 * q3q3 - az
+        s1 = -_2q3 * e1 + _2q2 * e2
+        s2 = _2q4 * e1 + _2q1 * e2 - 4.0 * q2 * e3
+        s3 = -_2q1 * e1 + _2q4 * e2 - 4.0 * q3 * e3
+        s4 = _2q2 * e1 + _2q3 * e2
+        norm_s = math.sqrt(s1 * s1 + s2 * s2 + s3 * s3 + s4 * s4)
+        if norm_s == 0:
+            norm_s = 1
+        s1 /= norm_s
+        s2 /= norm_s
+        s3 /= norm_s
+        s4 /= norm_s
+
+        beta = float(self.beta)
+        dt = float(self.sample_period)
+        q1, q2, q3, q4 = (
+            q1 + (0.5 * (-q2 * gx - q3 * gy - q4 * gz) - beta * s1) * dt,
+            q2 + (0.5 * (q1 * gx + q3 * gz - q4 * gy) - beta * s2) * dt,
+            q3 + (0.5 * (q1 * gy - q2 * gz + q4 * gx) - beta * s3) * dt,
+            q4 + (0.5 * (q1 * gz + q2 * gy - q3 * gx) - beta * s4) * dt,
+        )
+        norm_q = math.sqrt(q1 * q1 + q2 * q2 + q3 * q3 + q4 * q4)
+        q[0] = q1 / norm_q
+        q[1] = q2 / norm_q
+        q[2] = q3 / norm_q
+        q[3] = q4 / norm_q
+        return q
+
+    def correct_heading(self, mag, gain=0.05):
+        """
+        Turns the orientation about the world z axis toward magnetic north.
+
+        The calibrated field is rotated into the world frame and the heading of
+        its horizontal part, atan2(n_y, n_x), is reduced by the fraction `gain`
+        (a complementary-filter step), leaving roll and pitch untouched.
+
+        Parameters:
+        -----------
+        mag : sequence of 3 floats
+            Calibrated magnetometer sample (see calibrate_magnetometer()).
+        gain : float
+            Fraction of the heading error removed per call (0 to 1).
+
+        Returns:
+        --------
+        q : ndarray, shape (4,)
+            self.q, updated in place.
+        """
+        q = self.q
+        w, x, y, z = q.tolist()
+        mx, my, mz = mag
+        nx = (1 - 2 * (y * y + z * z)) * mx + 2 * (x * y - z * w) * my + 2 * (x * z + y * w) * mz
+        ny = 2 * (x * y + z * w) * mx + (1 - 2 * (x * x + z * z)) * my + 2 * (y * z - x * w) * mz
+        if nx == 0 and ny == 0:
+            return q
+        half = -0.5 * gain * math.atan2(ny, nx)
+        c, s = math.cos(half), math.sin(half)
+        # q <- [c, 0, 0, s] * q
+        q[0] = c * w - s * z
+        q[1] = c * x - s * y
+        q[2] = c * y + s * x
+        q[3] = c * z + s * w
+        return q
+
     def get_euler(self):
         """
         Returns the current orientation as Euler angles (yaw, pitch, roll) in degrees.
@@ -123,34 +268,19 @@ class MadgwickFilter:
         """
         Returns the 3x3 rotation matrix corresponding to the current quaternion.
         """
-        q = self.q
-        # Compute the rotation matrix elements
-        r11 = 1 - 2*(q[2]**2 + q[3]**2)
-        r12 = 2*(q[1]*q[2] - q[0]*q[3])
-        r13 = 2*(q[1]*q[3] + q[0]*q[2])
-        r21 = 2*(q[1]*q[2] + q[0]*q[3])
-        r22 = 1 - 2*(q[1]**2 + q[3]**2)
-        r23 = 2*(q[2]*q[3] - q[0]*q[1])
-        r31 = 2*(q[1]*q[3] - q[0]*q[2])
-        r32 = 2*(q[2]*q[3] + q[0]*q[1])
-        r33 = 1 - 2*(q[1]**2 + q[2]**2)
-        return np.array([[r11, r12, r13],
-                         [r21, r22, r23],
-                         [r31, r32, r33]])
+        return quaternions.to_rotation_matrix(self.q)
 
     def calibrate_magnetometer(self, mag_data):
-        calibrated_mag_data = np.zeros_like(mag_data)
-        B = [109.06238802, 37.90448955, 125.2127988]
-        A_inv = [[2.58891148, 0.03830976, -0.05865281],[0.03830976, 2.79695092, 0.03519644], [-0.05865281, 0.03519644, 2.72060039]]
-
-        for i in range(mag_data.shape[0]):
-            # Subtract hard iron bias
-            mag_data[i] = mag_data[i] - B
-            # Apply soft iron transformation
-            calibrated_mag_data[i] = np.dot(mag_data[i], A_inv)
-        return calibrated_mag_data
-
-    def compute_position(self, data, beta, L):
+        """Returns (mag - B) @ A_inv for an (N, 3) block; mag_data is not modified."""
+        return self.mag_calibration.apply(mag_data)
+
+    def compute_position(self, data, beta, L, trace=None):
+        """
+        Runs the filter over (N, 10) rows of [dt, accel, gyro, mag] and
+        returns the last position. If a latency_trace.LatencyTrace is given,
+        the filter update and the position integration are marked as the
+        'filter' and 'integrate' stages.
+        """
         data = np.asarray(data)
         if data.size % 10 != 0:
             raise ValueError("Input array must have a length multiple of 10.")
@@ -178,14 +308,20 @@ class MadgwickFilter:
         global_acc = np.zeros((N,3))
 
         
-        madgwick = MadgwickFilter(sample_period=np.mean(dts), beta=beta)
+        madgwick = MadgwickFilter(sample_period=np.mean(dts), beta=beta, mag_calibration=self.mag_calibration)
+        # Plain floats for the scalar filter kernel
+        gyro_rows = gyro_data.tolist()
+        accel_rows = accel_data.tolist()
+        mag_rows = mag_data.tolist()
 
         for i in range(N):
             dt = dts[i] if dts[i] > 0 else np.mean(dts)
             madgwick.sample_period = dt
 
-            q = madgwick.update(gyro=gyro_data[i], accel=accel_data[i], mag=mag_data[i])
+            q = madgwick.update_fast(gyro_rows[i], accel_rows[i], mag_rows[i])
             quaternions[i] = q
+            if trace is not None:
+                trace.mark('filter')
 
             R = madgwick.get_rotation_matrix()
             global_acc = R @ accel_data[i]
@@ -201,6 +337,8 @@ class MadgwickFilter:
             rod_global = R @ rod_offset
 
             rod_tip_position[i] = position[i] + rod_global
+            if trace is not None:
+                trace.mark('integrate')
 
         return position[-1]
 
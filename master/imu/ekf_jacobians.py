@@ -0,0 +1,90 @@
+"""
+Closed-form measurement Jacobians for the quaternion orientation EKFs.
+
+Both models take the state quaternion q (scalar-first, not necessarily unit:
+predict() leaves |q| != 1) and are differentiated through normalize_quat,
+i.e. each row r of the unit-quaternion Jacobian becomes
+(r - (r . q_hat) q_hat) / |q|:
+
+    accmag_jacobian   accel+mag direction prediction, rows 2 and 0 of
+                      R(q / |q|) for the references g = [0,0,1], m = [1,0,0]
+    yaw_jacobian      tilt-compensated heading atan2(n1, n0), n = R(q / |q|) mag
+
+Only the four quaternion columns are returned; callers embed them in their
+own H (the filterpy scripts in testing/ pad the bias columns with zeros).
+Everything is scalar arithmetic, so a call creates no NumPy temporaries when
+`out` is given.
+
+Example:
+    H = np.zeros((6, 7))
+    accmag_jacobian(x[0:4], out=H[:, 0:4])
+"""
+import math
+
+import numpy as np
+
+
+def _unit(q):
+    w, x, y, z = (float(v) for v in q)
+    norm = math.sqrt(w * w + x * x + y * y + z * z)
+    return w / norm, x / norm, y / norm, z / norm, norm
+
+
+def _normalized(rows, w, x, y, z, norm):
+    # Chain rule through q / |q|: r <- (r - (r . q_hat) q_hat) / |q|
+    out = []
+    for a, b, c, d in rows:
+        s = a * w + b * x + c * y + d * z
+        out.append(((a - s * w) / norm, (b - s * x) / norm, (c - s * y) / norm, (d - s * z) / norm))
+    return out
+
+
+def accmag_jacobian(q, out=None):
+    """
+    d(rows 2 and 0 of R(q / |q|))/dq, the Jacobian of the accel+mag prediction.
+
+    Parameters:
+        q (ndarray): Quaternion [w, x, y, z].
+        out (ndarray): Optional (6, 4) array (or view) to write into.
+
+    Returns:
+        ndarray: (6, 4) Jacobian.
+    """
+    w, x, y, z, norm = _unit(q)
+    rows = ((-2 * y, 2 * z, -2 * w, 2 * x),         # R[2,0] = 2(xz - yw)
+            (2 * x, 2 * w, 2 * z, 2 * y),           # R[2,1] = 2(yz + xw)
+            (0.0, -4 * x, -4 * y, 0.0),             # R[2,2] = 1 - 2(x^2 + y^2)
+            (0.0, 0.0, -4 * y, -4 * z),             # R[0,0] = 1 - 2(y^2 + z^2)
+            (-2 * z, 2 * y, 2 * x, -2 * w),         # R[0,1] = 2(xy - zw)
+            (2 * y, 2 * z, 2 * w, 2 * x))           # R[0,2] = 2(xz + yw)
+    J = np.empty((6, 4)) if out is None else out
+    J[:] = _normalized(rows, w, x, y, z, norm)
+    return J
+
+
+def yaw_jacobian(q, mag, out=None):
+    """
+    d atan2(n1, n0)/dq with n = R(q / |q|) mag, the Jacobian of the heading.
+
+    Parameters:
+        q (ndarray): Quaternion [w, x, y, z].
+        mag (sequence): Magnetometer reading in the body frame.
+        out (ndarray): Optional (1, 4) array (or view) to write into.
+
+    Returns:
+        ndarray: (1, 4) Jacobian.
+    """
+    w, x, y, z, norm = _unit(q)
+    m0, m1, m2 = (float(v) for v in mag)
+    # Rows 0 and 1 of R times mag
+    n0 = (1 - 2 * (y * y + z * z)) * m0 + 2 * (x * y - z * w) * m1 + 2 * (x * z + y * w) * m2
+    n1 = 2 * (x * y + z * w) * m0 + (1 - 2 * (x * x + z * z)) * m1 + 2 * (y * z - x * w) * m2
+    scale = 2.0 / (n0 * n0 + n1 * n1)
+    # (n0 dn1/dq - n1 dn0/dq) / (n0^2 + n1^2)
+    row = (scale * (n0 * (z * m0 - x * m2) - n1 * (-z * m1 + y * m2)),
+           scale * (n0 * (y * m0 - 2 * x * m1 - w * m2) - n1 * (y * m1 + z * m2)),
+           scale * (n0 * (x * m0 + z * m2) - n1 * (-2 * y * m0 + x * m1 + w * m2)),
+           scale * (n0 * (w * m0 - 2 * z * m1 + y * m2) - n1 * (-2 * z * m0 - w * m1 + x * m2)))
+    J = np.empty((1, 4)) if out is None else out
+    J[:] = _normalized((row,), w, x, y, z, norm)
+    return J
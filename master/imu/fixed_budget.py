@@ -0,0 +1,169 @@
+"""
+Constrained execution mode for the orientation filters (Raspberry Pi target).
+
+BudgetedFilter runs MadgwickFilter, OrientationEKF or ErrorStateOrientationEKF
+the way they should run on the Pi:
+
+    float32      the filter state and every work buffer are single precision
+                 (dtype argument of the filters)
+    no growth    all state is allocated in __init__; step() only updates it in
+                 place, and the overrun log is a fixed-size ring
+    budget       every sample is timed against a CPU budget (by default the
+                 sample period at rate_hz); a sample that takes longer is an
+                 overrun, logged with its index and duration, and reported on
+                 the console at most once per report_interval seconds
+
+so a deployment can check, on the device itself, whether a sample rate is
+sustainable. The timing bookkeeping is multirate.Stage's.
+
+Example:
+    f = BudgetedFilter('ekf', rate_hz=100.0)
+    for gyro, accel, mag, dt in samples:
+        q = f.step(gyro, accel, mag, dt)
+    f.print_report()
+
+testing/raspberry pi/filter_benchmark.py measures samples per second and
+memory footprint for every filter and precision.
+"""
+import time
+
+import numpy as np
+
+from dof9_filter import MadgwickFilter
+from multirate import Stage
+from orientation_ekf import ErrorStateOrientationEKF, OrientationEKF
+
+FILTERS = ('madgwick', 'ekf', 'error_state')
+
+
+def state_bytes(obj):
+    """Bytes held by the NumPy arrays an object keeps as attributes (views counted once)."""
+    seen, total = set(), 0
+    for value in vars(obj).values():
+        if isinstance(value, np.ndarray):
+            base = value if value.base is None else value.base
+            if id(base) not in seen:
+                seen.add(id(base))
+                total += base.nbytes
+    return total
+
+
+class BudgetedFilter:
+    def __init__(self, filter='madgwick', rate_hz=100.0, budget_s=None, dtype=np.float32,
+                 report_interval=1.0, log_size=256, clock=time.perf_counter, **filter_kwargs):
+        """
+        Parameters:
+            filter (str): 'madgwick', 'ekf' (OrientationEKF) or 'error_state'
+                (ErrorStateOrientationEKF).
+            rate_hz (float): Expected IMU rate; the default dt and budget.
+            budget_s (float): CPU time allowed per sample (default 1 / rate_hz).
+            dtype: Filter precision.
+            report_interval (float): Minimum seconds between console overrun
+                reports (None to stay quiet and only count).
+            log_size (int): Overruns kept (the most recent ones).
+            **filter_kwargs: Passed to the filter (beta, accmag_noise, ...).
+        """
+        self.name = filter
+        self.rate_hz = rate_hz
+        self.dtype = np.dtype(dtype)
+        self.dt = 1.0 / rate_hz
+        if filter == 'madgwick':
+            self.filter = MadgwickFilter(sample_period=self.dt, dtype=dtype, **filter_kwargs)
+            fn = self._madgwick_step
+        elif filter == 'ekf':
+            self.filter = OrientationEKF(dtype=dtype, **filter_kwargs)
+            fn = self._ekf_step
+        elif filter == 'error_state':
+            self.filter = ErrorStateOrientationEKF(dtype=dtype, **filter_kwargs)
+            fn = self._ekf_step
+        else:
+            raise ValueError(f"filter must be one of {FILTERS}")
+
+        budget = budget_s if budget_s is not None else self.dt
+        self.stage = Stage(filter, fn, None, budget_s=budget, clock=clock, on_overrun=self._overrun)
+        self.report_interval = report_interval
+        self.clock = clock
+
+        # Ring of the most recent overruns: sample index and CPU time
+        self.overrun_sample = np.zeros(log_size, dtype=np.int64)
+        self.overrun_s = np.zeros(log_size)
+        self.samples = 0
+        self.t = 0.0
+        self._last_report = None
+        self._reported = 0
+
+    @property
+    def budget(self):
+        return self.stage.budget
+
+    @property
+    def quaternion(self):
+        return self.filter.q
+
+    # ——— per-sample steps ———
+    def _madgwick_step(self, gyro, accel, mag, dt):
+        f = self.filter
+        f.sample_period = dt
+        return f.update_fast(gyro, accel, mag)
+
+    def _ekf_step(self, gyro, accel, mag, dt):
+        f = self.filter
+        f.predict(gyro, dt)
+        return f.update(accel, mag)
+
+    def step(self, gyro, accel, mag, dt=None):
+        """One timed filter update; returns the quaternion (a view of the state)."""
+        if dt is None or not dt > 0:
+            dt = self.dt
+        self.t += dt
+        q = self.stage.run(self.t, gyro, accel, mag, dt)
+        self.samples += 1
+        return q
+
+    def _overrun(self, stage, elapsed):
+        i = (stage.overruns - 1) % len(self.overrun_s)
+        self.overrun_sample[i] = self.samples
+        self.overrun_s[i] = elapsed
+        if self.report_interval is None:
+            return
+        now = self.clock()
+        if self._last_report is None or now - self._last_report >= self.report_interval:
+            new = stage.overruns - self._reported
+            print(f"{self.name}: {new} sample(s) over the {stage.budget * 1e3:.3f} ms budget "
+                  f"(latest {elapsed * 1e3:.3f} ms at sample {self.samples})")
+            self._last_report = now
+            self._reported = stage.overruns
+
+    # ——— reporting ———
+    def overruns(self):
+        """(sample index, CPU seconds) of the logged overruns, oldest first."""
+        n = min(self.stage.overruns, len(self.overrun_s))
+        start = self.stage.overruns % len(self.overrun_s) if self.stage.overruns > n else 0
+        order = (np.arange(n) + start) % len(self.overrun_s)
+        return self.overrun_sample[order], self.overrun_s[order]
+
+    def report(self):
+        stats = self.stage.stats()
+        mean_s = stats['mean_ms'] / 1e3
+        return {'filter': self.name,
+                'dtype': self.dtype.name,
+                'samples': self.samples,
+                'budget_ms': self.budget * 1e3,
+                'mean_us': mean_s * 1e6,
+                'max_us': stats['max_ms'] * 1e3,
+                'samples_per_s': 1.0 / mean_s if mean_s else 0.0,
+                'overruns': stats['overruns'],
+                'overrun_pct': 100.0 * stats['overruns'] / self.samples if self.samples else 0.0,
+                'state_bytes': state_bytes(self.filter)}
+
+    def print_report(self):
+        r = self.report()
+        print(f"{r['filter']} ({r['dtype']}): {r['samples']} samples, mean {r['mean_us']:.1f} us, "
+              f"max {r['max_us']:.1f} us, {r['samples_per_s']:.0f} samples/s, "
+              f"{r['overruns']} over the {r['budget_ms']:.3f} ms budget ({r['overrun_pct']:.2f} %), "
+              f"state {r['state_bytes']} bytes")
+        samples, seconds = self.overruns()
+        if len(samples):
+            worst = np.argsort(seconds)[::-1][:5]
+            print("    worst logged overruns: " +
+                  ", ".join(f"#{samples[i]} {seconds[i] * 1e3:.3f} ms" for i in worst))
@@ -0,0 +1,166 @@
+"""
+Vectorized acceleration -> velocity -> position integration with ZUPT.
+
+Every function works on a whole recording at once: timestamps may be
+non-uniform, and the integrals are cumulative sums rather than per-sample
+Python loops, so a 10-minute 1 kHz log integrates in milliseconds.
+
+Methods (cumulative_integral):
+    'trapezoid'  0.5 (y[i] + y[i-1]) dt, as kalmanTest's loops
+    'simpson'    scipy.integrate.cumulative_simpson (non-uniform spacing)
+    'euler'      y[i] dt, as the V[i] = V[i-1] + a dt loops in ekf.py and
+                 madgwick.py
+
+zupt_integrate() applies zero-velocity updates: velocity is zero on every
+stationary sample, each moving segment is integrated from rest at its start,
+and (remove_drift=True) the linear ramp that brings the velocity back to zero
+at the segment's end is subtracted, which removes the effect of a constant
+accelerometer bias over the segment.
+
+Example:
+    stationary = detect_stationary(accel, gyro, window=20)     # stationary.py
+    velocity, position = zupt_integrate(world_accel, t, stationary)
+"""
+import numpy as np
+
+
+def cumulative_integral(y, t, method='trapezoid'):
+    """
+    Integral of y (N, ...) over timestamps t (N,), zero at t[0].
+
+    Returns:
+        ndarray: Same shape as y.
+    """
+    y = np.asarray(y, dtype=float)
+    t = np.asarray(t, dtype=float)
+    out = np.zeros_like(y)
+    if len(y) < 2:
+        return out
+    dt = np.diff(t).reshape((-1,) + (1,) * (y.ndim - 1))
+    if method == 'trapezoid':
+        np.cumsum(0.5 * (y[1:] + y[:-1]) * dt, axis=0, out=out[1:])
+    elif method == 'euler':
+        np.cumsum(y[1:] * dt, axis=0, out=out[1:])
+    elif method == 'simpson':
+        from scipy.integrate import cumulative_simpson
+        out[1:] = cumulative_simpson(y, x=t, axis=0)
+    else:
+        raise ValueError(f"unknown integration method '{method}'")
+    return out
+
+
+def integrate_acceleration(accel, t, method='trapezoid'):
+    """
+    Velocity and position from acceleration, both zero at t[0].
+
+    Returns:
+        velocity, position (ndarray): (N, 3) each.
+    """
+    velocity = cumulative_integral(accel, t, method)
+    return velocity, cumulative_integral(velocity, t, method)
+
+
+def _segment_bounds(stationary):
+    """
+    For every sample, the index of the last stationary sample at or before it
+    (0 if none) and of the first at or after it (-1 if none).
+    """
+    n = len(stationary)
+    idx = np.arange(n)
+    start = np.maximum.accumulate(np.where(stationary, idx, 0))
+    end = np.where(stationary, idx, n)
+    end = np.minimum.accumulate(end[::-1])[::-1]
+    return start, np.where(end == n, -1, end)
+
+
+def zupt_velocity(accel, t, stationary, method='trapezoid', remove_drift=True):
+    """
+    Velocity with zero-velocity updates.
+
+    Parameters:
+        accel (ndarray): (N, 3) world-frame acceleration, gravity removed.
+        t (ndarray): (N,) timestamps in seconds.
+        stationary (ndarray): (N,) bool, e.g. from stationary.detect_stationary().
+        method (str): See cumulative_integral().
+        remove_drift (bool): Subtract, in each moving segment that ends in a
+            stationary sample, the linear drift that makes its final velocity
+            nonzero. A trailing segment that never comes to rest is left as is.
+
+    Returns:
+        ndarray: (N, 3) velocity; zero wherever stationary is True.
+    """
+    t = np.asarray(t, dtype=float)
+    stationary = np.asarray(stationary, dtype=bool)
+    V = cumulative_integral(accel, t, method)
+    start, end = _segment_bounds(stationary)
+    velocity = V - V[start]
+
+    if remove_drift:
+        closed = (end >= 0) & ~stationary
+        s, e = start[closed], end[closed]
+        span = t[e] - t[s]
+        frac = np.divide(t[closed] - t[s], span, out=np.zeros_like(span), where=span > 0)
+        velocity[closed] -= (V[e] - V[s]) * frac[:, None]
+
+    velocity[stationary] = 0.0
+    return velocity
+
+
+def zupt_integrate(accel, t, stationary, method='trapezoid', remove_drift=True):
+    """
+    ZUPT velocity (zupt_velocity()) and the position integrated from it.
+
+    Returns:
+        velocity, position (ndarray): (N, 3) each, position zero at t[0].
+    """
+    velocity = zupt_velocity(accel, t, stationary, method, remove_drift)
+    return velocity, cumulative_integral(velocity, t, method)
+
+
+if __name__ == "__main__":
+    import time
+
+    # 10 minutes at ~1 kHz with jittered timestamps: rest / move / rest ...
+    rng = np.random.default_rng(0)
+    n = 600000
+    t = np.cumsum(rng.uniform(0.0009, 0.0011, n))
+    moving = np.repeat(rng.random(n // 2000) < 0.5, 2000)
+    true_accel = np.where(moving[:, None], np.sin(2 * np.pi * t)[:, None] * [0.5, 0.2, 0.1], 0.0)
+    bias = np.array([0.02, -0.01, 0.015])
+    accel = true_accel + bias + rng.normal(scale=0.05, size=(n, 3))
+
+    def loop_zupt(accel, t, stationary):
+        # kalmanTest.apply_zupt_and_reintegrate()
+        velocity = np.zeros_like(accel)
+        position = np.zeros_like(accel)
+        for i in range(1, len(t)):
+            dt = t[i] - t[i - 1]
+            velocity[i] = velocity[i - 1] + 0.5 * (accel[i] + accel[i - 1]) * dt
+            if stationary[i]:
+                velocity[i] = np.zeros(3)
+            position[i] = position[i - 1] + 0.5 * (velocity[i] + velocity[i - 1]) * dt
+        return velocity, position
+
+    t0 = time.perf_counter()
+    v_ref, p_ref = loop_zupt(accel, t, ~moving)
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    v_vec, p_vec = zupt_integrate(accel, t, ~moving, remove_drift=False)
+    t_vec = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    v_fix, p_fix = zupt_integrate(accel, t, ~moving)
+    t_fix = time.perf_counter() - t0
+    _, p_true = integrate_acceleration(true_accel, t)
+
+    print(f"{n} samples")
+    print(f"per-sample loop:              {t_loop * 1e3:8.1f} ms")
+    print(f"zupt_integrate:               {t_vec * 1e3:8.1f} ms  (max difference {np.abs(p_vec - p_ref).max():.2e} m)")
+    print(f"zupt_integrate, drift removed {t_fix * 1e3:8.1f} ms")
+    print(f"final position error: ZUPT {np.linalg.norm(p_vec[-1] - p_true[-1]):.3f} m, "
+          f"ZUPT + drift removal {np.linalg.norm(p_fix[-1] - p_true[-1]):.3f} m")
+
+    t_short = t[:2001]
+    for method in ('euler', 'trapezoid', 'simpson'):
+        v, p = integrate_acceleration(np.cos(t_short)[:, None], t_short, method)
+        exact = 1 - np.cos(t_short) + np.cos(t_short[0]) - 1 - np.sin(t_short[0]) * (t_short - t_short[0])
+        print(f"{method:<9} position error on cos(t): {np.abs(p[:, 0] - exact).max():.2e}")
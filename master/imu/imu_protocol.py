@@ -0,0 +1,288 @@
+"""
+Compact binary framing for 9-DOF IMU samples.
+
+The text output of IMU_Arduino is ~125 bytes per sample and needs three regex
+searches to parse. With BINARY_FRAMES enabled the sketch instead sends one
+fixed 28-byte frame per sample (little-endian):
+
+    offset  size  field
+    0       2     sync bytes 0xAA 0x55
+    2       2     uint16 sequence counter (wraps at 65536)
+    4       4     uint32 device timestamp, micros()
+    8       18    9 x int16: ax ay az (0.01 m/s^2), gx gy gz (0.001 rad/s),
+                  mx my mz (0.05 uT; the AK09916 LSB of 0.15 uT is exact)
+    26      2     uint16 Fletcher-16 checksum over bytes 2..25
+
+FrameDecoder turns an arbitrary stream of bytes into a NumPy structured array,
+resynchronizing on the sync bytes whenever a frame is corrupt or truncated.
+The 32-bit micros() timestamp wraps every ~71.6 minutes; the decoder unwraps
+it, so the decoded 't' keeps increasing for the whole session.
+"""
+import struct
+
+import numpy as np
+
+SYNC = b'\xAA\x55'
+FRAME_SIZE = 28
+BODY_START = 2
+BODY_END = 26
+
+# Scale from int16 counts to physical units, in parse() order
+ACCEL_SCALE = 0.01
+GYRO_SCALE = 0.001
+MAG_SCALE = 0.05
+SCALES = np.array([ACCEL_SCALE] * 3 + [GYRO_SCALE] * 3 + [MAG_SCALE] * 3)
+
+# Raw on-the-wire layout
+RAW_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('seq', '<u2'),
+    ('t_us', '<u4'),
+    ('counts', '<i2', (9,)),
+    ('checksum', '<u2'),
+])
+assert RAW_DTYPE.itemsize == FRAME_SIZE
+
+# Decoded output
+FRAME_DTYPE = np.dtype([
+    ('seq', '<u2'),
+    ('t', '<f8'),        # device time in seconds, unwrapped across micros() overflow
+    ('accel', '<f8', (3,)),
+    ('gyro', '<f8', (3,)),
+    ('mag', '<f8', (3,)),
+])
+
+_STRUCT = struct.Struct('<2sHI9h')
+SEQ_MODULUS = 1 << 16
+T_US_MODULUS = 1 << 32
+# Fletcher-16 sum2 weights: byte i of an n-byte body contributes (n - i) times
+_FLETCHER_WEIGHTS = np.arange(BODY_END - BODY_START, 0, -1, dtype=np.int64)
+
+
+def fletcher16(body):
+    """Fletcher-16 checksum of a bytes-like object, as sent by the Arduino."""
+    sum1 = sum2 = 0
+    for b in body:
+        sum1 = (sum1 + b) % 255
+        sum2 = (sum2 + sum1) % 255
+    return (sum2 << 8) | sum1
+
+
+def _fletcher16_rows(bodies):
+    """Vectorized Fletcher-16 over each row of a (N, 24) uint8 array."""
+    bodies = bodies.astype(np.int64)
+    sum1 = bodies.sum(axis=1) % 255
+    sum2 = (bodies @ _FLETCHER_WEIGHTS) % 255
+    return (sum2 << 8) | sum1
+
+
+def encode_frame(seq, t_us, values):
+    """
+    Builds one binary frame.
+
+    Parameters:
+        seq (int): Sequence counter (taken modulo 65536).
+        t_us (int): Device timestamp in microseconds (taken modulo 2**32).
+        values (sequence): (ax, ay, az, gx, gy, gz, mx, my, mz) in physical units.
+
+    Returns:
+        bytes: A FRAME_SIZE-byte frame.
+    """
+    counts = np.clip(np.rint(np.asarray(values, dtype=float) / SCALES), -32768, 32767).astype(int)
+    head = _STRUCT.pack(SYNC, seq & 0xFFFF, t_us & 0xFFFFFFFF, *counts)
+    return head + struct.pack('<H', fletcher16(head[BODY_START:]))
+
+
+def frames_to_rows(frames):
+    """
+    Converts a FRAME_DTYPE array to a (N, 9) float array in parse() order
+    (ax, ay, az, gx, gy, gz, mx, my, mz).
+    """
+    return np.hstack((frames['accel'], frames['gyro'], frames['mag']))
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the binary IMU stream.
+
+    feed() can be called with chunks of any size; bytes belonging to an
+    incomplete trailing frame are kept for the next call. Corrupt frames and
+    stray bytes are skipped by searching for the next sync pattern.
+
+    Counters:
+        frames           frames decoded
+        bad_frames       sync found but checksum mismatch, outside any frame
+                         that decoded cleanly
+        skipped_bytes    bytes discarded while resynchronizing
+        lost_frames      gaps in the sequence counter between decoded frames
+        duplicate_frames frames whose sequence number was already passed
+                         (repeated or reordered); not counted as lost
+    """
+
+    def __init__(self):
+        self._pending = b''
+        self._last_seq = None    # newest sequence number so far, unwrapped
+        self._last_t_us = None   # timestamp of the previous frame, unwrapped
+        self.frames = 0
+        self.bad_frames = 0
+        self.skipped_bytes = 0
+        self.lost_frames = 0
+        self.duplicate_frames = 0
+
+    def feed(self, data):
+        """
+        Decodes as many complete frames as possible.
+
+        Parameters:
+            data (bytes): Newly received bytes.
+
+        Returns:
+            ndarray: FRAME_DTYPE structured array (possibly empty).
+        """
+        buf = self._pending + bytes(data)
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        n = raw.size
+        if n < FRAME_SIZE:
+            self._pending = buf
+            return np.empty(0, dtype=FRAME_DTYPE)
+
+        # Every position where a frame could start
+        starts = np.flatnonzero((raw[:-1] == 0xAA) & (raw[1:] == 0x55))
+        complete = starts[starts + FRAME_SIZE <= n]
+
+        if complete.size:
+            rows = raw[complete[:, None] + np.arange(FRAME_SIZE)]
+            stored = rows[:, BODY_END].astype(np.int64) | (rows[:, BODY_END + 1].astype(np.int64) << 8)
+            ok = _fletcher16_rows(rows[:, BODY_START:BODY_END]) == stored
+            failed = complete[~ok]
+            good = complete[ok]
+            rows = rows[ok]
+            # A valid frame could in principle start inside another one;
+            # keep the earliest and drop anything it overlaps
+            if good.size > 1 and np.any(np.diff(good) < FRAME_SIZE):
+                keep = np.zeros(good.size, dtype=bool)
+                end = -1
+                for i, s in enumerate(good):
+                    if s >= end:
+                        keep[i] = True
+                        end = s + FRAME_SIZE
+                good, rows = good[keep], rows[keep]
+            self.bad_frames += _count_outside(failed, good)
+        else:
+            good = complete
+            rows = np.empty((0, FRAME_SIZE), dtype=np.uint8)
+
+        # Decide how much of the buffer has been consumed: everything up to the
+        # last good frame, plus any trailing bytes that cannot start a frame
+        consumed = int(good[-1]) + FRAME_SIZE if good.size else 0
+        incomplete = starts[starts + FRAME_SIZE > n]
+        incomplete = incomplete[incomplete >= consumed]
+        if incomplete.size:
+            keep_from = int(incomplete[0])
+        else:
+            # A trailing 0xAA may be the first half of the next sync
+            keep_from = n - 1 if raw[-1] == 0xAA else n
+        keep_from = max(keep_from, consumed)
+        self.skipped_bytes += (keep_from - good.size * FRAME_SIZE)
+        self._pending = buf[keep_from:]
+
+        return self._decode(rows)
+
+    def _decode(self, rows):
+        frames = np.empty(len(rows), dtype=FRAME_DTYPE)
+        if not len(rows):
+            return frames
+        raw = np.ascontiguousarray(rows).view(RAW_DTYPE).reshape(-1)
+        values = raw['counts'] * SCALES
+        frames['seq'] = raw['seq']
+        frames['t'] = self._unwrap_time(raw['t_us']) * 1e-6
+        frames['accel'] = values[:, 0:3]
+        frames['gyro'] = values[:, 3:6]
+        frames['mag'] = values[:, 6:9]
+        self._count_sequence(raw['seq'])
+        self.frames += len(rows)
+        return frames
+
+
+    def _count_sequence(self, seq):
+        # Unwrap the uint16 counter by taking every step as the shortest
+        # signed distance; a frame at or below the newest number seen so far
+        # is a duplicate, and only steps past it count as lost frames
+        seq = _unwrap(seq, SEQ_MODULUS, self._last_seq)
+        newest = np.maximum.accumulate(seq)
+        if self._last_seq is not None:
+            newest = np.maximum(newest, self._last_seq)
+            previous = np.concatenate(([self._last_seq], newest[:-1]))
+        else:
+            previous = np.concatenate(([seq[0] - 1], newest[:-1]))
+        advance = seq - previous
+        self.duplicate_frames += int(np.count_nonzero(advance <= 0))
+        self.lost_frames += int((advance[advance > 0] - 1).sum())
+        self._last_seq = int(newest[-1])
+
+    def _unwrap_time(self, t_us):
+        t_us = _unwrap(t_us, T_US_MODULUS, self._last_t_us)
+        self._last_t_us = int(t_us[-1])
+        return t_us
+
+
+def _unwrap(values, modulus, last=None):
+    """
+    Unwraps a counter taken modulo `modulus` into int64, treating each step as
+    the signed distance of smallest magnitude (so small backward steps stay
+    backward instead of becoming a wrap).
+
+    Parameters:
+        values (ndarray): Counter values in [0, modulus).
+        last (int): Unwrapped value preceding values[0], from the previous
+            chunk; None starts at values[0].
+    """
+    values = values.astype(np.int64)
+    if last is None:
+        first = values[0]
+    else:
+        first = last + ((values[0] - last + modulus // 2) % modulus - modulus // 2)
+    steps = (np.diff(values) + modulus // 2) % modulus - modulus // 2
+    out = np.empty(len(values), dtype=np.int64)
+    out[0] = first
+    np.cumsum(steps, out=out[1:])
+    out[1:] += first
+    return out
+
+
+def _count_outside(candidates, frames):
+    """Number of candidate starts whose FRAME_SIZE bytes overlap none of the frames."""
+    if not candidates.size or not frames.size:
+        return int(candidates.size)
+    # Nearest frame starting at or before each candidate, and the one after it
+    before = np.searchsorted(frames, candidates, side='right') - 1
+    inside = (before >= 0) & (candidates < frames[np.maximum(before, 0)] + FRAME_SIZE)
+    after = np.minimum(before + 1, frames.size - 1)
+    into_next = (before + 1 < frames.size) & (frames[after] < candidates + FRAME_SIZE)
+    return int(np.count_nonzero(~(inside | into_next)))
+
+
+def decode_bytes(data):
+    """Decodes a complete recording of binary frames in one call."""
+    return FrameDecoder().feed(data)
+
+
+if __name__ == "__main__":
+    # Round-trip check with a corrupted frame and a stray byte in the middle
+    sample = (0.14, 0.73, 0.26, -0.00, -0.01, 0.01, -5.70, 7.20, -8.00)
+    stream = bytearray()
+    for i in range(10):
+        stream += encode_frame(i, 100000 * i, sample)
+    stream[3 * FRAME_SIZE + 10] ^= 0xFF
+    stream[6 * FRAME_SIZE:6 * FRAME_SIZE] = b'\x00'
+
+    decoder = FrameDecoder()
+    frames = np.concatenate([decoder.feed(stream[i:i + 7]) for i in range(0, len(stream), 7)])
+    print(frames_to_rows(frames)[0])
+    print(f"{decoder.frames} frames, {decoder.bad_frames} bad, "
+          f"{decoder.skipped_bytes} bytes skipped, {decoder.lost_frames} lost, "
+          f"{decoder.duplicate_frames} duplicate")
+    line = ("Accel X: 0.14 Y: 0.73 Z: 0.26 m/s^2 //Mag X: -5.70 Y: 7.20 Z: -8.00 uT //"
+            "Gyro X: -0.00 Y: -0.01 Z: 0.01 radians/s\r\n")
+    print(f"text: {len(line)} bytes/sample, binary: {FRAME_SIZE} bytes/sample "
+          f"({len(line) / FRAME_SIZE:.1f}x)")
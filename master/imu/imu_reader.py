@@ -2,70 +2,61 @@ import serial
 import time
 import re
 
-def parse(line):
+# Regular expressions to extract data from the line (compiled once at import)
+pattern_accel = re.compile(r'Accel X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*m/s\^2')
+pattern_gyro = re.compile(r'Gyro X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*radians/s')
+pattern_mag = re.compile(r'Mag X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*uT')
+
+
+def try_parse(line):
     """
-    Parses a single line of text from the Arduino serial output to extract
-    accelerometer, gyroscope, and magnetometer data.
+    Parses a single line of IMU text like parse(), but returns None instead
+    of a row of zeros when any of the sensor values is missing.
 
     Parameters:
         line (str): A string containing IMU sensor readings from the Arduino.
 
     Returns:
-        tuple: A 9-element tuple containing float values in the order:
-               (ax, ay, az, gx, gy, gz, mx, my, mz)
-
-    Raises:
-        ValueError: If any of the sensor values are missing or can't be parsed.
+        tuple or None: (ax, ay, az, gx, gy, gz, mx, my, mz) as floats, or None.
     """
-    
-    # Regular expressions to extract data from the line
-    pattern_accel = re.compile(r'Accel X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*m/s\^2')
-    pattern_gyro = re.compile(r'Gyro X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*radians/s')
-    pattern_mag = re.compile(r'Mag X:\s*(-?\d+(?:\.\d+)?)\s*Y:\s*(-?\d+(?:\.\d+)?)\s*Z:\s*(-?\d+(?:\.\d+)?)\s*uT')
+    match_accel = pattern_accel.search(line)
+    if not match_accel:
+        return None
+    match_gyro = pattern_gyro.search(line)
+    if not match_gyro:
+        return None
+    match_mag = pattern_mag.search(line)
+    if not match_mag:
+        return None
 
+    ax, ay, az = map(float, match_accel.groups())
+    gx, gy, gz = map(float, match_gyro.groups())
+    mx, my, mz = map(float, match_mag.groups())
+    return ax, ay, az, gx, gy, gz, mx, my, mz
 
-    # Initialize all values to None
-    ax = ay = az = gx = gy = gz = mx = my = mz = None
 
-    #print(f"Parsing line: {line}")
-    # Extract acceleration data
-    match_accel = pattern_accel.search(line)
-    #print(f"Accel match: {match_accel}")
-    if match_accel:
-        ax = float(match_accel.group(1))
-        ay = float(match_accel.group(2))
-        az = float(match_accel.group(3))
+def parse(line):
+    """
+    Parses a single line of text from the Arduino serial output to extract
+    accelerometer, gyroscope, and magnetometer data.
 
-    # Extract gyroscope data
-    match_gyro = pattern_gyro.search(line)
-    if match_gyro:
-        gx = float(match_gyro.group(1))
-        gy = float(match_gyro.group(2))
-        gz = float(match_gyro.group(3))
+    Parameters:
+        line (str): A string containing IMU sensor readings from the Arduino.
 
-    # Extract magnetometer data
-    match_mag = pattern_mag.search(line)
-    if match_mag:
-        mx = float(match_mag.group(1))
-        my = float(match_mag.group(2))
-        mz = float(match_mag.group(3))
+    Returns:
+        tuple: A 9-element tuple containing float values in the order:
+               (ax, ay, az, gx, gy, gz, mx, my, mz)
+               If any of the sensor values are missing, all values are 0.
+    """
+    values = try_parse(line)
 
-    # Check if any values are still None (i.e., failed parsing)
-    if None in [ax, ay, az, gx, gy, gz, mx, my, mz]:
+    # Check if any values failed to parse
+    if values is None:
         #If values are none initialize all to 0
         print("Failed to parse all values, initializing to 0")
-        ax = 0
-        ay = 0
-        az = 0
-        gx = 0
-        gy = 0
-        gz = 0
-        mx = 0
-        my = 0
-        mz = 0
-    
+        return 0, 0, 0, 0, 0, 0, 0, 0, 0
 
-    return ax, ay, az, gx, gy, gz, mx, my, mz
+    return values
 
 
 def printlst(lst):
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+
+import serial
+
+from imu_protocol import FrameDecoder, frames_to_rows
+from imu_reader import try_parse
+
+
+class IMUStream:
+    """
+    Long-lived IMU serial session.
+
+    read_imu_data() opens the port, waits for the Arduino to reset and reads a
+    single line on every call. IMUStream opens the port once and keeps reading
+    on a background thread, so the caller can grab the newest sample (or every
+    sample received since the last call) without ever blocking on the serial
+    port.
+
+    Samples keep the parse() layout: (ax, ay, az, gx, gy, gz, mx, my, mz).
+    With binary=True the port is decoded as imu_protocol frames (Arduino built
+    with BINARY_FRAMES) instead of text lines.
+
+    Example:
+        with IMUStream('/dev/ttyACM0') as imu:
+            while True:
+                sample = imu.latest()
+                if sample is not None:
+                    ax, ay, az, gx, gy, gz, mx, my, mz = sample
+    """
+
+    def __init__(self, port='COM6', baud_rate=115200, buffer_size=1024,
+                 settle_time=2.0, timeout=0.05, binary=False):
+        """
+        Parameters:
+            port (str): The serial port to which the Arduino is connected.
+            baud_rate (int): The baud rate for serial communication.
+            buffer_size (int): Number of samples kept before the oldest ones
+                are dropped when nobody drains the stream.
+            settle_time (float): Seconds to wait after opening the port so the
+                Arduino can finish its reset (0 for a pseudo-terminal).
+            timeout (float): Serial read timeout; bounds how long stop() waits.
+            binary (bool): Decode binary frames instead of text lines.
+        """
+        self.port = port
+        self.baud_rate = baud_rate
+        self.settle_time = settle_time
+        self.timeout = timeout
+        self.binary = binary
+        self.decoder = FrameDecoder() if binary else None
+
+        # deque(maxlen) drops the oldest sample once full; appends and
+        # popleft are atomic, so no lock is needed between the two threads
+        self._buffer = deque(maxlen=buffer_size)
+        self._latest = None
+        self._serial = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # Counters for diagnostics / benchmarking
+        self.samples_received = 0
+        self.samples_dropped = 0
+        self.parse_errors = 0
+        self.error = None
+
+    # ——— lifecycle ———
+    def start(self):
+        """Open the serial port and start the background reader thread."""
+        if self._thread is not None:
+            return self
+        self._serial = serial.Serial(self.port, self.baud_rate, timeout=self.timeout)
+        if self.settle_time:
+            # Allow the Arduino to reset, then clear any partial line
+            time.sleep(self.settle_time)
+            self._serial.reset_input_buffer()
+        self._stop_event.clear()
+        target = self._read_binary_loop if self.binary else self._read_loop
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread and close the serial port."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ——— background reader ———
+    def _read_loop(self):
+        arduino = self._serial
+        buffer = self._buffer
+        try:
+            while not self._stop_event.is_set():
+                raw = arduino.readline()
+                if not raw:
+                    continue
+                values = try_parse(raw.decode('utf-8', errors="ignore"))
+                if values is None:
+                    self.parse_errors += 1
+                    continue
+                sample = (time.monotonic(), values)
+                if len(buffer) == buffer.maxlen:
+                    self.samples_dropped += 1
+                buffer.append(sample)
+                self._latest = sample
+                self.samples_received += 1
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self.error = e
+                print(f"[IMU Serial error] {e}")
+
+    def _read_binary_loop(self):
+        arduino = self._serial
+        buffer = self._buffer
+        decoder = self.decoder
+        try:
+            while not self._stop_event.is_set():
+                data = arduino.read(max(1, arduino.in_waiting))
+                if not data:
+                    continue
+                t = time.monotonic()
+                frames = decoder.feed(data)
+                self.parse_errors = decoder.bad_frames
+                if not len(frames):
+                    continue
+                for values in frames_to_rows(frames).tolist():
+                    sample = (t, tuple(values))
+                    if len(buffer) == buffer.maxlen:
+                        self.samples_dropped += 1
+                    buffer.append(sample)
+                self._latest = sample
+                self.samples_received += len(frames)
+        except Exception as e:
+            if not self._stop_event.is_set():
+                self.error = e
+                print(f"[IMU Serial error] {e}")
+
+    # ——— consumer API ———
+    def latest(self):
+        """
+        Returns the newest parsed sample (ax, ay, az, gx, gy, gz, mx, my, mz),
+        or None if nothing has been received yet. Does not consume the buffer.
+        """
+        sample = self._latest
+        return None if sample is None else sample[1]
+
+    def latest_stamped(self):
+        """Same as latest(), but returns (t_monotonic, sample) or None."""
+        return self._latest
+
+    def read_all(self):
+        """
+        Returns every sample received since the previous call, oldest first,
+        as a list of 9-element tuples. Returns an empty list if none are pending.
+        """
+        return [values for _, values in self.read_all_stamped()]
+
+    def read_all_stamped(self):
+        """Same as read_all(), but each entry is (t_monotonic, sample)."""
+        buffer = self._buffer
+        pending = []
+        for _ in range(len(buffer)):
+            pending.append(buffer.popleft())
+        return pending
+
+    def wait_for_sample(self, timeout=5.0):
+        """
+        Blocks until at least one sample has arrived (useful right after
+        start()). Returns the newest sample, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while self._latest is None and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.latest()
+
+
+def main():
+    """
+    Print IMU samples as they arrive until interrupted.
+    """
+    try:
+        with IMUStream() as imu:
+            while True:
+                for sample in imu.read_all():
+                    print(sample)
+                time.sleep(0.05)
+    except KeyboardInterrupt:
+        print("Keyboard Interrupt")
+    except Exception as e:
+        print(f"Error reading IMU data: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Magnetometer hard/soft-iron calibration.
+
+Rotating the IMU through as many orientations as possible traces the local
+field as an ellipsoid instead of a sphere centred on the origin: the offset of
+its centre is the hard-iron bias B, its shape the soft-iron distortion.
+fit_ellipsoid() fits a general ellipsoid to the whole recording with one
+linear least-squares solve and returns the correction
+
+    calibrated = (mag - B) @ A_inv
+
+which maps the ellipsoid back onto a sphere. Results are stored per device in
+a small JSON cache (mag_calibration.json next to this file) and loaded with
+load_calibration(); MagCalibration.apply() corrects an (N, 3) block in one
+matrix operation and never modifies its input.
+
+Usage:
+    python mag_calibration.py RECORDING [RECORDING ...] --device NAME
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Parameters previously hardcoded in dof9_filter (ICM-20948), used when a device has no
+# cached calibration
+MAG_HARD_IRON = [109.06238802, 37.90448955, 125.2127988]
+MAG_SOFT_IRON_INV = [[2.58891148, 0.03830976, -0.05865281],[0.03830976, 2.79695092, 0.03519644], [-0.05865281, 0.03519644, 2.72060039]]
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mag_calibration.json')
+
+
+class MagCalibration:
+    """
+    Hard-iron bias and inverse soft-iron matrix for one magnetometer.
+
+    Attributes:
+        hard_iron (ndarray): (3,) bias B in the sensor's units.
+        soft_iron_inv (ndarray): (3, 3) matrix A_inv.
+        field_strength (float): Radius of the sphere the data is mapped onto
+            (None if unknown).
+        residual (float): Relative RMS deviation of the calibrated magnitudes
+            from field_strength on the fitted data (None if unknown).
+        samples (int): Number of samples the fit used.
+    """
+
+    def __init__(self, hard_iron, soft_iron_inv, field_strength=None, residual=None, samples=0):
+        self.hard_iron = np.asarray(hard_iron, dtype=float).reshape(3)
+        self.soft_iron_inv = np.asarray(soft_iron_inv, dtype=float).reshape(3, 3)
+        self.field_strength = field_strength
+        self.residual = residual
+        self.samples = samples
+
+    def apply(self, mag):
+        """Calibrates an (N, 3) block (or a single (3,) sample); returns a new array."""
+        return (np.asarray(mag, dtype=float) - self.hard_iron) @ self.soft_iron_inv
+
+    def to_dict(self):
+        return {'hard_iron': self.hard_iron.tolist(),
+                'soft_iron_inv': self.soft_iron_inv.tolist(),
+                'field_strength': self.field_strength,
+                'residual': self.residual,
+                'samples': self.samples}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['hard_iron'], d['soft_iron_inv'], d.get('field_strength'),
+                   d.get('residual'), d.get('samples', 0))
+
+    def __repr__(self):
+        return (f"MagCalibration(hard_iron={self.hard_iron.round(3).tolist()}, "
+                f"field_strength={self.field_strength}, residual={self.residual}, samples={self.samples})")
+
+
+DEFAULT_CALIBRATION = MagCalibration(MAG_HARD_IRON, MAG_SOFT_IRON_INV)
+
+
+def fit_ellipsoid(mag, field_strength=None):
+    """
+    Least-squares ellipsoid fit of raw magnetometer samples.
+
+    Solves  a x^2 + b y^2 + c z^2 + 2d xy + 2e xz + 2f yz + 2g x + 2h y + 2i z = 1
+    for all samples at once, then reads the centre and axes off the quadric.
+
+    Parameters:
+        mag (ndarray): (N, 3) raw samples covering many orientations (N >= 9).
+        field_strength (float): Radius of the output sphere. Defaults to the
+            geometric mean of the fitted radii, which keeps the sensor's units.
+
+    Returns:
+        MagCalibration
+    """
+    mag = np.asarray(mag, dtype=float).reshape(-1, 3)
+    if len(mag) < 9:
+        raise ValueError("need at least 9 samples to fit an ellipsoid")
+    x, y, z = mag.T
+    D = np.column_stack([x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z, 2 * x, 2 * y, 2 * z])
+    p, *_ = np.linalg.lstsq(D, np.ones(len(mag)), rcond=None)
+    a, b, c, d, e, f, g, h, i = p
+
+    M = np.array([[a, d, e],
+                  [d, b, f],
+                  [e, f, c]])
+    v = np.array([g, h, i])
+    center = -np.linalg.solve(M, v)
+    k = 1.0 + center @ M @ center
+    eigvals, eigvecs = np.linalg.eigh(M / k)
+    if np.any(eigvals <= 0):
+        raise ValueError("samples do not describe an ellipsoid; rotate the sensor through more orientations")
+
+    radii = 1.0 / np.sqrt(eigvals)
+    if field_strength is None:
+        field_strength = float(np.prod(radii) ** (1.0 / 3.0))
+    soft_iron_inv = field_strength * (eigvecs * np.sqrt(eigvals)) @ eigvecs.T
+
+    calibration = MagCalibration(center, soft_iron_inv, field_strength, samples=len(mag))
+    norms = np.linalg.norm(calibration.apply(mag), axis=1)
+    calibration.residual = float(np.sqrt(np.mean((norms / field_strength - 1.0) ** 2)))
+    return calibration
+
+
+# ——— per-device cache ———
+_cache_memo = {}
+
+
+def _read_cache(path):
+    # Re-read only when the file changes; filters are built often
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    memo = _cache_memo.get(path)
+    if memo is not None and memo[0] == mtime:
+        return memo[1]
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    _cache_memo[path] = (mtime, cache)
+    return cache
+
+
+def save_calibration(device, calibration, path=CACHE_PATH):
+    """Stores a calibration under `device` in the JSON cache."""
+    cache = dict(_read_cache(path))
+    entry = calibration.to_dict()
+    entry['fitted'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    cache[device] = entry
+    with open(path, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+
+def load_calibration(device='default', path=CACHE_PATH):
+    """Cached calibration for `device`, or DEFAULT_CALIBRATION if there is none."""
+    entry = _read_cache(path).get(device)
+    return MagCalibration.from_dict(entry) if entry else DEFAULT_CALIBRATION
+
+
+def load_mag_samples(path):
+    """Raw (N, 3) magnetometer samples from an IMU CSV or multi-line text log."""
+    if path.endswith('.txt'):
+        here = os.path.dirname(os.path.abspath(__file__))
+        loader_dir = os.path.join(here, '..', '..', 'testing', 'new_imu')
+        if loader_dir not in sys.path:
+            sys.path.append(loader_dir)
+        from imu_log_loader import load_imu_log
+        data, _ = load_imu_log(path)
+        return data[:, 7:10]
+    import pandas as pd
+    df = pd.read_csv(path, skipinitialspace=True)
+    df.columns = df.columns.str.strip()
+    return df[['Mag_X', 'Mag_Y', 'Mag_Z']].to_numpy(dtype=float)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit hard/soft-iron magnetometer calibration from a rotation recording.")
+    parser.add_argument('recordings', nargs='+', help="IMU CSV or text logs, pooled into one fit")
+    parser.add_argument('--device', default='default', help="cache key for this IMU")
+    parser.add_argument('--field-strength', type=float, default=None,
+                        help="radius of the calibrated sphere (default: keep sensor units)")
+    parser.add_argument('--cache', default=CACHE_PATH)
+    parser.add_argument('--dry-run', action='store_true', help="print the fit without saving it")
+    args = parser.parse_args()
+
+    mag = np.vstack([load_mag_samples(path) for path in args.recordings])
+    t0 = time.perf_counter()
+    try:
+        calibration = fit_ellipsoid(mag, args.field_strength)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        print(f"Calibration failed: {e}")
+        return 1
+    elapsed = time.perf_counter() - t0
+
+    print(f"{len(mag)} samples fitted in {elapsed * 1000:.1f} ms")
+    print("hard iron B:   ", np.round(calibration.hard_iron, 4))
+    print("soft iron A_inv:\n", np.round(calibration.soft_iron_inv, 5))
+    print(f"field strength: {calibration.field_strength:.3f}, residual: {calibration.residual * 100:.2f} %")
+    if not args.dry_run:
+        save_calibration(args.device, calibration, args.cache)
+        print(f"saved as '{args.device}' in {args.cache}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
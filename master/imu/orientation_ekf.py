@@ -0,0 +1,478 @@
+"""
+Fixed-size EKF for the 7-state orientation + gyro bias filter.
+
+State x = [q0, q1, q2, q3, bgx, bgy, bgz] (scalar-first quaternion and gyro
+bias), with the same process and measurement models as OrientationBiasEKF in
+testing/new_imu/ekf.py and testing/minimap/fixedendpointtest.py:
+
+    predict   q <- (I + dt/2 * Omega(gyro - bias)) q,  P <- F P F^T + Q
+    update    accel+mag direction (6 rows, R = accmag_noise * I), then the
+              tilt-compensated heading (1 row, R = yaw_noise)
+
+Unlike the filterpy ExtendedKalmanFilter those classes wrap, every matrix
+(F, P, Q, K and the work arrays) is allocated once in __init__ and updated in
+place, the measurement Jacobians are closed-form (ekf_jacobians.py) and only
+touch the four quaternion columns, and the heading step is a scalar update
+with no matrix inverse. Both covariance updates use the Joseph form
+P = (I - K H) P (I - K H)^T + K R K^T and are re-symmetrized, so P stays
+symmetric positive definite over long recordings.
+
+Example:
+    ekf = OrientationEKF(accmag_noise=1e-2)
+    for gyro, accel, mag, dt in samples:
+        ekf.predict(gyro, dt)
+        q = ekf.update(accel, mag)
+
+update_accel() and update_mag() apply the two halves of update() separately,
+so the magnetometer can be fused at a lower rate than the accelerometer.
+
+ErrorStateOrientationEKF is the multiplicative variant with a 6-dimensional
+error state (attitude + gyro bias) behind the same interface.
+
+Run this file to compare OrientationEKF against the filterpy implementation
+on testing/new_imu/Trial1_Y_extracted.csv, and both filters on a simulated
+recording with known orientation.
+"""
+import numpy as np
+
+from ekf_jacobians import accmag_jacobian, yaw_jacobian
+
+
+class OrientationEKF:
+    def __init__(self, accmag_noise=1e-2, yaw_noise=1e-3, process_noise=1e-5,
+                 bias_noise=1e-9, initial_covariance=0.01, dtype=float):
+        """
+        Parameters:
+            accmag_noise (float): Variance of each normalized accel/mag component
+                (1e-2 in ekf.py, 1e-4 in fixedendpointtest.py).
+            yaw_noise (float): Variance of the heading measurement (rad^2).
+            process_noise (float): Quaternion process noise per predict.
+            bias_noise (float): Gyro bias random walk per predict.
+            initial_covariance (float): Initial P diagonal.
+            dtype: State and buffer precision (np.float32 for the constrained
+                mode in fixed_budget.py).
+        """
+        self.dtype = np.dtype(dtype)
+        self.x = np.array([1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0], dtype=dtype)
+        self.P = np.eye(7, dtype=dtype) * initial_covariance
+        self.Q = np.eye(7, dtype=dtype) * process_noise
+        self.Q[4:, 4:] = np.eye(3, dtype=dtype) * bias_noise
+        self.accmag_noise = accmag_noise
+        self.yaw_noise = yaw_noise
+
+        # Work buffers, reused on every sample
+        self._I = np.eye(7, dtype=dtype)
+        self._F = np.eye(7, dtype=dtype)
+        self._FP = np.empty((7, 7), dtype=dtype)
+        self._H = np.zeros((6, 7), dtype=dtype)
+        self._R = np.eye(6, dtype=dtype) * accmag_noise
+        self._PHT = np.empty((7, 6), dtype=dtype)
+        self._S = np.empty((6, 6), dtype=dtype)
+        self.K = np.empty((7, 6), dtype=dtype)
+        self._PHT3 = np.empty((7, 3), dtype=dtype)
+        self._S3 = np.empty((3, 3), dtype=dtype)
+        self._K3 = np.empty((7, 3), dtype=dtype)
+        self._R3 = np.eye(3, dtype=dtype) * accmag_noise
+        self._IKH = np.empty((7, 7), dtype=dtype)
+        self._KKT = np.empty((7, 7), dtype=dtype)
+        self._tmp = np.empty((7, 7), dtype=dtype)
+        self._h = np.zeros(7, dtype=dtype)
+        self._H4 = self._H[:, 0:4]
+        self._h4 = self._h[None, 0:4]
+        self._Ph = np.empty(7, dtype=dtype)
+        self._k = np.empty(7, dtype=dtype)
+
+    @property
+    def q(self):
+        return self.x[0:4]
+
+    @property
+    def gyro_bias(self):
+        return self.x[4:7]
+
+    @property
+    def F(self):
+        """Transition matrix of the last predict() (a reused buffer)."""
+        return self._F
+
+    def predict(self, gyro, dt):
+        """Propagates the quaternion with the bias-corrected gyro rate (rad/s)."""
+        x = self.x
+        wx, wy, wz = (np.asarray(gyro, dtype=self.dtype) - x[4:7]).tolist()
+        h = 0.5 * dt
+        F = self._F
+        F[0:4, 0:4] = ((1.0, -h * wx, -h * wy, -h * wz),
+                       (h * wx, 1.0, h * wz, -h * wy),
+                       (h * wy, -h * wz, 1.0, h * wx),
+                       (h * wz, h * wy, -h * wx, 1.0))
+        x[0:4] = F[0:4, 0:4] @ x[0:4]
+        # P <- F P F^T + Q
+        np.dot(F, self.P, out=self._FP)
+        np.dot(self._FP, F.T, out=self.P)
+        self.P += self.Q
+
+    def update(self, accel, mag):
+        """
+        Corrects with one accelerometer + magnetometer sample.
+
+        Returns:
+            ndarray: The normalized quaternion (a view of the state).
+        """
+        accel = np.asarray(accel, dtype=self.dtype)
+        mag = np.asarray(mag, dtype=self.dtype)
+        a_norm = np.sqrt(accel @ accel)
+        m_norm = np.sqrt(mag @ mag)
+        if a_norm == 0 or m_norm == 0:
+            return self.x[0:4]
+        y = self._gravity_residual(accel / a_norm) + self._north_residual(mag / m_norm)
+        self._direction_update(slice(0, 6), y, self._PHT, self._S, self.K, self._R)
+        self._heading_update(mag)
+        return self.x[0:4]
+
+    def update_accel(self, accel):
+        """
+        Gravity-direction rows of update() alone, for running the accelerometer
+        correction at the full IMU rate and update_mag() at a lower rate.
+        """
+        accel = np.asarray(accel, dtype=self.dtype)
+        a_norm = np.sqrt(accel @ accel)
+        if a_norm == 0:
+            return self.x[0:4]
+        self._direction_update(slice(0, 3), self._gravity_residual(accel / a_norm),
+                               self._PHT3, self._S3, self._K3, self._R3)
+        return self.x[0:4]
+
+    def update_mag(self, mag):
+        """Magnetometer rows of update() and the heading step, without the accelerometer."""
+        mag = np.asarray(mag, dtype=self.dtype)
+        m_norm = np.sqrt(mag @ mag)
+        if m_norm == 0:
+            return self.x[0:4]
+        self._direction_update(slice(3, 6), self._north_residual(mag / m_norm),
+                               self._PHT3, self._S3, self._K3, self._R3)
+        self._heading_update(mag)
+        return self.x[0:4]
+
+    # ——— measurement residuals / updates ———
+    # Predictions are rows 2 and 0 of R(q) (references [0,0,1] and [1,0,0]),
+    # evaluated on the unnormalized predicted q as in acc_mag_prediction()
+    def _gravity_residual(self, a):
+        w, qx, qy, qz = self.x[0:4].tolist()
+        ax, ay, az = a.tolist()
+        return (ax - 2 * (qx * qz - qy * w),
+                ay - 2 * (qy * qz + qx * w),
+                az - (1 - 2 * (qx * qx + qy * qy)))
+
+    def _north_residual(self, m):
+        w, qx, qy, qz = self.x[0:4].tolist()
+        mx, my, mz = m.tolist()
+        return (mx - (1 - 2 * (qy * qy + qz * qz)),
+                my - 2 * (qx * qy - qz * w),
+                mz - 2 * (qx * qz + qy * w))
+
+    def _direction_update(self, rows, y, PHT, S, K, R):
+        x = self.x
+        accmag_jacobian(x[0:4], out=self._H4)
+        H = self._H[rows]
+        np.dot(self.P[:, 0:4], H[:, 0:4].T, out=PHT)
+        np.dot(H[:, 0:4], PHT[0:4], out=S)
+        S += R
+        # K = P H^T S^-1, S symmetric
+        K[:] = np.linalg.solve(S, PHT.T).T
+        x += K @ y
+        self._joseph(K, H, self.accmag_noise)
+        x[0:4] /= np.sqrt(x[0:4] @ x[0:4])
+
+    def _heading_update(self, mag):
+        # The heading is measured with the freshly corrected orientation, as in
+        # OrientationBiasEKF, so the innovation is zero and only P is tightened.
+        x = self.x
+        yaw_jacobian(x[0:4], mag, out=self._h4)
+        self._scalar_update(self._h, 0.0, self.yaw_noise)
+        x[0:4] /= np.sqrt(x[0:4] @ x[0:4])
+
+    # ——— update helpers ———
+    def _joseph(self, K, H, r):
+        # P <- (I - K H) P (I - K H)^T + K R K^T, with R = r I
+        IKH = np.subtract(self._I, np.dot(K, H, out=self._IKH), out=self._IKH)
+        np.dot(IKH, self.P, out=self._tmp)
+        np.dot(self._tmp, IKH.T, out=self.P)
+        KKT = np.dot(K, K.T, out=self._KKT)
+        KKT *= r
+        self.P += KKT
+        self._symmetrize()
+
+    def _scalar_update(self, h, innovation, r):
+        Ph = np.dot(self.P, h, out=self._Ph)
+        s = h @ Ph + r
+        k = np.divide(Ph, s, out=self._k)
+        self.x += k * innovation
+        # Joseph form with a rank-one gain
+        IKH = np.subtract(self._I, np.outer(k, h, out=self._IKH), out=self._IKH)
+        np.dot(IKH, self.P, out=self._tmp)
+        np.dot(self._tmp, IKH.T, out=self.P)
+        kkT = np.outer(k, k, out=self._KKT)
+        kkT *= r
+        self.P += kkT
+        self._symmetrize()
+
+    def _symmetrize(self):
+        P = self.P
+        np.add(P, P.T, out=self._tmp)
+        np.multiply(self._tmp, 0.5, out=P)
+
+
+class ErrorStateOrientationEKF:
+    """
+    Multiplicative (error-state) variant of OrientationEKF.
+
+    The nominal quaternion q and gyro bias b are kept outside the filter; the
+    filter only tracks the 6-dimensional error [dtheta, db], where dtheta is a
+    small body-frame rotation (q_true = q * dq(dtheta)). P is 6x6 instead of
+    7x7 and has no direction along the quaternion norm, the gyro propagation
+    is an exact rotation and each correction is injected as a rotation, so q
+    stays a unit quaternion without a renormalization pass. Unlike the 7-state
+    models, the error dynamics couple attitude to the bias (dtheta' = -db), so
+    the bias is observable from the accel+mag update.
+
+    Same predict(gyro, dt) / update(accel, mag) interface, measurement model
+    (normalized accel and mag against [0,0,1] and [1,0,0]) and constructor
+    arguments as OrientationEKF. The noise arguments are per quaternion
+    component there; they are converted to attitude angles here (dtheta ~ 2 dq).
+    There is no separate heading step: in OrientationEKF its innovation is
+    always zero.
+    """
+
+    def __init__(self, accmag_noise=1e-2, yaw_noise=None, process_noise=1e-5,
+                 bias_noise=1e-9, initial_covariance=0.01, dtype=float):
+        """
+        Parameters:
+            accmag_noise (float): Variance of each normalized accel/mag component.
+            yaw_noise: Unused; accepted so both filters take the same arguments.
+            process_noise (float): Quaternion-component process noise per predict
+                (attitude noise 4 * process_noise rad^2).
+            bias_noise (float): Gyro bias random walk per predict.
+            initial_covariance (float): Initial quaternion-component and bias
+                variance (attitude variance 4 * initial_covariance).
+            dtype: State and buffer precision, as in OrientationEKF.
+        """
+        self.dtype = np.dtype(dtype)
+        self.q = np.array([1.0, 0.0, 0.0, 0.0], dtype=dtype)
+        self.gyro_bias = np.zeros(3, dtype=dtype)
+        self.P = np.diag([4 * initial_covariance] * 3 + [initial_covariance] * 3).astype(dtype)
+        self.Q = np.diag([4 * process_noise] * 3 + [bias_noise] * 3).astype(dtype)
+        self.accmag_noise = accmag_noise
+
+        # Work buffers, reused on every sample
+        self._F = np.eye(6, dtype=dtype)
+        self._FP = np.empty((6, 6), dtype=dtype)
+        self._H = np.zeros((6, 6), dtype=dtype)
+        self._R = np.eye(6, dtype=dtype) * accmag_noise
+        self._PHT = np.empty((6, 6), dtype=dtype)
+        self._S = np.empty((6, 6), dtype=dtype)
+        self.K = np.empty((6, 6), dtype=dtype)
+        self._IKH = np.empty((6, 6), dtype=dtype)
+        self._KKT = np.empty((6, 6), dtype=dtype)
+        self._tmp = np.empty((6, 6), dtype=dtype)
+        self._I = np.eye(6, dtype=dtype)
+
+    @property
+    def x(self):
+        """[q0, q1, q2, q3, bgx, bgy, bgz], as OrientationEKF.x (a copy)."""
+        return np.concatenate((self.q, self.gyro_bias))
+
+    def predict(self, gyro, dt):
+        """Rotates q by the bias-corrected gyro rate (rad/s) over dt."""
+        gx, gy, gz = np.asarray(gyro, dtype=self.dtype).tolist()
+        bx, by, bz = self.gyro_bias.tolist()
+        wx, wy, wz = gx - bx, gy - by, gz - bz
+        self._rotate(wx * dt, wy * dt, wz * dt)
+
+        # F = [[I - [w x] dt, -I dt], [0, I]]
+        F = self._F
+        F[0:3, 0:3] = ((1.0, wz * dt, -wy * dt),
+                       (-wz * dt, 1.0, wx * dt),
+                       (wy * dt, -wx * dt, 1.0))
+        F[0, 3] = F[1, 4] = F[2, 5] = -dt
+        np.dot(F, self.P, out=self._FP)
+        np.dot(self._FP, F.T, out=self.P)
+        self.P += self.Q
+
+    def update(self, accel, mag):
+        """
+        Corrects with one accelerometer + magnetometer sample.
+
+        Returns:
+            ndarray: The unit quaternion (self.q).
+        """
+        accel = np.asarray(accel, dtype=self.dtype)
+        mag = np.asarray(mag, dtype=self.dtype)
+        a_norm = np.sqrt(accel @ accel)
+        m_norm = np.sqrt(mag @ mag)
+        if a_norm == 0 or m_norm == 0:
+            return self.q
+
+        w, x, y, z = self.q.tolist()
+        # Predicted body-frame gravity and north: rows 2 and 0 of R(q)
+        g0, g1, g2 = 2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)
+        n0, n1, n2 = 1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)
+        ax, ay, az = (accel / a_norm).tolist()
+        mx, my, mz = (mag / m_norm).tolist()
+        residual = (ax - g0, ay - g1, az - g2, mx - n0, my - n1, mz - n2)
+
+        # R(q dq)^T v ~ R^T v + [R^T v x] dtheta, so H = [[g x], 0], [[n x], 0]]
+        H = self._H
+        H[:, 0:3] = ((0.0, -g2, g1),
+                     (g2, 0.0, -g0),
+                     (-g1, g0, 0.0),
+                     (0.0, -n2, n1),
+                     (n2, 0.0, -n0),
+                     (-n1, n0, 0.0))
+        PHT = np.dot(self.P[:, 0:3], H[:, 0:3].T, out=self._PHT)
+        S = np.dot(H[:, 0:3], PHT[0:3], out=self._S)
+        S += self._R
+        self.K[:] = np.linalg.solve(S, PHT.T).T
+        dx = (self.K @ residual).tolist()
+
+        # Joseph form, then symmetrize
+        IKH = np.subtract(self._I, np.dot(self.K, H, out=self._IKH), out=self._IKH)
+        np.dot(IKH, self.P, out=self._tmp)
+        np.dot(self._tmp, IKH.T, out=self.P)
+        # K R K^T with R = accmag_noise I
+        KKT = np.dot(self.K, self.K.T, out=self._KKT)
+        KKT *= self.accmag_noise
+        self.P += KKT
+        np.add(self.P, self.P.T, out=self._tmp)
+        np.multiply(self._tmp, 0.5, out=self.P)
+
+        # Inject the error into the nominal state; the error resets to zero
+        self._rotate(dx[0], dx[1], dx[2])
+        self.gyro_bias += dx[3:6]
+        return self.q
+
+    def _rotate(self, rx, ry, rz):
+        # q <- q * exp([rx, ry, rz] / 2), a unit quaternion times an exact rotation
+        angle = np.sqrt(rx * rx + ry * ry + rz * rz)
+        if angle < 1e-12:
+            c, s = 1.0, 0.5
+        else:
+            c, s = np.cos(0.5 * angle), np.sin(0.5 * angle) / angle
+        dw, dx, dy, dz = c, s * rx, s * ry, s * rz
+        w, x, y, z = self.q.tolist()
+        self.q[:] = (w * dw - x * dx - y * dy - z * dz,
+                     w * dx + x * dw + y * dz - z * dy,
+                     w * dy - x * dz + y * dw + z * dx,
+                     w * dz + x * dy - y * dx + z * dw)
+
+
+def _compare_with_filterpy(path, repeat=3):
+    import os
+    import sys
+    import time
+
+    import pandas as pd
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'testing', 'new_imu'))
+    from ekf import OrientationBiasEKF
+
+    df = pd.read_csv(path)
+    t = df['Timestamp'].to_numpy(dtype=float)
+    gyro = df[['Gyro_X', 'Gyro_Y', 'Gyro_Z']].to_numpy(dtype=float)
+    accel = df[['Accel_X', 'Accel_Y', 'Accel_Z']].to_numpy(dtype=float)
+    mag = df[['Mag_X', 'Mag_Y', 'Mag_Z']].to_numpy(dtype=float)
+    dts = np.diff(t)
+
+    def run(make):
+        best = np.inf
+        for _ in range(repeat):
+            f = make()
+            Q = np.zeros((len(t), 4))
+            Q[0, 0] = 1.0
+            t0 = time.perf_counter()
+            for i in range(1, len(t)):
+                f.predict(gyro[i], dts[i - 1])
+                Q[i] = f.update(accel[i], mag[i])
+            best = min(best, time.perf_counter() - t0)
+        return Q, f, best / (len(t) - 1)
+
+    Q_ref, ref, t_ref = run(OrientationBiasEKF)
+    Q_new, new, t_new = run(lambda: OrientationEKF(accmag_noise=1e-2))
+    print(f"{path}: {len(t) - 1} samples")
+    print(f"filterpy OrientationBiasEKF: {t_ref * 1e6:8.1f} us/sample")
+    print(f"OrientationEKF:              {t_new * 1e6:8.1f} us/sample  ({t_ref / t_new:.1f}x)")
+    q_err = np.abs(Q_new - Q_ref).max()
+    x_err = np.abs(new.x - ref.ekf.x).max()
+    P_err = np.abs(new.P - ref.ekf.P).max() / np.abs(ref.ekf.P).max()
+    print(f"max |q difference| {q_err:.2e}, final state {x_err:.2e}, final P (relative) {P_err:.2e}")
+    print(f"P symmetric: {np.allclose(new.P, new.P.T, rtol=0, atol=0)}, "
+          f"min eigenvalue {np.linalg.eigvalsh(new.P).min():.3e}")
+    return q_err < 1e-9 and x_err < 1e-9 and P_err < 1e-9
+
+
+def simulate_recording(n=6000, dt=0.01, bias=(0.02, -0.015, 0.01), seed=0):
+    """
+    Simulated IMU recording with known orientation, following the filters' own
+    model (gravity along z and the field along x in the world frame).
+
+    Returns:
+        q_true (ndarray): (n, 4) true orientation.
+        gyro, accel, mag (ndarray): (n, 3) measurements; gyro includes `bias`.
+    """
+    import quaternions
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) * dt
+    rate = np.stack([0.6 * np.sin(0.7 * t), 0.4 * np.cos(0.5 * t), 0.8 * np.sin(0.3 * t + 1.0)], axis=1)
+    q_true = np.empty((n, 4))
+    q_true[0] = (1.0, 0.0, 0.0, 0.0)
+    for i in range(1, n):
+        r = rate[i - 1] * dt
+        angle = np.linalg.norm(r)
+        dq = np.hstack((np.cos(angle / 2), np.sin(angle / 2) * r / angle))
+        q_true[i] = quaternions.multiply(q_true[i - 1], dq)
+    R_T = np.swapaxes(quaternions.to_rotation_matrix(q_true), 1, 2)
+    gyro = rate + np.asarray(bias) + rng.normal(scale=0.005, size=(n, 3))
+    accel = R_T @ np.array([0.0, 0.0, 9.81]) + rng.normal(scale=0.1, size=(n, 3))
+    mag = R_T @ np.array([40.0, 0.0, 0.0]) + rng.normal(scale=0.5, size=(n, 3))
+    return q_true, gyro, accel, mag
+
+
+def attitude_error_deg(q_est, q_true):
+    """Angle (degrees) of the rotation between two (N, 4) quaternion sequences."""
+    q_est = q_est / np.linalg.norm(q_est, axis=-1, keepdims=True)
+    return np.degrees(2 * np.arccos(np.clip(np.abs(np.sum(q_est * q_true, axis=-1)), 0.0, 1.0)))
+
+
+def _compare_on_synthetic(n=6000, dt=0.01, seed=0):
+    """Both filters on simulate_recording()."""
+    import time
+
+    bias = np.array([0.02, -0.015, 0.01])
+    q_true, gyro, accel, mag = simulate_recording(n, dt, bias, seed)
+
+    print(f"synthetic: {n} samples at {1 / dt:.0f} Hz, gyro bias {bias}")
+    for cls in (OrientationEKF, ErrorStateOrientationEKF):
+        f = cls(accmag_noise=1e-2)
+        Q = np.empty((n, 4))
+        t0 = time.perf_counter()
+        for i in range(n):
+            f.predict(gyro[i], dt)
+            Q[i] = f.update(accel[i], mag[i])
+        elapsed = time.perf_counter() - t0
+        error = attitude_error_deg(Q, q_true)
+        settled = error[n // 4:]
+        print(f"{cls.__name__:<26} {elapsed / n * 1e6:6.1f} us/sample, attitude error mean "
+              f"{settled.mean():.3f} deg, max {settled.max():.3f} deg, bias estimate {np.round(f.x[4:7], 4)}")
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'testing', 'new_imu',
+                           'Trial1_Y_extracted.csv')
+    ok = _compare_with_filterpy(sys.argv[1] if len(sys.argv) > 1 else default)
+    print("equivalent" if ok else "MISMATCH")
+    print()
+    _compare_on_synthetic()
+    sys.exit(0 if ok else 1)
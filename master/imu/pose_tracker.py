@@ -0,0 +1,178 @@
+"""
+Streaming pose tracker for the live minimap.
+
+MadgwickFilter.compute_position() is a batch function: calling it with one
+row per loop iteration (as main.py did) starts from the identity quaternion
+and zero velocity every time, re-runs the magnetometer calibration and
+allocates six (N, 3) arrays per sample. PoseTracker keeps the orientation,
+velocity, position and rod tip between calls instead. push() does a fixed
+amount of scalar work per sample (MadgwickFilter.update_fast plus a few
+multiply-adds) and creates no NumPy arrays; pose() and the properties build
+the result only when asked.
+
+Integration: the calibrated sample updates the filter, the accelerometer
+reading is rotated into the world frame, the world-frame reading of the first
+sample is taken as gravity and subtracted, and velocity and position are
+integrated with the same step as compute_position
+(v += a dt, p += v dt + a dt^2 / 2).
+
+Example:
+    tracker = PoseTracker(beta=0.1, L=0.1)
+    tracker.push([dt, ax, ay, az, gx, gy, gz, mx, my, mz])
+    tracker.push_many(block)          # (N, 10) rows of the same layout
+    x, y, z = tracker.position
+"""
+import numpy as np
+
+from dof9_filter import MadgwickFilter
+
+
+class PoseTracker:
+    def __init__(self, beta=0.1, L=0.1, sample_period=0.01, calibrate=True, mag_calibration=None):
+        """
+        Parameters:
+            beta (float): Madgwick filter gain.
+            L (float): Rod length in meters (tip offset along the sensor z axis).
+            sample_period (float): dt used until a sample with dt > 0 arrives.
+            calibrate (bool): Apply the magnetometer calibration.
+            mag_calibration (MagCalibration): Defaults to the cached 'default'
+                device calibration (see mag_calibration.py).
+        """
+        self.filter = MadgwickFilter(sample_period=sample_period, beta=beta, mag_calibration=mag_calibration)
+        self.L = float(L)
+        self.calibrate = calibrate
+        calibration = self.filter.mag_calibration
+        (self._b0, self._b1, self._b2) = calibration.hard_iron.tolist()
+        ((self._a00, self._a01, self._a02),
+         (self._a10, self._a11, self._a12),
+         (self._a20, self._a21, self._a22)) = calibration.soft_iron_inv.tolist()
+        self.reset()
+
+    def reset(self):
+        """Back to the identity orientation, at rest at the origin."""
+        self.filter.q[:] = (1.0, 0.0, 0.0, 0.0)
+        self._v = [0.0, 0.0, 0.0]
+        self._p = [0.0, 0.0, 0.0]
+        self._tip = [0.0, 0.0, self.L]
+        self._gravity = None
+        self.samples = 0
+
+    def push(self, sample, trace=None):
+        """
+        Adds one sample [dt, ax, ay, az, gx, gy, gz, mx, my, mz] (floats).
+
+        If a latency_trace.LatencyTrace is given, the orientation update and
+        the integration are marked as its 'filter' and 'integrate' stages.
+        """
+        dt, ax, ay, az, gx, gy, gz, mx, my, mz = sample
+        madgwick = self.filter
+        if dt > 0:
+            madgwick.sample_period = dt
+        else:
+            dt = madgwick.sample_period
+
+        if self.calibrate:
+            mx, my, mz = mx - self._b0, my - self._b1, mz - self._b2
+            mx, my, mz = (mx * self._a00 + my * self._a10 + mz * self._a20,
+                          mx * self._a01 + my * self._a11 + mz * self._a21,
+                          mx * self._a02 + my * self._a12 + mz * self._a22)
+
+        q0, q1, q2, q3 = madgwick.update_fast((gx, gy, gz), (ax, ay, az), (mx, my, mz)).tolist()
+        if trace is not None:
+            trace.mark('filter')
+
+        # Rotation matrix rows, as MadgwickFilter.get_rotation_matrix()
+        r11 = 1 - 2 * (q2 * q2 + q3 * q3)
+        r12 = 2 * (q1 * q2 - q0 * q3)
+        r13 = 2 * (q1 * q3 + q0 * q2)
+        r21 = 2 * (q1 * q2 + q0 * q3)
+        r22 = 1 - 2 * (q1 * q1 + q3 * q3)
+        r23 = 2 * (q2 * q3 - q0 * q1)
+        r31 = 2 * (q1 * q3 - q0 * q2)
+        r32 = 2 * (q2 * q3 + q0 * q1)
+        r33 = 1 - 2 * (q1 * q1 + q2 * q2)
+
+        wx = r11 * ax + r12 * ay + r13 * az
+        wy = r21 * ax + r22 * ay + r23 * az
+        wz = r31 * ax + r32 * ay + r33 * az
+        if self._gravity is None:
+            self._gravity = (wx, wy, wz)
+        gx0, gy0, gz0 = self._gravity
+        wx -= gx0
+        wy -= gy0
+        wz -= gz0
+
+        v = self._v
+        p = self._p
+        half_dt2 = 0.5 * dt * dt
+        p[0] += v[0] * dt + wx * half_dt2
+        p[1] += v[1] * dt + wy * half_dt2
+        p[2] += v[2] * dt + wz * half_dt2
+        v[0] += wx * dt
+        v[1] += wy * dt
+        v[2] += wz * dt
+
+        tip = self._tip
+        L = self.L
+        tip[0] = p[0] + r13 * L
+        tip[1] = p[1] + r23 * L
+        tip[2] = p[2] + r33 * L
+        self.samples += 1
+        if trace is not None:
+            trace.mark('integrate')
+
+    def push_many(self, block, trace=None):
+        """Adds (N, 10) rows of [dt, accel, gyro, mag], oldest first."""
+        push = self.push
+        for sample in np.asarray(block, dtype=float).reshape(-1, 10).tolist():
+            push(sample, trace)
+
+    @property
+    def quaternion(self):
+        return tuple(self.filter.q.tolist())
+
+    @property
+    def velocity(self):
+        return tuple(self._v)
+
+    @property
+    def position(self):
+        return tuple(self._p)
+
+    @property
+    def rod_tip(self):
+        return tuple(self._tip)
+
+    def pose(self):
+        """Current state as a dict of NumPy arrays."""
+        return {'quaternion': self.filter.q.copy(),
+                'velocity': np.array(self._v),
+                'position': np.array(self._p),
+                'rod_tip': np.array(self._tip)}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+
+    path = sys.argv[1] if len(sys.argv) > 1 else '../../old_data/50cm_trial2_extracted.csv'
+    df = pd.read_csv(path, skipinitialspace=True)
+    df.columns = df.columns.str.strip()
+    block = df[['Timestamp', 'Accel_X', 'Accel_Y', 'Accel_Z', 'Gyro_X', 'Gyro_Y', 'Gyro_Z',
+                'Mag_X', 'Mag_Y', 'Mag_Z']].to_numpy(dtype=float)
+    block = np.tile(block, (max(1, 20000 // len(block)), 1))
+
+    tracker = PoseTracker()
+    t0 = time.perf_counter()
+    tracker.push_many(block)
+    elapsed = time.perf_counter() - t0
+    print(f"PoseTracker: {len(block) / elapsed:10.0f} samples/s")
+
+    t0 = time.perf_counter()
+    for row in block[:2000]:
+        MadgwickFilter(sample_period=row[0], beta=0.1).compute_position(row, beta=0.1, L=0.1)
+    elapsed = time.perf_counter() - t0
+    print(f"per-row compute_position: {2000 / elapsed:10.0f} samples/s")
+    print("pose:", tracker.pose())
@@ -0,0 +1,210 @@
+"""
+Vectorized quaternion operations.
+
+Quaternions are scalar-first [w, x, y, z], as everywhere else in this repo
+(MadgwickFilter.q, the EKF states, RodTracker). Every function accepts a single
+quaternion of shape (4,) or any batch (..., 4) and broadcasts like NumPy, so a
+whole trajectory is converted in one call instead of one Python call per row.
+
+Rotation matrices rotate body-frame vectors into the world frame
+(v_world = R @ v_body), matching MadgwickFilter.get_rotation_matrix() and
+quat_to_rot_mat() in the test scripts. Euler angles are scipy's extrinsic 'xyz'
+convention: (roll, pitch, yaw) with R = Rz(yaw) @ Ry(pitch) @ Rx(roll).
+
+Run this file to check every function against scipy.spatial.transform.Rotation
+on random rotations.
+"""
+import numpy as np
+
+
+def _split(q):
+    q = np.asarray(q, dtype=float)
+    return q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+
+def normalize(q):
+    """Unit quaternions (..., 4)."""
+    q = np.asarray(q, dtype=float)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def conjugate(q):
+    """[w, -x, -y, -z]; the inverse of a unit quaternion."""
+    q = np.array(q, dtype=float)
+    q[..., 1:] *= -1.0
+    return q
+
+
+def multiply(p, q):
+    """Hamilton product p * q (apply q first, then p)."""
+    pw, px, py, pz = _split(p)
+    qw, qx, qy, qz = _split(q)
+    return np.stack([pw * qw - px * qx - py * qy - pz * qz,
+                     pw * qx + px * qw + py * qz - pz * qy,
+                     pw * qy - px * qz + py * qw + pz * qx,
+                     pw * qz + px * qy - py * qx + pz * qw], axis=-1)
+
+
+def to_rotation_matrix(q):
+    """(..., 3, 3) rotation matrices of unit quaternions (..., 4)."""
+    w, x, y, z = _split(q)
+    R = np.empty(w.shape + (3, 3))
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - z * w)
+    R[..., 0, 2] = 2 * (x * z + y * w)
+    R[..., 1, 0] = 2 * (x * y + z * w)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - x * w)
+    R[..., 2, 0] = 2 * (x * z - y * w)
+    R[..., 2, 1] = 2 * (y * z + x * w)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def from_rotation_matrix(R):
+    """
+    Unit quaternions (..., 4) with w >= 0 from rotation matrices (..., 3, 3).
+
+    Uses whichever of w, x, y, z is largest as the pivot (Shepperd's method),
+    so the result stays accurate near 180 degree rotations.
+    """
+    R = np.asarray(R, dtype=float)
+    r00, r11, r22 = R[..., 0, 0], R[..., 1, 1], R[..., 2, 2]
+    # 4 * component^2 for w, x, y, z
+    sq = np.stack([1 + r00 + r11 + r22,
+                   1 + r00 - r11 - r22,
+                   1 - r00 + r11 - r22,
+                   1 - r00 - r11 + r22], axis=-1)
+    pivot = np.argmax(sq, axis=-1)
+    s = 2.0 * np.sqrt(np.maximum(np.take_along_axis(sq, pivot[..., None], axis=-1)[..., 0], 1e-300))
+
+    d21 = R[..., 2, 1] - R[..., 1, 2]
+    d02 = R[..., 0, 2] - R[..., 2, 0]
+    d10 = R[..., 1, 0] - R[..., 0, 1]
+    s01 = R[..., 0, 1] + R[..., 1, 0]
+    s02 = R[..., 0, 2] + R[..., 2, 0]
+    s12 = R[..., 1, 2] + R[..., 2, 1]
+    candidates = np.stack([
+        np.stack([s * s / 4, d21, d02, d10], axis=-1),     # pivot w
+        np.stack([d21, s * s / 4, s01, s02], axis=-1),     # pivot x
+        np.stack([d02, s01, s * s / 4, s12], axis=-1),     # pivot y
+        np.stack([d10, s02, s12, s * s / 4], axis=-1),     # pivot z
+    ], axis=-2)
+    q = np.take_along_axis(candidates, pivot[..., None, None], axis=-2)[..., 0, :] / s[..., None]
+    return q * np.where(q[..., :1] < 0, -1.0, 1.0)
+
+
+def rotate(q, v):
+    """Rotates vectors v (..., 3) from body to world frame: R(q) @ v."""
+    w, x, y, z = _split(q)
+    v = np.asarray(v, dtype=float)
+    u = np.stack([x, y, z], axis=-1)
+    # v + 2w (u x v) + 2 u x (u x v)
+    t = 2.0 * np.cross(u, v)
+    return v + w[..., None] * t + np.cross(u, t)
+
+
+def to_euler(q, degrees=False):
+    """
+    Extrinsic 'xyz' angles (..., 3) = (roll, pitch, yaw), as
+    Rotation.as_euler('xyz'). Pitch is limited to [-90, 90] degrees.
+    """
+    w, x, y, z = _split(q)
+    roll = np.arctan2(2 * (y * z + x * w), 1 - 2 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(-2 * (x * z - y * w), -1.0, 1.0))
+    yaw = np.arctan2(2 * (x * y + z * w), 1 - 2 * (y * y + z * z))
+    angles = np.stack([roll, pitch, yaw], axis=-1)
+    return np.degrees(angles) if degrees else angles
+
+
+def from_euler(angles, degrees=False):
+    """Unit quaternions from extrinsic 'xyz' angles (..., 3), as Rotation.from_euler('xyz')."""
+    angles = np.asarray(angles, dtype=float)
+    if degrees:
+        angles = np.radians(angles)
+    half = 0.5 * angles
+    cr, cp, cy = np.cos(half[..., 0]), np.cos(half[..., 1]), np.cos(half[..., 2])
+    sr, sp, sy = np.sin(half[..., 0]), np.sin(half[..., 1]), np.sin(half[..., 2])
+    return np.stack([cr * cp * cy + sr * sp * sy,
+                     sr * cp * cy - cr * sp * sy,
+                     cr * sp * cy + sr * cp * sy,
+                     cr * cp * sy - sr * sp * cy], axis=-1)
+
+
+def slerp(q0, q1, t):
+    """
+    Spherical linear interpolation from q0 (t=0) to q1 (t=1) along the
+    shorter arc. q0, q1 and t broadcast against each other.
+    """
+    q0 = normalize(q0)
+    q1 = normalize(q1)
+    t = np.asarray(t, dtype=float)[..., None]
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    # Nearly identical quaternions: fall back to normalized lerp
+    close = sin_theta < 1e-6
+    safe = np.where(close, 1.0, sin_theta)
+    w0 = np.where(close, 1.0 - t, np.sin((1.0 - t) * theta) / safe)
+    w1 = np.where(close, t, np.sin(t * theta) / safe)
+    return normalize(w0 * q0 + w1 * q1)
+
+
+def _check_against_scipy(n=2000, seed=0):
+    from scipy.spatial.transform import Rotation, Slerp
+
+    rng = np.random.default_rng(seed)
+    r = Rotation.random(n, random_state=seed)
+    s = Rotation.random(n, random_state=seed + 1)
+    q = np.roll(r.as_quat(), 1, axis=-1)          # scipy is scalar-last
+    p = np.roll(s.as_quat(), 1, axis=-1)
+    v = rng.normal(size=(n, 3))
+
+    def same_rotation(a, b):
+        # q and -q are the same rotation
+        return np.minimum(np.abs(a - b).max(-1), np.abs(a + b).max(-1)).max()
+
+    errors = {
+        'normalize': np.abs(normalize(3.0 * q) - q).max(),
+        'to_rotation_matrix': np.abs(to_rotation_matrix(q) - r.as_matrix()).max(),
+        'from_rotation_matrix': same_rotation(from_rotation_matrix(r.as_matrix()), q),
+        'multiply': same_rotation(multiply(q, p), np.roll((r * s).as_quat(), 1, axis=-1)),
+        'conjugate': same_rotation(conjugate(q), np.roll(r.inv().as_quat(), 1, axis=-1)),
+        'rotate': np.abs(rotate(q, v) - r.apply(v)).max(),
+        'single rotate': np.abs(rotate(q[0], v[0]) - r[0].apply(v[0])).max(),
+    }
+    # Euler angles are ambiguous at gimbal lock; compare away from it
+    euler = to_euler(q)
+    ok = np.abs(euler[:, 1]) < np.radians(85)
+    errors['to_euler'] = np.abs(euler[ok] - r[ok].as_euler('xyz')).max()
+    errors['from_euler'] = same_rotation(from_euler(euler), q)
+
+    # 180 degree rotations exercise the non-w pivots
+    flips = Rotation.from_rotvec(np.pi * normalize(rng.normal(size=(50, 3))))
+    errors['from_rotation_matrix 180deg'] = same_rotation(
+        from_rotation_matrix(flips.as_matrix()), np.roll(flips.as_quat(), 1, axis=-1))
+
+    t = rng.random(n)
+    expected = np.array([np.roll(Slerp([0, 1], Rotation.concatenate([r[i], s[i]]))(t[i]).as_quat(), 1)
+                         for i in range(200)])
+    errors['slerp'] = same_rotation(slerp(q[:200], p[:200], t[:200]), expected)
+    return errors
+
+
+if __name__ == "__main__":
+    import time
+
+    failed = False
+    for name, err in _check_against_scipy().items():
+        status = 'ok' if err < 1e-9 else 'FAIL'
+        failed |= status == 'FAIL'
+        print(f"{name:<28} max error {err:.2e}  {status}")
+
+    q = normalize(np.random.default_rng(1).normal(size=(100000, 4)))
+    t0 = time.perf_counter()
+    to_euler(q)
+    print(f"to_euler: {len(q) / (time.perf_counter() - t0):.3e} quaternions/s")
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,187 @@
+"""
+End-to-end latency tracing for the minimap loop.
+
+LatencyTrace keeps one preallocated int64 table with a row per sample and a
+column per stage, so tracing a sample costs a few perf_counter_ns() calls and
+array stores; nothing is allocated until report() is called. Durations of a
+stage marked several times in one sample add up, so interleaved stages (filter,
+integrate, filter, ...) are still attributed correctly.
+
+A sample starts at the moment its serial bytes arrived: begin() takes the
+frame's age (from the acquisition hub's time.monotonic() stamp), which becomes
+the 'serial_read' stage. Every later mark() closes the named stage. end() adds
+the end-to-end latency ('total') and the time since the previous sample
+started ('cycle').
+
+Example:
+    trace = LatencyTrace()
+    trace.begin(age=time.monotonic() - frame['t'])
+    values = unpack(frame);          trace.mark('parse')
+    q = madgwick.update(...);        trace.mark('filter')
+    position = integrate(q);         trace.mark('integrate')
+    update_position(position);       trace.mark('render')
+    trace.end()
+    ...
+    trace.print_report()
+    trace.save('latency_report.json')
+"""
+import json
+import time
+
+import numpy as np
+
+STAGES = ('serial_read', 'parse', 'filter', 'integrate', 'render')
+
+
+class LatencyTrace:
+    def __init__(self, stages=STAGES, capacity=100000, clock=time.perf_counter_ns):
+        """
+        Parameters:
+            stages (tuple): Stage names in pipeline order.
+            capacity (int): Samples kept; older samples are overwritten.
+            clock (callable): Nanosecond clock used for the marks.
+        """
+        self.stages = tuple(stages)
+        self.columns = self.stages + ('total', 'cycle')
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._total = self._index['total']
+        self._cycle = self._index['cycle']
+        self.capacity = int(capacity)
+        self.clock = clock
+
+        self._table = np.zeros((self.capacity, len(self.columns)), dtype=np.int64)
+        self.count = 0
+        self._row = None
+        self._origin = 0
+        self._last = 0
+        self._prev_start = None
+
+    def begin(self, age=0.0):
+        """
+        Starts a new sample.
+
+        Parameters:
+            age (float): Seconds between the sample's serial bytes arriving
+                and now; recorded as the first stage.
+        """
+        now = self.clock()
+        self._row = self._table[self.count % self.capacity]
+        self._row[:] = 0
+        age_ns = int(age * 1e9)
+        self._row[0] = age_ns
+        self._origin = now - age_ns
+        self._last = now
+        if self._prev_start is not None:
+            self._row[self._cycle] = now - self._prev_start
+        self._prev_start = now
+
+    def mark(self, stage):
+        """Closes `stage`: the time since the previous mark is added to it."""
+        if self._row is None:
+            return
+        now = self.clock()
+        self._row[self._index[stage]] += now - self._last
+        self._last = now
+
+    def end(self):
+        """Finishes the sample and records its end-to-end latency."""
+        if self._row is None:
+            return
+        self._row[self._total] = self.clock() - self._origin
+        self._row = None
+        self.count += 1
+
+    # ——— analysis ———
+    def durations_ms(self, column=None):
+        """
+        Recorded durations in milliseconds, oldest first: a (N, columns) array,
+        or a (N,) array for one column name.
+        """
+        n = min(self.count, self.capacity)
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        table = np.roll(self._table[:n], -start, axis=0) / 1e6
+        if column is None:
+            return table
+        return table[:, self._index[column]]
+
+    def report(self, percentiles=(50, 95, 99)):
+        """Per-column count, mean, max and percentiles, all in milliseconds."""
+        table = self.durations_ms()
+        report = {}
+        for name, values in zip(self.columns, table.T):
+            if name == 'cycle':
+                values = values[1:]     # the first sample has no predecessor
+            if not len(values):
+                continue
+            entry = {'count': int(len(values)), 'mean': float(values.mean()), 'max': float(values.max())}
+            for p, v in zip(percentiles, np.percentile(values, percentiles)):
+                entry[f'p{p}'] = float(v)
+            report[name] = entry
+        return report
+
+    def histogram(self, column, bins=20):
+        """Histogram of one column (ms) on log-spaced bins: (counts, edges)."""
+        values = self.durations_ms(column)
+        values = values[values > 0]
+        if not len(values):
+            return np.zeros(0, dtype=int), np.zeros(0)
+        lo, hi = values.min(), values.max()
+        edges = np.geomspace(lo, hi * 1.0001, bins + 1) if hi > lo else np.array([lo, lo + 1e-6])
+        counts, edges = np.histogram(values, edges)
+        return counts, edges
+
+    def suggested_interval_ms(self, percentile=95, minimum=10):
+        """
+        Render timer interval matched to how often new samples are actually
+        processed: the given percentile of the cycle time, rounded up.
+        """
+        cycle = self.durations_ms('cycle')[1:]
+        if not len(cycle):
+            return None
+        return max(minimum, int(np.ceil(np.percentile(cycle, percentile))))
+
+    def print_report(self, histograms=True, bins=12, width=40):
+        report = self.report()
+        print(f"{'stage':<12} {'n':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+        for name, r in report.items():
+            print(f"{name:<12} {r['count']:>7} {r['mean']:>9.3f} {r['p50']:>9.3f} "
+                  f"{r['p95']:>9.3f} {r['p99']:>9.3f} {r['max']:>9.3f}")
+        if not histograms:
+            return
+        for name in report:
+            counts, edges = self.histogram(name, bins)
+            if not counts.sum():
+                continue
+            print(f"\n{name}")
+            scale = width / counts.max()
+            for c, lo, hi in zip(counts, edges[:-1], edges[1:]):
+                print(f"  {lo:9.3f} - {hi:9.3f} ms |{'#' * int(round(c * scale)):<{width}}| {c}")
+
+    def save(self, path):
+        """Writes the report and the suggested timer interval as JSON."""
+        with open(path, 'w') as f:
+            json.dump({'report': self.report(),
+                       'suggested_interval_ms': self.suggested_interval_ms()}, f, indent=2)
+
+
+def load_interval_ms(path, default=300):
+    """Suggested timer interval saved by a previous run, or `default`."""
+    try:
+        with open(path) as f:
+            interval = json.load(f).get('suggested_interval_ms')
+    except (OSError, ValueError):
+        return default
+    return int(interval) if interval else default
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print a saved latency report.")
+    parser.add_argument('path', nargs='?', default='latency_report.json')
+    args = parser.parse_args()
+    with open(args.path) as f:
+        saved = json.load(f)
+    for name, r in saved['report'].items():
+        print(f"{name:<12} p50 {r['p50']:8.3f}  p95 {r['p95']:8.3f}  p99 {r['p99']:8.3f} ms")
+    print("suggested timer interval:", saved['suggested_interval_ms'], "ms")
@@ -2,13 +2,22 @@
 from force_analysis import update_mesh_color
 from force_analysis import force_analysis
 from force_reader import read_flex_data
-from master.imu.imu_reader import read_imu_data
-from dof9_filter import MadgwickFilter
+from shm_acquisition import start_acquisition, sample_intervals
+from multirate import MultiRateTracker
+from ring_buffer import RingBuffer, POSE_DTYPE
+from latency_trace import LatencyTrace, load_interval_ms
 import pyvista as pv
 import numpy as np
 import random
 import time
 
+# Latency report of the last run; its measured cycle time sets the render timer
+TRACE_PATH = "latency_report.json"
+
+# Stage rates in Hz (imu/multirate.py): gyro/accel step on every sample at 'imu',
+# magnetometer correction, position integration and minimap redraw at lower rates
+RATES = {'imu': 100.0, 'mag': 25.0, 'position': 30.0, 'render': 30.0}
+
 def main():
     
     stl_file = r"C:\Users\kayla\.spyder-py3\DT3_Local\bph_mold_combined.stl"
@@ -65,7 +74,8 @@ def main():
         mesh_actor.Modified()
         plotter.update()
 
-    df = []
+    # Fixed-size pose history (about 10 minutes at 100 Hz); memory stays flat
+    history = RingBuffer(60000, POSE_DTYPE)
     time_above_pressure_thresh = 0
     time_threshold = 3.0
     force_threshold = 10.0
@@ -81,9 +91,32 @@ def main():
     y = 0
     z = 0 
 
+    # Serial reads run in their own process and land in shared memory, so a
+    # slow render cannot make the IMU port overflow
+    acq = start_acquisition(devices=('imu',), imu_port='COM6')
+    # Raises if the worker dies (e.g. the port does not exist)
+    try:
+        ready = acq.wait_for_frame('imu', timeout=10.0)
+    except RuntimeError:
+        acq.stop()
+        raise
+    if not ready:
+        acq.stop()
+        print("No IMU frames within 10 s; check the IMU port and baud rate")
+        return
+    imu_frames = acq.reader('imu')
+    last_frame = acq.latest('imu')
+
+    # Orientation, velocity and position carry over from sample to sample
+    # and each stage runs at its rate from RATES
+    tracker = MultiRateTracker('madgwick', rates=RATES, beta=0.1, L=0.1,
+                               render=lambda t: update_position(t.position))
+    trace = LatencyTrace()
+
     start_time = time.time()
     plotter.iren.add_observer('TimerEvent', update_position)
-    plotter.iren.create_timer(300)
+    # Measured by the previous run (300 ms until a report exists)
+    plotter.iren.create_timer(load_interval_ms(TRACE_PATH, default=300))
     plotter.show(auto_close=False, interactive_update=True)
 
     while (
@@ -91,22 +124,38 @@ def main():
       y_min <= y <= y_max and
       z_min <= z <= z_max
     ):
+        # Every IMU sample since the last iteration, not just the newest one
+        frames = imu_frames.read(copy=True)
+        if not len(frames):
+            time.sleep(0.001)
+            continue
+
         print("meowmeowmeowmeow")
         current_time = time.time()
         dt = current_time - start_time
         start_time = current_time
 
-        ax, ay, az, gx, gy, gz, mx, my, mz = read_imu_data()
+        # Frame age covers serial arrival, parsing in the worker and hand-off
+        trace.begin(age=time.monotonic() - frames['t'][0])
+        # Device clock for binary frames; frames that arrived in one read get
+        # the tracker's nominal period instead of splitting the arrival gap
+        sample_dts = sample_intervals(frames, last_frame)
+        last_frame = frames[-1]
+        block = np.column_stack([sample_dts, frames['accel'], frames['gyro'], frames['mag']])
+        trace.mark('parse')
         #N, S, E, W = read_flex_data()
 
-        madgwick = MadgwickFilter(sample_period=dt, beta=0.1)
-        position = madgwick.compute_position([dt, ax, ay, az, gx, gy, gz, mx, my, mz], beta=0.1, L=0.1)
+        tracker.push_many(block, trace=trace)
+        # Integrates and redraws the minimap only when those stages are due
+        tracker.poll(trace=trace)
+        position = tracker.position
         
         # pressure = force_analysis(bend_values)
 
         
       
-        update_position(position) # update point on minimap
+        trace.end()
+        history.push((current_time, dt, position, (0.0, 0.0, 0.0, 0.0)))
         
         
         # 300 milliseconds for better visualization
@@ -125,10 +174,13 @@ def main():
 
         # Set up the timer
     
+    acq.stop()
+    trace.print_report()
+    trace.save(TRACE_PATH)
+    tracker.print_report()
 
     N, S, E, W = read_flex_data()
-    data = {dt, position, N, S, E, W}
-    df.append(data)
+    history.push((time.time(), dt, position, (N, S, E, W)))
 
 if __name__ == "__main__":
     main()
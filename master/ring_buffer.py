@@ -0,0 +1,266 @@
+"""
+Fixed-capacity ring buffer for high-rate sensor frames.
+
+Frames live in one preallocated structured NumPy array, so memory stays flat
+for an entire session and pushing a frame allocates nothing. Every frame is
+written twice, at slot i and slot i + capacity, which keeps any window of up to
+`capacity` consecutive frames contiguous in memory: latest(n) and
+RingReader.read() return views, never copies.
+
+Several consumers (logger, filter, plotter) can each hold a RingReader with its
+own cursor. A reader that falls more than `capacity` frames behind skips ahead
+to the oldest frame still stored and counts the frames it missed in
+`overruns`.
+
+There is a single writer. Readers on other threads must finish with a view
+before the writer laps it (or pass copy=True).
+
+Example:
+    ring = RingBuffer(4096, IMU_DTYPE)
+    logger = ring.reader()
+    ring.push((t, accel, gyro, mag))
+    block = logger.read()            # every frame since the last read
+    window = ring.latest(200)        # last 200 frames, zero-copy
+"""
+import numpy as np
+
+# Frame layouts used by the simulator
+IMU_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('t_device', '<f8'),         # sensor clock in seconds, NaN if the device sends none
+    ('accel', '<f8', (3,)),
+    ('gyro', '<f8', (3,)),
+    ('mag', '<f8', (3,)),
+])
+
+FLEX_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('angles', '<f8', (4,)),     # north, south, east, west
+])
+
+SHEET_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('values', '<f8', (15,)),
+])
+
+POSE_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('dt', '<f8'),
+    ('position', '<f8', (3,)),
+    ('flex', '<f8', (4,)),
+])
+
+# Header slots stored in front of the frames
+_HEAD = 0          # total frames ever written
+_META_SLOTS = 2
+
+
+class RingBuffer:
+    def __init__(self, capacity, dtype, buffer=None):
+        """
+        Parameters:
+            capacity (int): Maximum number of frames kept.
+            dtype: NumPy (structured) dtype of one frame.
+            buffer: Optional writable buffer of at least
+                RingBuffer.nbytes(capacity, dtype) bytes to build the ring on
+                (e.g. multiprocessing.shared_memory.SharedMemory.buf). The
+                header lives in the same buffer, so every process mapping it
+                sees the same write position.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+
+        if buffer is None:
+            buffer = bytearray(self.nbytes(self.capacity, self.dtype))
+        meta_bytes = _META_SLOTS * 8
+        self._meta = np.ndarray((_META_SLOTS,), dtype='<i8', buffer=buffer)
+        self._data = np.ndarray((2 * self.capacity,), dtype=self.dtype, buffer=buffer, offset=meta_bytes)
+
+    @staticmethod
+    def nbytes(capacity, dtype):
+        """Bytes needed for a ring of this capacity and frame type."""
+        return _META_SLOTS * 8 + 2 * int(capacity) * np.dtype(dtype).itemsize
+
+    # ——— writer ———
+    @property
+    def head(self):
+        """Total number of frames pushed since creation."""
+        return int(self._meta[_HEAD])
+
+    def __len__(self):
+        return min(self.head, self.capacity)
+
+    def push(self, frame):
+        """Appends one frame (a tuple or structured scalar matching dtype)."""
+        head = int(self._meta[_HEAD])
+        i = head % self.capacity
+        self._data[i] = frame
+        self._data[i + self.capacity] = self._data[i]
+        # Publish only after the frame is fully written
+        self._meta[_HEAD] = head + 1
+
+    def push_many(self, frames):
+        """Appends a block of frames (structured array of dtype) in one call."""
+        frames = np.asarray(frames, dtype=self.dtype)
+        n = len(frames)
+        if not n:
+            return
+        head = int(self._meta[_HEAD])
+        if n > self.capacity:
+            # Only the newest `capacity` frames can be kept
+            frames = frames[-self.capacity:]
+            head += n - self.capacity
+            n = self.capacity
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        cap = self.capacity
+        self._data[start:start + first] = frames[:first]
+        self._data[start + cap:start + cap + first] = frames[:first]
+        if first < n:
+            rest = n - first
+            self._data[0:rest] = frames[first:]
+            self._data[cap:cap + rest] = frames[first:]
+        self._meta[_HEAD] = head + n
+
+    def clear(self):
+        self._meta[_HEAD] = 0
+
+    # ——— readers ———
+    def window(self, start, stop, head=None):
+        """
+        View of frames with absolute indices [start, stop). The range must
+        lie within the last `capacity` frames.
+
+        Parameters:
+            head (int): Write position to check the range against, as read by
+                the caller (default: the current one). A caller that picked
+                the range from an earlier head must pass it, since the writer
+                may have moved on since.
+        """
+        n = stop - start
+        if n <= 0:
+            return self._data[0:0]
+        if head is None:
+            head = self.head
+        if n > self.capacity or stop > head or start < head - self.capacity:
+            raise IndexError("window is outside the frames currently stored")
+        i = start % self.capacity
+        return self._data[i:i + n]
+
+    def latest(self, n=1):
+        """View of the newest min(n, len(self)) frames, oldest first."""
+        head = self.head
+        n = min(n, head, self.capacity)
+        return self.window(head - n, head, head)
+
+    def reader(self, from_start=False):
+        """
+        Returns a new RingReader. By default it only sees frames pushed after
+        this call; with from_start=True it starts at the oldest stored frame.
+        """
+        return RingReader(self, from_start)
+
+
+class RingReader:
+    """
+    Independent read cursor on a RingBuffer.
+
+    Counters:
+        frames_read  frames returned by read()
+        overruns     frames overwritten before this reader got to them
+    """
+
+    def __init__(self, ring, from_start=False):
+        self.ring = ring
+        head = ring.head
+        self.cursor = max(0, head - ring.capacity) if from_start else head
+        self.frames_read = 0
+        self.overruns = 0
+
+    def available(self):
+        """Number of unread frames (may exceed capacity after an overrun)."""
+        return self.ring.head - self.cursor
+
+    def _catch_up(self, head):
+        oldest = head - self.ring.capacity
+        if self.cursor < oldest:
+            self.overruns += oldest - self.cursor
+            self.cursor = oldest
+
+    def read(self, max_frames=None, copy=False):
+        """
+        Returns every unread frame (or at most max_frames), oldest first, and
+        advances the cursor. The result is a view into the ring unless
+        copy=True.
+        """
+        ring = self.ring
+        head = ring.head
+        self._catch_up(head)
+        stop = head if max_frames is None else min(head, self.cursor + max_frames)
+        block = ring.window(self.cursor, stop, head)
+        if copy:
+            block = block.copy()
+            # The writer may have lapped us while copying; drop what it overwrote,
+            # including the slot of the frame it may be writing right now
+            lapped = min(len(block), max(0, ring.head + 1 - ring.capacity - self.cursor))
+            if lapped:
+                self.overruns += lapped
+                block = block[lapped:]
+        self.frames_read += len(block)
+        self.cursor = stop
+        return block
+
+    def skip_to_latest(self):
+        """Discards unread frames without counting them as overruns."""
+        self.cursor = self.ring.head
+
+
+def _fill_shared(shm_name, capacity, dtype, frames):
+    # Writer for the check below: frame i holds the value i in every field
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=shm_name)
+    ring = RingBuffer(capacity, dtype, buffer=block.buf)
+    frame = np.zeros((), dtype=dtype)
+    for i in range(frames):
+        frame['t'] = i
+        frame['values'] = i
+        ring.push(frame)
+    del ring
+    block.close()
+
+
+if __name__ == "__main__":
+    # Copy from a small ring while another process keeps filling it: every
+    # frame read must be whole (no field from a later frame) and in order.
+    import multiprocessing as mp
+    from multiprocessing import shared_memory
+
+    dtype = np.dtype([('t', '<f8'), ('values', '<f8', (512,))])
+    capacity, frames = 64, 200000
+    block = shared_memory.SharedMemory(create=True, size=RingBuffer.nbytes(capacity, dtype))
+    ring = RingBuffer(capacity, dtype, buffer=block.buf)
+    reader = ring.reader()
+    writer = mp.Process(target=_fill_shared, args=(block.name, capacity, dtype.descr, frames))
+    writer.start()
+
+    expected, torn = 0, 0
+    try:
+        while writer.is_alive() or reader.available():
+            got = reader.read(copy=True)
+            if not len(got):
+                continue
+            stop = reader.cursor
+            if not np.array_equal(got['t'], np.arange(stop - len(got), stop)):
+                raise RuntimeError("copied frames are out of order")
+            torn += int(np.count_nonzero(got['values'] != got['t'][:, None]))
+            expected = stop
+        writer.join()
+        print(f"{reader.frames_read} frames read, {reader.overruns} overruns, "
+              f"{expected} written, {torn} torn values")
+    finally:
+        writer.join()
+        del ring, reader
+        block.close()
+        block.unlink()
@@ -0,0 +1,337 @@
+"""
+Replay recorded sessions through a pseudo-terminal as if an Arduino were attached.
+
+Each recording is converted back into the exact text the corresponding sketch
+prints (IMU_Arduino, Flex_Arduino, 15SensorControlUseThis) and written line by
+line into the master side of a pty pair, timed from the recording's own
+timestamps. Readers open the slave side (SerialReplay.port) exactly like
+/dev/ttyACM0, so imu_reader, IMUStream, the force/conductive reader threads,
+the acquisition hub and main.py can be benchmarked without hardware.
+
+Supported inputs:
+    *.txt                   multi-line IMU logs (testing/data/4_23_25/*.txt)
+    *_extracted.csv, *.csv  IMU CSVs with Timestamp,Accel_*,Gyro_*,Mag_* columns
+    force_log.csv           conductive sheet logs (master/force_sensing/*/)
+    quadrant_log.csv        flex sensor logs (master/force_sensing/*/)
+
+Speeds: 1.0 is real time, N plays N times faster, 0 writes as fast as the
+reader accepts. Linux/macOS only.
+
+Usage:
+    python serial_replay.py RECORDING [RECORDING ...] [--speed N] [--loop]
+"""
+import argparse
+import csv
+import errno
+import os
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+IMU_LINE = ("Accel X: {:.2f} Y: {:.2f} Z: {:.2f} m/s^2 //"
+            "Mag X: {:.2f} Y: {:.2f} Z: {:.2f} uT //"
+            "Gyro X: {:.2f} Y: {:.2f} Z: {:.2f} radians/s\r\n")
+
+
+class Recording:
+    """
+    A recorded session ready to be replayed.
+
+    Attributes:
+        name (str): Label used in reports.
+        times (ndarray): Send time of each line in seconds from the start.
+        lines (list): Encoded lines (bytes), one per sample.
+    """
+
+    def __init__(self, name, times, lines):
+        self.name = name
+        self.times = np.asarray(times, dtype=float)
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+
+def to_offsets(timestamps, timebase='auto'):
+    """
+    Converts recorded timestamps to send offsets from the first sample.
+
+    The IMU logs store the interval since the previous sample ("0.100052 s"),
+    while the force logs store absolute time.time() values. With
+    timebase='auto' a non-decreasing series is treated as absolute and
+    anything else as per-sample intervals; the IMU loaders resolve 'auto'
+    to 'delta' themselves, since steady intervals are non-decreasing too.
+    """
+    t = np.asarray(timestamps, dtype=float)
+    if not len(t):
+        return t
+    if timebase == 'auto':
+        timebase = 'absolute' if np.all(np.diff(t) >= 0) else 'delta'
+    if timebase == 'absolute':
+        return t - t[0]
+    # Intervals: the first sample is sent immediately
+    offsets = np.cumsum(t)
+    return offsets - offsets[0]
+
+
+def imu_lines(values):
+    """Formats (N, 9) rows of (ax, ay, az, gx, gy, gz, mx, my, mz) like IMU_Arduino."""
+    # The sketch prints accel, then mag, then gyro
+    return [IMU_LINE.format(ax, ay, az, mx, my, mz, gx, gy, gz).encode()
+            for ax, ay, az, gx, gy, gz, mx, my, mz in values.tolist()]
+
+
+def load_imu_text_log(path, timebase='auto'):
+    if timebase == 'auto':
+        timebase = 'delta'
+    here = os.path.dirname(os.path.abspath(__file__))
+    loader_dir = os.path.join(here, '..', 'testing', 'new_imu')
+    if loader_dir not in sys.path:
+        sys.path.append(loader_dir)
+    from imu_log_loader import load_imu_log
+
+    data, _ = load_imu_log(path)
+    return Recording(os.path.basename(path), to_offsets(data[:, 0], timebase), imu_lines(data[:, 1:]))
+
+
+def load_imu_csv(path, timebase='auto'):
+    """IMU CSV; like the text logs it stores the interval before each sample."""
+    if timebase == 'auto':
+        timebase = 'delta'
+    with open(path, newline='') as f:
+        # The old_data/*_extracted.csv files indent every line, header included
+        reader = csv.DictReader(f, skipinitialspace=True)
+        reader.fieldnames = [name.strip() for name in reader.fieldnames or []]
+        rows = list(reader)
+    cols = ['Accel_X', 'Accel_Y', 'Accel_Z', 'Gyro_X', 'Gyro_Y', 'Gyro_Z', 'Mag_X', 'Mag_Y', 'Mag_Z']
+    data = np.array([[float(row[c]) for c in cols] for row in rows]).reshape(-1, 9)
+    t = [float(row['Timestamp']) for row in rows]
+    return Recording(os.path.basename(path), to_offsets(t, timebase), imu_lines(data))
+
+
+def load_force_log(path, timebase='auto'):
+    """Conductive sheet log: timestamp followed by 15 relative readings."""
+    t, lines = [], []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            t.append(float(row[0]))
+            rel = "   ".join(f"Rel{i}: {float(v):.1f}" for i, v in enumerate(row[1:]))
+            lines.append((rel + "   \r\n").encode())
+    return Recording(os.path.basename(path), to_offsets(t, timebase), lines)
+
+
+def load_quadrant_log(path, timebase='auto'):
+    """Flex log: timestamp, quadrant, then N, S, E, W angles (last four columns)."""
+    t, lines = [], []
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            t.append(float(row[0]))
+            n, s, e, w = (float(v) for v in row[-4:])
+            # Flex_Arduino prints North, East, South, West
+            lines.append(f"North:{n:.2f} East:{e:.2f} South:{s:.2f} West:{w:.2f} \r\n".encode())
+    return Recording(os.path.basename(path), to_offsets(t, timebase), lines)
+
+
+def load_recording(path, timebase='auto'):
+    """Picks a loader from the file name."""
+    name = os.path.basename(path)
+    if name.endswith('.txt'):
+        recording = load_imu_text_log(path, timebase)
+    elif name == 'force_log.csv':
+        recording = load_force_log(path, timebase)
+    elif name == 'quadrant_log.csv':
+        recording = load_quadrant_log(path, timebase)
+    else:
+        recording = load_imu_csv(path, timebase)
+    recording.name = path
+    return recording
+
+
+class SerialReplay:
+    """
+    Streams a Recording into a pseudo-terminal on a background thread.
+
+    Example:
+        with SerialReplay(load_recording('old_data/30cm_trial1_extracted.csv'), speed=10) as replay:
+            stream = IMUStream(replay.port, settle_time=0).start()
+            replay.wait()
+
+    Counters (see stats()):
+        written     lines written to the pty
+        dropped     lines dropped because the reader fell behind and the pty
+                    buffer was full (timed modes only, like a real UART)
+        max_lag     worst delay between a line's scheduled and actual send time
+    """
+
+    def __init__(self, recording, speed=1.0, loop=False, drop_when_full=None):
+        """
+        Parameters:
+            recording (Recording): What to play.
+            speed (float): 1.0 real time, N for N times faster, 0 for as fast
+                as the reader accepts.
+            loop (bool): Start over at the end instead of stopping.
+            drop_when_full (bool): Drop lines instead of blocking when the
+                reader is not keeping up. Defaults to True for timed playback
+                and False for speed=0.
+        """
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.drop_when_full = (speed > 0) if drop_when_full is None else drop_when_full
+
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        self.port = os.ttyname(self._slave_fd)
+        if self.drop_when_full:
+            os.set_blocking(self._master_fd, False)
+
+        # Host send time (time.monotonic()) of each line in the last pass,
+        # for end-to-end latency measurements on the reader side
+        self.send_times = np.full(len(recording), np.nan)
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.max_lag = 0.0
+        self.passes = 0
+        self.elapsed = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Blocks until playback finishes (never returns early with loop=True)."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        for fd in (self._master_fd, self._slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, line):
+        view = memoryview(line)
+        while view:
+            try:
+                n = os.write(self._master_fd, view)
+            except BlockingIOError:
+                if view.nbytes == len(line):
+                    return False
+                # Never leave half a line in the pty; finish it
+                time.sleep(0.0005)
+                continue
+            except OSError as e:
+                if e.errno == errno.EIO:
+                    return False
+                raise
+            view = view[n:]
+        return True
+
+    def _run(self):
+        times = self.recording.times
+        lines = self.recording.lines
+        speed = self.speed
+        start = time.monotonic()
+        while not self._stop_event.is_set():
+            t0 = time.monotonic()
+            for i, line in enumerate(lines):
+                if self._stop_event.is_set():
+                    break
+                if speed > 0:
+                    due = t0 + times[i] / speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        self.max_lag = max(self.max_lag, float(-delay))
+                now = time.monotonic()
+                if self._write(line):
+                    self.send_times[i] = now
+                    self.written += 1
+                else:
+                    self.dropped += 1
+            self.passes += 1
+            if not self.loop:
+                break
+        self.elapsed = time.monotonic() - start
+
+    def stats(self):
+        return {
+            'recording': self.recording.name,
+            'lines': len(self.recording),
+            'written': self.written,
+            'dropped': self.dropped,
+            'max_lag_ms': self.max_lag * 1000,
+            'elapsed_s': self.elapsed,
+            'lines_per_s': self.written / self.elapsed if self.elapsed else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sensor sessions through pseudo-terminals.")
+    parser.add_argument('recordings', nargs='+', help="recording files, one pty per file")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="1 = real time, N = N times faster, 0 = as fast as possible")
+    parser.add_argument('--loop', action='store_true', help="repeat until interrupted")
+    parser.add_argument('--timebase', choices=['auto', 'absolute', 'delta'], default='auto')
+    args = parser.parse_args()
+
+    replays = []
+    for path in args.recordings:
+        recording = load_recording(path, args.timebase)
+        replay = SerialReplay(recording, speed=args.speed, loop=args.loop)
+        print(f"{replay.port}  <-  {path} ({len(recording)} lines, {recording.duration:.1f} s recorded)")
+        replays.append(replay)
+
+    input("Open the ports above, then press Enter to start playback...")
+    try:
+        for replay in replays:
+            replay.start()
+        for replay in replays:
+            while replay.running:
+                replay.wait(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for replay in replays:
+            replay.close()
+            print(replay.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Sensor acquisition in a separate process, shared with the main process through
+shared memory.
+
+In main.py the PyVista render, the filter math and the serial reads share one
+interpreter and one GIL, so a slow frame delays the reads and the OS serial
+buffer overflows. start_acquisition() moves the reads into a worker process
+that runs the AcquisitionHub and writes every frame into a RingBuffer per
+device, built on multiprocessing.shared_memory. The main process maps the
+same memory through AcquisitionClient and reads frames without any pickling,
+pipes or locks; a render stall only makes it read a bigger block next time.
+
+Example:
+    acq = start_acquisition(imu_port='/dev/ttyACM0')
+    imu = acq.reader('imu')
+    while running:
+        frames = imu.read(copy=True)     # structured IMU_DTYPE array
+        ...
+    acq.stop()
+"""
+import asyncio
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ring_buffer import FLEX_DTYPE, IMU_DTYPE, SHEET_DTYPE, RingBuffer
+
+DEVICE_DTYPES = {
+    'imu': IMU_DTYPE,
+    'flex': FLEX_DTYPE,
+    'sheet': SHEET_DTYPE,
+}
+
+
+def _frame_writer(rings):
+    """Hub callback that copies each Frame into its device's shared ring."""
+    def write(frame):
+        ring = rings.get(frame.device)
+        if ring is None:
+            return
+        v = frame.values
+        if frame.device == 'imu':
+            ring.push((frame.t, v[9] if len(v) > 9 else np.nan, v[0:3], v[3:6], v[6:9]))
+        else:
+            ring.push((frame.t, v))
+    return write
+
+
+def _worker_main(layout, device_kwargs, stop_event, ready_event):
+    # Imported here so the parent does not need pyserial to create the layout
+    from acquisition_hub import AcquisitionHub, default_devices
+
+    blocks = {name: shared_memory.SharedMemory(name=shm_name)
+              for name, (shm_name, _, _) in layout.items()}
+    rings = {name: RingBuffer(capacity, DEVICE_DTYPES[name], buffer=blocks[name].buf)
+             for name, (_, capacity, _) in layout.items()}
+
+    devices = [d for d in default_devices(**device_kwargs) if d.name in rings]
+    hub = AcquisitionHub(devices)
+    hub.add_callback(_frame_writer(rings))
+
+    async def watch_stop():
+        ready_event.set()
+        while not stop_event.is_set():
+            await asyncio.sleep(0.1)
+        hub.stop()
+
+    try:
+        asyncio.run(hub.run(watch_stop()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ready_event.set()
+        # Views into the blocks must go before the mappings can close
+        rings.clear()
+        for block in blocks.values():
+            block.close()
+
+
+def sample_intervals(frames, previous=None):
+    """
+    Per-sample dt of a block of IMU ring frames.
+
+    Binary frames are timed by the device clock. Otherwise arrival stamps are
+    only trusted between frames that arrived alone: frames delivered by the
+    same serial read share one stamp, so every frame of such a group (the
+    first one too, which would otherwise carry the whole gap since the
+    previous read) gets 0, and consumers substitute their nominal sample
+    period, as MultiRateTracker.push does.
+
+    Parameters:
+        frames (ndarray): IMU_DTYPE frames, oldest first.
+        previous (ndarray): The frame just before frames[0] (the last frame of
+            the previous block), or None; without it the first dt is 0.
+
+    Returns:
+        ndarray: dt in seconds per frame, 0 where unknown.
+    """
+    n = len(frames)
+    if not n:
+        return np.empty(0)
+    first = frames[0] if previous is None else previous
+    arrival = np.diff(frames['t'], prepend=first['t'])
+    device = np.diff(frames['t_device'], prepend=first['t_device'])
+
+    together = arrival <= 0
+    together[:-1] |= together[1:]
+    dt = np.where(together, 0.0, arrival)
+    if previous is None:
+        dt[0] = 0.0
+    timed = device > 0          # False for NaN (text frames) and repeats
+    dt[timed] = device[timed]
+    return dt
+
+
+class AcquisitionClient:
+    """
+    Main-process view of the shared rings.
+
+    reader(device) returns a RingReader with its own cursor, latest(device)
+    the newest frame (or None). Frames use ring_buffer.IMU_DTYPE, FLEX_DTYPE
+    and SHEET_DTYPE; 't' is the hub's time.monotonic() arrival stamp, shared
+    by every frame decoded from one serial read. IMU frames also carry
+    't_device', the sensor clock of binary frames (NaN for text frames); use
+    sample_intervals() for per-sample dt.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self._blocks = {}
+        self.rings = {}
+        for name, (shm_name, capacity, _) in layout.items():
+            block = shared_memory.SharedMemory(name=shm_name)
+            self._blocks[name] = block
+            self.rings[name] = RingBuffer(capacity, DEVICE_DTYPES[name], buffer=block.buf)
+
+    def reader(self, device, from_start=False):
+        return self.rings[device].reader(from_start)
+
+    def latest(self, device):
+        frames = self.rings[device].latest(1)
+        return frames[0].copy() if len(frames) else None
+
+    @property
+    def running(self):
+        """Whether the worker is alive; a plain client cannot tell and assumes so."""
+        return True
+
+    def wait_for_frame(self, device, timeout=None, poll=0.005):
+        """
+        Blocks until the worker has written at least one frame for device.
+
+        Returns:
+            bool: False if the timeout passed first.
+
+        Raises:
+            RuntimeError: The worker exited (e.g. a port failed to open).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ring = self.rings[device]
+        while ring.head == 0:
+            if not self.running:
+                raise RuntimeError(f"acquisition worker exited before any '{device}' frame "
+                                   f"(exit code {self._exitcode()})")
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def _exitcode(self):
+        return None
+
+    def frames_written(self):
+        """Total frames the worker has written per device."""
+        return {name: ring.head for name, ring in self.rings.items()}
+
+    def close(self):
+        self.rings.clear()
+        for block in self._blocks.values():
+            block.close()
+        self._blocks.clear()
+
+
+class AcquisitionProcess(AcquisitionClient):
+    """
+    Owns the shared memory blocks and the worker process. Use
+    start_acquisition() to create one.
+    """
+
+    def __init__(self, devices=('imu', 'flex', 'sheet'), capacity=8192, **device_kwargs):
+        layout = {}
+        self._owned = []
+        for name in devices:
+            size = RingBuffer.nbytes(capacity, DEVICE_DTYPES[name])
+            block = shared_memory.SharedMemory(create=True, size=size)
+            # Fresh blocks are zeroed, so every ring starts with head = 0
+            self._owned.append(block)
+            layout[name] = (block.name, capacity, DEVICE_DTYPES[name].str)
+        super().__init__(layout)
+
+        self._stop_event = mp.Event()
+        self._ready_event = mp.Event()
+        self.process = mp.Process(target=_worker_main,
+                                  args=(layout, device_kwargs, self._stop_event, self._ready_event),
+                                  daemon=True)
+
+    def start(self, timeout=10.0):
+        """Starts the worker and waits until its ports are open."""
+        self.process.start()
+        self._ready_event.wait(timeout)
+        return self
+
+    @property
+    def running(self):
+        return self.process.is_alive()
+
+    def _exitcode(self):
+        return self.process.exitcode
+
+    def stop(self, timeout=2.0):
+        """Stops the worker and releases the shared memory."""
+        self._stop_event.set()
+        if self.process.is_alive():
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.close()
+        for block in self._owned:
+            block.close()
+            block.unlink()
+        self._owned = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def start_acquisition(devices=('imu', 'flex', 'sheet'), capacity=8192, **device_kwargs):
+    """
+    Creates the shared rings and starts the acquisition worker.
+
+    Parameters:
+        devices (tuple): Which of 'imu', 'flex', 'sheet' to read.
+        capacity (int): Frames kept per device (the main process may fall this
+            far behind before frames are lost).
+        **device_kwargs: Passed to acquisition_hub.default_devices()
+            (imu_port, flex_port, sheet_port, binary_imu).
+
+    Returns:
+        AcquisitionProcess: Also acts as the client for the main process.
+    """
+    return AcquisitionProcess(devices, capacity, **device_kwargs).start()
+
+
+if __name__ == "__main__":
+    with start_acquisition() as acq:
+        imu = acq.reader('imu')
+        try:
+            while acq.running:
+                frames = imu.read(copy=True)
+                if len(frames):
+                    print(f"{len(frames)} IMU frames, latest accel {frames['accel'][-1]}, "
+                          f"overruns {imu.overruns}")
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        print(acq.frames_written())
@@ -1,7 +1,14 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 from filterpy.kalman import KalmanFilter
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'master', 'imu'))
+from stationary import rolling_variance
+from imu_integration import integrate_acceleration, zupt_integrate
+
 # --------------------------------------------
 # Step 1: Load IMU Data from CSV
 # --------------------------------------------
@@ -39,41 +46,21 @@ def calibrate_sensors(accel_data, gyro_data, stationary_samples=10):
 def detect_stationary_periods(accel_data, window_size=5, threshold=0.01):
     accel_mag = np.linalg.norm(accel_data, axis=1)
     stationary = np.zeros(len(accel_mag), dtype=bool)
-    for i in range(window_size, len(accel_mag)):
-        if np.var(accel_mag[i - window_size:i]) < threshold:
-            stationary[i] = True
+    # variance of the window_size samples before each sample, O(N) via cumulative sums
+    stationary[window_size:] = rolling_variance(accel_mag, window_size)[window_size - 1:-1] < threshold
     return stationary
 
 # --------------------------------------------
 # Step 5: Velocity and Position Integration
 # --------------------------------------------
 def compute_velocity_and_position(timestamps, accel_data):
-    velocity = np.zeros_like(accel_data)
-    position = np.zeros_like(accel_data)
-    for i in range(1, len(timestamps)):
-        dt = timestamps[i] - timestamps[i-1]
-        velocity[i] = velocity[i-1] + 0.5 * (accel_data[i] + accel_data[i-1]) * dt
-        position[i] = position[i-1] + 0.5 * (velocity[i] + velocity[i-1]) * dt
-    return velocity, position
-
-def apply_zupt_and_reintegrate(timestamps, accel_data, stationary):
-    velocity = np.zeros_like(accel_data)
-    position = np.zeros_like(accel_data)
+    # Trapezoidal integration as cumulative sums
+    return integrate_acceleration(accel_data, timestamps)
 
-    for i in range(1, len(timestamps)):
-        dt = timestamps[i] - timestamps[i - 1]
-
-        # Integrate acceleration to velocity
-        velocity[i] = velocity[i - 1] + 0.5 * (accel_data[i] + accel_data[i - 1]) * dt
-
-        # Apply ZUPT: if stationary, reset velocity
-        if stationary[i]:
-            velocity[i] = np.zeros(3)
-
-        # Integrate velocity to position
-        position[i] = position[i - 1] + 0.5 * (velocity[i] + velocity[i - 1]) * dt
-
-    return velocity, position
+def apply_zupt_and_reintegrate(timestamps, accel_data, stationary, remove_drift=False):
+    # Velocity is reset on stationary samples and each moving segment is integrated
+    # from rest; remove_drift=True also removes the linear drift inside each segment
+    return zupt_integrate(accel_data, timestamps, stationary, remove_drift=remove_drift)
 
 
 # --------------------------------------------
@@ -94,7 +81,7 @@ def plot_results(timestamps, raw_pos, zupt_pos, filtered_pos):
 # --------------------------------------------
 # Main
 # --------------------------------------------
-def main():
+def main(smooth=False):
     filename = "accelgyro.txt"
 
     timestamps, accel_data, gyro_data = read_imu_csv(filename)
@@ -116,7 +103,7 @@ def main():
     # zupt_position = recompute_position(timestamps, corrected_velocity)
 
     # Kalman Filter
-    filtered_states = apply_kalman_filter(timestamps, zupt_position, corrected_velocity)
+    filtered_states = apply_kalman_filter(timestamps, zupt_position, corrected_velocity, smooth=smooth)
     filtered_position = filtered_states[:, :3]
 
     # Plot
@@ -133,7 +120,12 @@ def main():
 # --------------------------------------------
 # Optional: Kalman Filter
 # --------------------------------------------
-def apply_kalman_filter(timestamps, position_data, velocity_data):
+def apply_kalman_filter(timestamps, position_data, velocity_data, smooth=False):
+    # smooth=True: same filter plus a backward RTS pass over the whole recording
+    if smooth:
+        from rts_smoother import smooth_position_velocity
+        return smooth_position_velocity(timestamps, position_data, velocity_data)[1:]
+
     kf = KalmanFilter(dim_x=6, dim_z=6)
     kf.x = np.zeros(6)
     kf.x[:3] = position_data[0]
@@ -166,5 +158,5 @@ def apply_kalman_filter(timestamps, position_data, velocity_data):
 
 # Run
 if __name__ == "__main__":
-    main()
+    main(smooth='--smooth' in sys.argv)
     
@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'master', 'imu'))
+
+# --------------------------------------------
+# Fixed-interval Rauch-Tung-Striebel smoothing
+# --------------------------------------------
+# A forward pass records, for every sample k, the prior (x_pred, P_pred), the
+# posterior (x_filt, P_filt) and the transition F[k] from k-1 to k into
+# preallocated (N, n) / (N, n, n) arrays. The backward pass then gives every
+# sample the estimate conditioned on the whole recording:
+#
+#     C_k  = P_filt[k] F[k+1]^T P_pred[k+1]^-1
+#     x_k  = x_filt[k] + C_k (x_{k+1} - x_pred[k+1])
+#     P_k  = P_filt[k] + C_k (P_{k+1} - P_pred[k+1]) C_k^T
+#
+# All N - 1 gains are computed in one batched solve; only the two short
+# recursions run per sample. Row 0 holds the initial state (F[0] = I).
+ForwardPass = namedtuple('ForwardPass', ['x_pred', 'P_pred', 'x_filt', 'P_filt', 'F'])
+
+
+def allocate_forward_pass(n, dim):
+    return ForwardPass(np.empty((n, dim)), np.empty((n, dim, dim)),
+                       np.empty((n, dim)), np.empty((n, dim, dim)),
+                       np.broadcast_to(np.eye(dim), (n, dim, dim)).copy())
+
+
+def rts_smooth(forward, covariance=True):
+    """
+    Backward RTS pass over a recorded forward pass.
+
+    Parameters:
+        forward (ForwardPass): Arrays of length N from a forward filter.
+        covariance (bool): Also smooth the covariances (skip when only the
+            states are needed).
+
+    Returns:
+        x_smooth (ndarray): (N, n) smoothed states.
+        P_smooth (ndarray): (N, n, n) smoothed covariances, or None.
+    """
+    x_pred, P_pred, x_filt, P_filt, F = forward
+    n = len(x_filt)
+    x_smooth = x_filt.copy()
+    P_smooth = P_filt.copy() if covariance else None
+    if n < 2:
+        return x_smooth, P_smooth
+
+    # C_k^T = P_pred[k+1]^-1 F[k+1] P_filt[k] (the covariances are symmetric)
+    C = np.swapaxes(np.linalg.solve(P_pred[1:], F[1:] @ P_filt[:-1]), 1, 2)
+    for k in range(n - 2, -1, -1):
+        x_smooth[k] += C[k] @ (x_smooth[k + 1] - x_pred[k + 1])
+    if covariance:
+        for k in range(n - 2, -1, -1):
+            P_smooth[k] += C[k] @ (P_smooth[k + 1] - P_pred[k + 1]) @ C[k].T
+    return x_smooth, P_smooth
+
+
+# --------------------------------------------
+# 6-state position/velocity filter (kalmanTest)
+# --------------------------------------------
+def pv_kalman_forward(timestamps, position_data, velocity_data,
+                      initial_covariance=100.0, position_noise=5.0, velocity_noise=0.5, process_scale=0.01):
+    """
+    The filter of kalmanTest.apply_kalman_filter() (same F, Q, R, P0 and
+    Joseph-form update as filterpy's KalmanFilter), recorded for rts_smooth().
+    Row 0 is the initial state taken from the first measurement.
+    """
+    n = len(timestamps)
+    forward = allocate_forward_pass(n, 6)
+    x_pred, P_pred, x_filt, P_filt, F = forward
+    R = np.diag([position_noise] * 3 + [velocity_noise] * 3)
+    I = np.eye(6)
+    z = np.hstack((position_data, velocity_data))
+
+    x = z[0].copy()
+    P = np.eye(6) * initial_covariance
+    x_pred[0] = x_filt[0] = x
+    P_pred[0] = P_filt[0] = P
+    dts = np.diff(timestamps)
+    for i in range(1, n):
+        dt = dts[i - 1]
+        Fi = F[i]
+        Fi[0, 3] = Fi[1, 4] = Fi[2, 5] = dt
+        # kalmanTest's Q is diagonal: its off-diagonal blocks scale zeros
+        Q = np.diag([dt ** 4 / 4] * 3 + [dt ** 2] * 3) * process_scale
+
+        x = Fi @ x
+        P = Fi @ P @ Fi.T + Q
+        x_pred[i] = x
+        P_pred[i] = P
+
+        # H = I
+        K = np.linalg.solve(P + R, P).T
+        x = x + K @ (z[i] - x)
+        I_K = I - K
+        P = I_K @ P @ I_K.T + K @ R @ K.T
+        x_filt[i] = x
+        P_filt[i] = P
+    return forward
+
+
+def smooth_position_velocity(timestamps, position_data, velocity_data, **kwargs):
+    """Smoothed (N, 6) [position, velocity] for the kalmanTest filter."""
+    x_smooth, _ = rts_smooth(pv_kalman_forward(timestamps, position_data, velocity_data, **kwargs),
+                             covariance=False)
+    return x_smooth
+
+
+# --------------------------------------------
+# Orientation filter (master/imu/orientation_ekf.py)
+# --------------------------------------------
+def orientation_forward(gyro, accel, mag, dts, **ekf_kwargs):
+    """
+    Runs OrientationEKF over a recording, recording each predict and update.
+    Row 0 is the initial state; sample i is predicted with dts[i] and
+    corrected with accel[i], mag[i].
+    """
+    from orientation_ekf import OrientationEKF
+
+    n = len(gyro)
+    ekf = OrientationEKF(**ekf_kwargs)
+    forward = allocate_forward_pass(n + 1, 7)
+    x_pred, P_pred, x_filt, P_filt, F = forward
+    x_pred[0] = x_filt[0] = ekf.x
+    P_pred[0] = P_filt[0] = ekf.P
+    for i in range(n):
+        ekf.predict(gyro[i], dts[i])
+        F[i + 1] = ekf.F
+        x_pred[i + 1] = ekf.x
+        P_pred[i + 1] = ekf.P
+        ekf.update(accel[i], mag[i])
+        x_filt[i + 1] = ekf.x
+        P_filt[i + 1] = ekf.P
+    return forward
+
+
+def smooth_orientation(gyro, accel, mag, dts, **ekf_kwargs):
+    """
+    Forward OrientationEKF plus RTS smoothing.
+
+    Returns:
+        q_filtered (ndarray): (N, 4) forward (causal) quaternions.
+        q_smoothed (ndarray): (N, 4) smoothed, renormalized quaternions.
+        bias_smoothed (ndarray): (N, 3) smoothed gyro bias.
+    """
+    forward = orientation_forward(gyro, accel, mag, dts, **ekf_kwargs)
+    x_smooth, _ = rts_smooth(forward, covariance=False)
+    q_smoothed = x_smooth[1:, 0:4] / np.linalg.norm(x_smooth[1:, 0:4], axis=1, keepdims=True)
+    return forward.x_filt[1:, 0:4], q_smoothed, x_smooth[1:, 4:7]
+
+
+if __name__ == "__main__":
+    import kalmanTest
+    from orientation_ekf import simulate_recording, attitude_error_deg
+
+    # Position/velocity: the forward pass must reproduce apply_kalman_filter()
+    rng = np.random.default_rng(0)
+    n = 5000
+    timestamps = np.cumsum(rng.uniform(0.008, 0.012, n))
+    velocity = np.cumsum(rng.normal(scale=0.01, size=(n, 3)), axis=0)
+    position = np.cumsum(velocity * 0.01, axis=0) + rng.normal(scale=0.5, size=(n, 3))
+
+    t0 = time.perf_counter()
+    reference = kalmanTest.apply_kalman_filter(timestamps, position, velocity)
+    t_filterpy = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    forward = pv_kalman_forward(timestamps, position, velocity)
+    t_forward = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    x_smooth, P_smooth = rts_smooth(forward)
+    t_backward = time.perf_counter() - t0
+    print(f"position/velocity, {n} samples:")
+    print(f"    filterpy forward {t_filterpy * 1e3:.0f} ms, recorded forward {t_forward * 1e3:.0f} ms, "
+          f"backward {t_backward * 1e3:.0f} ms")
+    print(f"    forward pass vs apply_kalman_filter: {np.abs(forward.x_filt[1:] - reference).max():.2e}")
+    print(f"    mean position variance: filtered {np.trace(forward.P_filt[1:, :3, :3], axis1=1, axis2=2).mean():.4f}, "
+          f"smoothed {np.trace(P_smooth[1:, :3, :3], axis1=1, axis2=2).mean():.4f}")
+
+    # Orientation: compare against the simulated truth
+    n, dt = 6000, 0.01
+    q_true, gyro, accel, mag = simulate_recording(n, dt)
+    t0 = time.perf_counter()
+    q_filtered, q_smoothed, bias = smooth_orientation(gyro, accel, mag, np.full(n, dt))
+    elapsed = time.perf_counter() - t0
+    print(f"orientation, {n} simulated samples: {elapsed * 1e3:.0f} ms forward + backward")
+    print(f"    mean attitude error: filtered {attitude_error_deg(q_filtered, q_true).mean():.3f} deg, "
+          f"smoothed {attitude_error_deg(q_smoothed, q_true).mean():.3f} deg")
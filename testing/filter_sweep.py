@@ -0,0 +1,362 @@
+"""
+Parameter sweep for the orientation filters and ZUPT over the recorded trials.
+
+Every combination of a search space (grid or random draws) is scored against
+the known ground truth of the recordings:
+
+    old_data/<N>cm_trial<k>_extracted.csv      moved N cm: error of the final
+                                               distance |p| after ZUPT
+                                               integration, in cm
+    testing/data/4_24_25/<N>_degree.csv        static tests at N degrees (tilt
+    testing/data/4_27_25/<N>fromNorth.csv      and heading): error of the
+                                               rotation angle between the
+                                               filter's final orientation and
+                                               that of the lowest angle in the
+                                               same folder, in degrees
+
+and a table ranked by score = distance RMSE (cm) + angle_weight * angle RMSE
+(deg) is written to CSV.
+
+The recordings are parsed once in the main process (magnetometer calibration
+included) and put in one shared memory block; each pool worker maps it in its
+initializer instead of re-reading the CSVs. One task is one orientation-filter
+setting: the filter runs once per recording and every ZUPT setting of the
+task is scored on that output, since the stationary detection and integration
+do not depend on the filter parameters.
+
+Search spaces map each parameter to a list of values, or to {'log': [lo, hi]}
+/ {'uniform': [lo, hi]}. In grid mode ranges become --steps points; in random
+mode lists are sampled as choices and ranges uniformly (in log for 'log').
+A --spec JSON file with the same layout replaces the matching entries of
+SEARCH_SPACE, e.g. {"madgwick": {"beta": [0.05, 0.1, 0.2]}}.
+
+Usage:
+    python filter_sweep.py [--filter madgwick|ekf|all] [--random N] [--steps 4]
+                           [--spec space.json] [--workers N] [--out results.csv]
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'master', 'imu'))
+import quaternions
+from batch_madgwick import COLUMNS
+from dof9_filter import MadgwickFilter
+from imu_integration import zupt_integrate
+from mag_calibration import load_calibration
+from orientation_ekf import OrientationEKF
+from stationary import detect_stationary
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (glob, regex for the ground truth, kind)
+TRIALS = [
+    (os.path.join(ROOT, 'old_data', '*cm_trial*_extracted.csv'), r'(\d+)cm_trial', 'distance'),
+    (os.path.join(ROOT, 'testing', 'data', '4_24_25', '*_degree.csv'), r'(\d+)_degree', 'angle'),
+    (os.path.join(ROOT, 'testing', 'data', '4_27_25', '*fromNorth.csv'), r'(\d+)fromNorth', 'angle'),
+]
+
+SEARCH_SPACE = {
+    'madgwick': {'beta': {'log': [0.005, 1.0]},
+                 'heading_gain': {'log': [0.01, 1.0]}},
+    'ekf': {'process_noise': {'log': [1e-7, 1e-3]},
+            'accmag_noise': {'log': [1e-5, 1e-1]},
+            'yaw_noise': {'log': [1e-5, 1e-1]},
+            'bias_noise': [1e-9]},
+    'zupt': {'window': [5, 10],
+             'accel_var_threshold': {'log': [1e-4, 1e-1]},
+             'gyro_threshold': [None, 0.01, 0.05],
+             'remove_drift': [True, False]},
+}
+
+
+# --------------------------------------------
+# Search space
+# --------------------------------------------
+def _grid_values(spec, steps):
+    if isinstance(spec, dict):
+        (kind, (lo, hi)), = spec.items()
+        values = np.geomspace(lo, hi, steps) if kind == 'log' else np.linspace(lo, hi, steps)
+        return values.tolist()
+    return list(spec)
+
+
+def _draw(spec, rng):
+    if isinstance(spec, dict):
+        (kind, (lo, hi)), = spec.items()
+        if kind == 'log':
+            return float(np.exp(rng.uniform(np.log(lo), np.log(hi))))
+        return float(rng.uniform(lo, hi))
+    return spec[rng.integers(len(spec))]
+
+
+def expand_grid(space, steps=4):
+    """Every combination of space's values, as a list of dicts."""
+    names = list(space)
+    values = [_grid_values(space[name], steps) for name in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def draw_random(space, n, rng):
+    """n independent draws from space, as a list of dicts."""
+    return [{name: _draw(spec, rng) for name, spec in space.items()} for _ in range(n)]
+
+
+def make_tasks(filters, space, random=0, steps=4, seed=0):
+    """
+    Tasks (filter, filter_params, [zupt_params, ...]). A grid pairs every
+    filter setting with the full ZUPT grid; random search draws one ZUPT
+    setting per filter setting.
+    """
+    tasks = []
+    if random:
+        rng = np.random.default_rng(seed)
+        for name in filters:
+            for params, zupt in zip(draw_random(space[name], random, rng),
+                                    draw_random(space['zupt'], random, rng)):
+                tasks.append((name, params, [zupt]))
+    else:
+        zupt_grid = expand_grid(space['zupt'], steps)
+        for name in filters:
+            tasks.extend((name, params, zupt_grid) for params in expand_grid(space[name], steps))
+    return tasks
+
+
+# --------------------------------------------
+# Recordings in shared memory
+# --------------------------------------------
+def load_recordings(trials=TRIALS):
+    """
+    Reads every trial into one (M, 10) array of [dt, accel, gyro, calibrated
+    mag] rows.
+
+    Returns:
+        data (ndarray): All recordings back to back.
+        meta (list): One dict per recording with name, kind, truth, group and
+            its [start, stop) rows in data.
+    """
+    calibration = load_calibration()
+    blocks, meta, start = [], [], 0
+    for pattern, regex, kind in trials:
+        for path in sorted(glob.glob(pattern)):
+            match = re.search(regex, os.path.basename(path))
+            if match is None:
+                continue
+            df = pd.read_csv(path, skipinitialspace=True)
+            df.columns = df.columns.str.strip()
+            d = df[COLUMNS].to_numpy(dtype=float)
+            dts = d[:, 0]
+            d[:, 0] = np.where(dts > 0, dts, np.mean(dts))
+            d[:, 7:10] = calibration.apply(d[:, 7:10])
+            blocks.append(d)
+            meta.append({'name': os.path.splitext(os.path.basename(path))[0],
+                         'kind': kind,
+                         'truth': float(match.group(1)),
+                         'group': os.path.basename(os.path.dirname(path)),
+                         'start': start, 'stop': start + len(d)})
+            start += len(d)
+    data = np.concatenate(blocks) if blocks else np.empty((0, 10))
+    return data, meta
+
+
+_worker = {}
+
+
+def _init_worker(shm_name, shape, meta):
+    """Pool initializer: maps the shared recordings (no copy, no CSV reads)."""
+    block = shared_memory.SharedMemory(name=shm_name)
+    _worker['block'] = block
+    _worker['data'] = np.ndarray(shape, dtype=float, buffer=block.buf)
+    _worker['meta'] = meta
+
+
+# --------------------------------------------
+# Scoring
+# --------------------------------------------
+def run_orientation(name, params, d):
+    """(N, 4) quaternions of one recording for one filter setting."""
+    n = len(d)
+    out = np.empty((n, 4))
+    rows = d.tolist()
+    if name == 'madgwick':
+        f = MadgwickFilter(sample_period=0.1, beta=params['beta'])
+        gain = params['heading_gain']
+        for i, (dt, ax, ay, az, gx, gy, gz, mx, my, mz) in enumerate(rows):
+            f.sample_period = dt
+            f.update_imu((gx, gy, gz), (ax, ay, az))
+            out[i] = f.correct_heading((mx, my, mz), gain)
+    elif name == 'ekf':
+        ekf = OrientationEKF(**params)
+        gyro, accel, mag = d[:, 4:7], d[:, 1:4], d[:, 7:10]
+        for i in range(n):
+            ekf.predict(gyro[i], rows[i][0])
+            ekf.update_accel(accel[i])
+            ekf.update_mag(mag[i])
+            out[i] = ekf.q
+        out /= np.linalg.norm(out, axis=1, keepdims=True)
+    else:
+        raise ValueError(f"unknown filter '{name}'")
+    return out
+
+
+def world_acceleration(q, d):
+    """Gravity-compensated world-frame acceleration and timestamps of a recording."""
+    world = quaternions.rotate(q, d[:, 1:4])
+    # As PoseTracker: the first sample's world acceleration is the gravity estimate
+    world -= world[0]
+    return world, np.cumsum(d[:, 0])
+
+
+def stationary_mask(name, d, window=10, accel_var_threshold=1e-3, gyro_threshold=None):
+    """detect_stationary() on a recording's sensor data, cached per worker (filter-independent)."""
+    cache = _worker.setdefault('stationary', {})
+    key = (name, int(window), accel_var_threshold, gyro_threshold)
+    if key not in cache:
+        cache[key] = detect_stationary(d[:, 1:4], d[:, 4:7], int(window), accel_var_threshold, gyro_threshold)
+    return cache[key]
+
+
+def angle_errors(final_q, meta):
+    """
+    |estimated - true| relative angle (deg) of each static test against the
+    lowest-angle test of its folder (which is the reference and not scored).
+    """
+    errors = {}
+    angle = [m for m in meta if m['kind'] == 'angle']
+    for group in sorted({m['group'] for m in angle}):
+        tests = sorted((m for m in angle if m['group'] == group), key=lambda m: m['truth'])
+        ref = tests[0]
+        q_ref = final_q[ref['name']]
+        for m in tests[1:]:
+            q = final_q[m['name']]
+            estimated = np.degrees(2 * np.arccos(min(abs(float(q @ q_ref)), 1.0)))
+            errors[m['name']] = abs(estimated - (m['truth'] - ref['truth']))
+    return errors
+
+
+def evaluate(task):
+    """Scores one filter setting with each of its ZUPT settings; returns result rows."""
+    name, params, zupt_settings = task
+    data, meta = _worker['data'], _worker['meta']
+
+    t0 = time.perf_counter()
+    quats = {m['name']: run_orientation(name, params, data[m['start']:m['stop']]) for m in meta}
+    filter_ms = (time.perf_counter() - t0) * 1e3
+    static = angle_errors({k: q[-1] for k, q in quats.items()}, meta)
+    moving = [(m, data[m['start']:m['stop']]) for m in meta if m['kind'] == 'distance']
+    world = {m['name']: world_acceleration(quats[m['name']], d) for m, d in moving}
+
+    rows = []
+    for zupt in zupt_settings:
+        zupt = dict(zupt)
+        remove_drift = zupt.pop('remove_drift', True)
+        distance = {}
+        for m, d in moving:
+            accel, t = world[m['name']]
+            stationary = stationary_mask(m['name'], d, **zupt)
+            _, position = zupt_integrate(accel, t, stationary, remove_drift=remove_drift)
+            distance[m['name']] = abs(np.linalg.norm(position[-1]) * 100 - m['truth'])
+
+        row = {'filter': name}
+        row.update(params)
+        row.update({f'zupt_{k}': v for k, v in zupt.items()})
+        row['zupt_remove_drift'] = remove_drift
+        row['distance_rmse_cm'] = np.sqrt(np.mean(np.square(list(distance.values())))) if distance else np.nan
+        row['distance_max_cm'] = max(distance.values(), default=np.nan)
+        row['angle_rmse_deg'] = np.sqrt(np.mean(np.square(list(static.values())))) if static else np.nan
+        row['angle_max_deg'] = max(static.values(), default=np.nan)
+        row['filter_ms'] = filter_ms
+        row.update({f'err_{k}': v for k, v in distance.items()})
+        row.update({f'err_{k}': v for k, v in static.items()})
+        rows.append(row)
+    return rows
+
+
+def sweep(tasks, workers=None, angle_weight=1.0, progress=True):
+    """
+    Runs every task on a process pool over the shared recordings.
+
+    Returns:
+        DataFrame: One row per (filter setting, ZUPT setting), ranked by score.
+    """
+    t0 = time.perf_counter()
+    data, meta = load_recordings()
+    t_load = time.perf_counter() - t0
+    if not meta:
+        raise FileNotFoundError("no recordings matched TRIALS")
+
+    block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    try:
+        np.ndarray(data.shape, dtype=float, buffer=block.buf)[:] = data
+        rows = []
+        t0 = time.perf_counter()
+        with Pool(workers, initializer=_init_worker, initargs=(block.name, data.shape, meta)) as pool:
+            for i, result in enumerate(pool.imap_unordered(evaluate, tasks), 1):
+                rows.extend(result)
+                if progress and (i % max(1, len(tasks) // 10) == 0 or i == len(tasks)):
+                    print(f"    {i}/{len(tasks)} filter settings, {time.perf_counter() - t0:.1f} s")
+        elapsed = time.perf_counter() - t0
+    finally:
+        block.close()
+        block.unlink()
+
+    results = pd.DataFrame(rows)
+    # Parameter columns of every filter first, then the scores, then per-recording errors
+    errors = [c for c in results.columns if c.startswith('err_')]
+    scores = ['distance_rmse_cm', 'distance_max_cm', 'angle_rmse_deg', 'angle_max_deg', 'filter_ms']
+    params = [c for c in results.columns if c not in errors and c not in scores]
+    results = results[params + scores + errors]
+    results['score'] = (results['distance_rmse_cm'].fillna(0.0)
+                        + angle_weight * results['angle_rmse_deg'].fillna(0.0))
+    results = results.sort_values('score', kind='stable').reset_index(drop=True)
+    results.insert(0, 'rank', np.arange(1, len(results) + 1))
+    results.insert(results.columns.get_loc('filter_ms'), 'score', results.pop('score'))
+    if progress:
+        print(f"{len(meta)} recordings ({len(data)} samples) parsed once in {t_load * 1e3:.0f} ms; "
+              f"{len(tasks)} filter settings, {len(results)} combinations in {elapsed:.1f} s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', choices=['madgwick', 'ekf', 'all'], default='all')
+    parser.add_argument('--random', type=int, default=0, metavar='N',
+                        help='random search with N draws per filter (default: grid)')
+    parser.add_argument('--steps', type=int, default=4, help='grid points per range')
+    parser.add_argument('--spec', help='JSON search space overriding SEARCH_SPACE entries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: CPU count)')
+    parser.add_argument('--angle-weight', type=float, default=1.0,
+                        help='cm of distance error worth one degree of angle error')
+    parser.add_argument('--out', default='filter_sweep_results.csv')
+    args = parser.parse_args()
+
+    space = {name: dict(values) for name, values in SEARCH_SPACE.items()}
+    if args.spec:
+        with open(args.spec) as f:
+            for name, values in json.load(f).items():
+                space.setdefault(name, {}).update(values)
+
+    filters = ['madgwick', 'ekf'] if args.filter == 'all' else [args.filter]
+    tasks = make_tasks(filters, space, args.random, args.steps, args.seed)
+    results = sweep(tasks, args.workers, args.angle_weight)
+    results.to_csv(args.out, index=False)
+
+    summary = [c for c in results.columns if not c.startswith('err_')]
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(results[summary].head(10).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"Ranked results written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,19 @@
 import numpy as np
 from filterpy.kalman import ExtendedKalmanFilter
 import csv
+import os
+import sys
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'master', 'imu'))
+from quaternions import to_rotation_matrix as quat_to_rot_mat
+from ekf_jacobians import accmag_jacobian, yaw_jacobian
+from orientation_ekf import OrientationEKF, ErrorStateOrientationEKF
+from stationary import StationaryDetector
+
 def normalize_quat(q):
     return q / np.linalg.norm(q)
 
-def quat_to_rot_mat(q):
-    w,x,y,z = q
-    return np.array([
-        [1-2*(y*y+z*z),   2*(x*y - z*w),   2*(x*z + y*w)],
-        [2*(x*y + z*w),   1-2*(x*x+z*z),   2*(y*z - x*w)],
-        [2*(x*z - y*w),   2*(y*z + x*w),   1-2*(x*x+y*y)]
-    ])
-
 def acc_mag_prediction(q, g_ref=np.array([0,0,1]), m_ref=np.array([1,0,0])):
     R  = quat_to_rot_mat(q)
     gb = R.T @ g_ref
@@ -21,6 +21,12 @@ def acc_mag_prediction(q, g_ref=np.array([0,0,1]), m_ref=np.array([1,0,0])):
     return np.hstack((gb, mb))
 
 def H_jacobian(x):
+    """Closed-form accel+mag Jacobian (ekf_jacobians.accmag_jacobian); bias columns are zero."""
+    H = np.zeros((6, x.shape[0]))
+    accmag_jacobian(x[0:4], out=H[:, 0:4])
+    return H
+
+def H_jacobian_numeric(x):
     q = x[0:4]
     eps = 1e-6
     H = np.zeros((6, x.shape[0]))
@@ -31,6 +37,9 @@ def H_jacobian(x):
         H[:, i] = (zp - zm)/(2*eps)
     return H
 
+def h_accmag(x):
+    return acc_mag_prediction(x[0:4])
+
 def tilt_compensated_heading(mag, q):
     """
     Compute measured heading by first rotating mag into nav frame
@@ -42,6 +51,25 @@ def tilt_compensated_heading(mag, q):
     # heading = atan2(East, North)
     return np.arctan2(m_nav[1], m_nav[0])
 
+def h_yaw(x, mag):
+    return np.array([ tilt_compensated_heading(mag, x[0:4]) ])
+
+def H_yaw(x, mag):
+    """Closed-form heading Jacobian (ekf_jacobians.yaw_jacobian); bias columns are zero."""
+    Hh = np.zeros((1, x.shape[0]))
+    yaw_jacobian(x[0:4], mag, out=Hh[:, 0:4])
+    return Hh
+
+def H_yaw_numeric(x, mag):
+    eps = 1e-6
+    Hh = np.zeros((1,7))
+    for i in range(4):
+        dx = np.zeros(7); dx[i]=eps
+        hp = tilt_compensated_heading(mag, normalize_quat(x[0:4]+dx[0:4]))
+        hm = tilt_compensated_heading(mag, normalize_quat(x[0:4]-dx[0:4]))
+        Hh[0,i] = (hp - hm)/(2*eps)
+    return Hh
+
 class OrientationBiasEKF:
     def __init__(self):
         # [q0,q1,q2,q3, bgx,bgy,bgz]
@@ -70,18 +98,14 @@ class OrientationBiasEKF:
 
     def update(self, accel, mag):
         # 1) full accel+mag update
-        if accel == 0:
-            accel = 1e-6
+        if not np.any(accel):
+            return self.ekf.x[0:4]
         a_norm = accel/np.linalg.norm(accel)
         m_norm = mag/np.linalg.norm(mag)
         z_am = np.hstack((a_norm, m_norm))
 
         self.ekf.R = self.R_accmag
-        self.ekf.update(
-            z_am,
-            HJacobian=lambda x: H_jacobian(x),
-            Hx=lambda x: acc_mag_prediction(x[0:4])
-        )
+        self.ekf.update(z_am, HJacobian=H_jacobian, Hx=h_accmag)
         # re‐normalize quaternion
         self.ekf.x[0:4] = normalize_quat(self.ekf.x[0:4])
 
@@ -89,25 +113,13 @@ class OrientationBiasEKF:
         q = self.ekf.x[0:4]
         yaw_meas = tilt_compensated_heading(mag, q)
 
-        # define h_yaw and H_yaw via numeric jacobian on the full state:
-        def h_yaw(x):
-            return np.array([ tilt_compensated_heading(mag, x[0:4]) ])
-
-        def H_yaw(x):
-            eps = 1e-6
-            Hh = np.zeros((1,7))
-            for i in range(4):
-                dx = np.zeros(7); dx[i]=eps
-                hp = tilt_compensated_heading(mag, normalize_quat(x[0:4]+dx[0:4]))
-                hm = tilt_compensated_heading(mag, normalize_quat(x[0:4]-dx[0:4]))
-                Hh[0,i] = (hp - hm)/(2*eps)
-            return Hh
-
         self.ekf.R = self.R_yaw
         self.ekf.update(
             np.array([yaw_meas]),
             HJacobian=H_yaw,
-            Hx=h_yaw
+            Hx=h_yaw,
+            args=(mag,),
+            hx_args=(mag,)
         )
         # normalize again
         self.ekf.x[0:4] = normalize_quat(self.ekf.x[0:4])
@@ -116,9 +128,15 @@ class OrientationBiasEKF:
 
 # ——— Rod tracker: orientation + 1D insertion depth with variable dt ———
 class RodTracker:
-    def __init__(self, L):
+    def __init__(self, L, error_state=False):
         self.L = L
-        self.orient_filter = OrientationBiasEKF()
+        # same model and noise as OrientationBiasEKF, without filterpy's overhead;
+        # error_state=True uses the 6-state multiplicative filter instead
+        orientation_filter = ErrorStateOrientationEKF if error_state else OrientationEKF
+        self.orient_filter = orientation_filter(accmag_noise=1e-4)
+        # ZUPT: still over the last 10 samples (|accel| variance, mean |gyro|),
+        # held for 3 samples before velocity is reset
+        self.zupt = StationaryDetector(window=10, accel_var_threshold=1e-3, gyro_threshold=0.01, enter=3)
         self.s = 0.0               # axial displacement from start
         self.v_axial = 0.0         # axial velocity
         self.prev_timestamp = None
@@ -146,9 +164,7 @@ class RodTracker:
         self.s += self.v_axial * dt + 0.5 * a_axial * dt**2
 
         # 5) ZUPT: if stationary, reset velocity
-        acc_dir = accel / np.linalg.norm(accel)
-        if (np.linalg.norm(acc_dir - np.array([0,0,1])) < 0.03
-            and np.linalg.norm(gyro) < 0.01):
+        if self.zupt.update(accel, gyro):
             self.v_axial = 0.0
         else:
             self.v_axial += a_axial * dt
@@ -2,8 +2,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
 import csv
+import os
+import sys
 import fixedendpointtest
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'master', 'imu'))
+import quaternions
+
 def read_imu_data(csv_path):
     with open(csv_path, newline='') as f:
         reader = csv.DictReader(f)
@@ -24,19 +29,12 @@ def static_orientation_test(tracker, data_path, expected_angle_deg, axis='z', to
     - axis: Rotation axis ('x', 'y', or 'z')
     - tol_deg: Acceptable tolerance in degrees
     """
-    from scipy.spatial.transform import Rotation as R
-    from collections import deque
-
-    angle_errors = deque()
-
-    for ts, gyro, accel, mag in read_imu_data(data_path):
-        tip, quat, _ = tracker.update(gyro, accel, mag, ts)
-        rot = R.from_quat([quat[1], quat[2], quat[3], quat[0]])  # x,y,z,w
-        euler = rot.as_euler('xyz', degrees=True)
-
-        measured_angle = {'x': euler[0], 'y': euler[1], 'z': euler[2]}[axis]
-        angle_errors.append(measured_angle)
+    # Collect the trajectory, then convert every quaternion in one call
+    quats = np.array([tracker.update(gyro, accel, mag, ts)[1].copy()
+                      for ts, gyro, accel, mag in read_imu_data(data_path)])
+    euler = quaternions.to_euler(quats, degrees=True)   # same as scipy's as_euler('xyz')
 
+    angle_errors = euler[:, 'xyz'.index(axis)]
     avg_measured = np.mean(angle_errors)
     error = abs(avg_measured - expected_angle_deg)
 
@@ -0,0 +1,85 @@
+"""
+Checks the closed-form measurement Jacobians of the orientation EKFs
+(ekf.py and ../minimap/fixedendpointtest.py) against their central-difference
+versions, and times one EKF update with each.
+
+Usage:
+    python bench_jacobians.py [samples]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '..', 'minimap'))
+import ekf
+import fixedendpointtest
+
+
+def check(module, rng, trials=2000):
+    """Max abs difference between analytic and numeric H for random non-unit states."""
+    err_am = err_yaw = 0.0
+    for _ in range(trials):
+        x = np.hstack((rng.normal(size=4) * rng.uniform(0.5, 2.0), rng.normal(size=3) * 0.01))
+        mag = rng.normal(size=3) * 50
+        err_am = max(err_am, np.abs(module.H_jacobian(x) - module.H_jacobian_numeric(x)).max())
+        err_yaw = max(err_yaw, np.abs(module.H_yaw(x, mag) - module.H_yaw_numeric(x, mag)).max())
+    return err_am, err_yaw
+
+
+def time_updates(module, samples, numeric):
+    rng = np.random.default_rng(1)
+    gyro = rng.normal(size=(samples, 3)) * 0.1
+    accel = np.array([0, 0, 9.81]) + rng.normal(size=(samples, 3)) * 0.1
+    mag = np.array([30.0, 5.0, -40.0]) + rng.normal(size=(samples, 3))
+
+    saved = module.H_jacobian, module.H_yaw
+    if numeric:
+        module.H_jacobian, module.H_yaw = module.H_jacobian_numeric, module.H_yaw_numeric
+    try:
+        f = module.OrientationBiasEKF()
+        t0 = time.perf_counter()
+        for i in range(samples):
+            f.predict(gyro[i], 0.01)
+            f.update(accel[i], mag[i])
+        elapsed = time.perf_counter() - t0
+    finally:
+        module.H_jacobian, module.H_yaw = saved
+    return elapsed / samples, f.ekf.x.copy()
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    failed = False
+    for module in (ekf, fixedendpointtest):
+        name = module.__name__
+        err_am, err_yaw = check(module, rng)
+        ok = err_am < 1e-7 and err_yaw < 1e-6
+        failed |= not ok
+        print(f"{name}: max |H analytic - numeric| accel+mag {err_am:.2e}, yaw {err_yaw:.2e}  "
+              f"{'ok' if ok else 'FAIL'}")
+
+        t_num, x_num = time_updates(module, samples, numeric=True)
+        t_ana, x_ana = time_updates(module, samples, numeric=False)
+        print(f"    predict+update: numeric {t_num * 1e6:7.1f} us, analytic {t_ana * 1e6:7.1f} us "
+              f"({t_num / t_ana:.1f}x); final state difference {np.abs(x_num - x_ana).max():.2e}")
+
+        # Jacobian evaluations alone
+        x = np.array([0.9, 0.1, -0.2, 0.3, 0.0, 0.0, 0.0])
+        mag = np.array([30.0, 5.0, -40.0])
+        for label, fn, args in (('H_jacobian', module.H_jacobian, (x,)),
+                                ('H_jacobian_numeric', module.H_jacobian_numeric, (x,)),
+                                ('H_yaw', module.H_yaw, (x, mag)),
+                                ('H_yaw_numeric', module.H_yaw_numeric, (x, mag))):
+            t0 = time.perf_counter()
+            for _ in range(2000):
+                fn(*args)
+            print(f"    {label:<20} {(time.perf_counter() - t0) / 2000 * 1e6:7.1f} us")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
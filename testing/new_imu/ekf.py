@@ -1,18 +1,19 @@
+import os
+import sys
+
 import numpy as np
 import pandas as pd
 from filterpy.kalman import ExtendedKalmanFilter
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'master', 'imu'))
+from quaternions import to_rotation_matrix as quaternion_to_rotation_matrix
+from ekf_jacobians import accmag_jacobian, yaw_jacobian
+from orientation_ekf import OrientationEKF
+from imu_integration import integrate_acceleration
+
 # ——— quaternion utilities ———
 def normalize_quat(q):
-    return q / np.linalg.nxorm(q)
-
-def quaternion_to_rotation_matrix(q):
-    w, x, y, z = q
-    return np.array([
-        [1 - 2*(y*y + z*z),   2*(x*y - z*w),     2*(x*z + y*w)],
-        [2*(x*y + z*w),       1 - 2*(x*x + z*z), 2*(y*z - x*w)],
-        [2*(x*z - y*w),       2*(y*z + x*w),     1 - 2*(x*x + y*y)]
-    ])
+    return q / np.linalg.norm(q)
 
 # ——— measurement & heading models ———
 def acc_mag_prediction(q, g_ref=np.array([0,0,1]), m_ref=np.array([1,0,0])):
@@ -21,7 +22,16 @@ def acc_mag_prediction(q, g_ref=np.array([0,0,1]), m_ref=np.array([1,0,0])):
     m_b = R.T @ (m_ref/np.linalg.norm(m_ref))
     return np.hstack((g_b, m_b))
 
+def h_accmag(x):
+    return acc_mag_prediction(x[0:4])
+
 def H_jacobian(x):
+    """Closed-form accel+mag Jacobian (ekf_jacobians.accmag_jacobian); bias columns are zero."""
+    H = np.zeros((6, x.shape[0]))
+    accmag_jacobian(x[0:4], out=H[:, 0:4])
+    return H
+
+def H_jacobian_numeric(x):
     q = x[0:4]
     eps = 1e-6
     H = np.zeros((6, x.shape[0]))
@@ -37,6 +47,24 @@ def tilt_compensated_heading(mag, q):
     m_nav = R_nav @ mag
     return np.arctan2(m_nav[1], m_nav[0])
 
+def h_yaw(x, mag):
+    return np.array([ tilt_compensated_heading(mag, x[0:4]) ])
+
+def H_yaw(x, mag):
+    """Closed-form heading Jacobian (ekf_jacobians.yaw_jacobian); bias columns are zero."""
+    Hh = np.zeros((1, x.shape[0]))
+    yaw_jacobian(x[0:4], mag, out=Hh[:, 0:4])
+    return Hh
+
+def H_yaw_numeric(x, mag):
+    hy = np.zeros((1,7)); eps=1e-6
+    for i in range(4):
+        dx = np.zeros(7); dx[i]=eps
+        hp = tilt_compensated_heading(mag, normalize_quat(x[0:4]+dx[0:4]))
+        hm = tilt_compensated_heading(mag, normalize_quat(x[0:4]-dx[0:4]))
+        hy[0,i] = (hp-hm)/(2*eps)
+    return hy
+
 # ——— EKF with gyro-bias & compass corrections ———
 class OrientationBiasEKF:
     def __init__(self):
@@ -69,49 +97,40 @@ class OrientationBiasEKF:
         m_n = mag/np.linalg.norm(mag)
         z_am = np.hstack((a_n, m_n))
         self.ekf.R = self.R_accmag
-        self.ekf.update(z_am,
-                        HJacobian=lambda x: H_jacobian(x),
-                        Hx=lambda x: acc_mag_prediction(x[0:4]))
+        self.ekf.update(z_am, HJacobian=H_jacobian, Hx=h_accmag)
         self.ekf.x[0:4] = normalize_quat(self.ekf.x[0:4])
         # yaw-only compass update
         q   = self.ekf.x[0:4]
         yaw_meas = tilt_compensated_heading(mag, q)
-        def h_yaw(x): return np.array([ tilt_compensated_heading(mag, x[0:4]) ])
-        def H_yaw(x):
-            hy = np.zeros((1,7)); eps=1e-6
-            for i in range(4):
-                dx = np.zeros(7); dx[i]=eps
-                hp = tilt_compensated_heading(mag, normalize_quat(x[0:4]+dx[0:4]))
-                hm = tilt_compensated_heading(mag, normalize_quat(x[0:4]-dx[0:4]))
-                hy[0,i] = (hp-hm)/(2*eps)
-            return hy
         self.ekf.R = self.R_yaw
-        self.ekf.update(np.array([yaw_meas]), HJacobian=H_yaw, Hx=h_yaw)
+        self.ekf.update(np.array([yaw_meas]), HJacobian=H_yaw, Hx=h_yaw,
+                        args=(mag,), hx_args=(mag,))
         self.ekf.x[0:4] = normalize_quat(self.ekf.x[0:4])
         return self.ekf.x[0:4]
 
 # ——— Main integration ———
-df = pd.read_csv('testing/new_imu/Trial1_Y_extracted.csv')
-n  = len(df)
-Q = np.zeros((n,4))
-V = np.zeros((n,3))
-P = np.zeros((n,3))
-
-orient_ekf = OrientationBiasEKF()
-for i in range(1, n):
-    dt   = df.at[i,'Timestamp'] - df.at[i-1,'Timestamp']
-    gyr  = df.loc[i, ['Gyro_X','Gyro_Y','Gyro_Z']].values
-    acc  = df.loc[i, ['Accel_X','Accel_Y','Accel_Z']].values
-    mag  = df.loc[i, ['Mag_X','Mag_Y','Mag_Z']].values
-    # update orientation
-    orient_ekf.predict(gyr, dt)
-    q    = orient_ekf.update(acc, mag)
-    Q[i] = q
-    # integrate in world frame
-    Rwb       = quaternion_to_rotation_matrix(q)
-    acc_world = Rwb.dot(acc) - np.array([0,0,9.81])
-    V[i] = V[i-1] + acc_world * dt
-    P[i] = P[i-1] + V[i] * dt
-    # print position at each sample
-    print(f"Time {df.at[i,'Timestamp']:.3f}s -> Position: {P[i].round(4)} m")
+if __name__ == "__main__":
+    df = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Trial1_Y_extracted.csv'))
+    n  = len(df)
+    Q = np.zeros((n,4))
+    Q[0] = [1.0, 0.0, 0.0, 0.0]
+    t   = df['Timestamp'].to_numpy(dtype=float)
+    ACC = df[['Accel_X','Accel_Y','Accel_Z']].to_numpy(dtype=float)
+
+    # OrientationEKF is this filter without filterpy (see master/imu/orientation_ekf.py)
+    orient_ekf = OrientationEKF(accmag_noise=1e-2)
+    for i in range(1, n):
+        dt   = df.at[i,'Timestamp'] - df.at[i-1,'Timestamp']
+        gyr  = df.loc[i, ['Gyro_X','Gyro_Y','Gyro_Z']].values
+        mag  = df.loc[i, ['Mag_X','Mag_Y','Mag_Z']].values
+        # update orientation
+        orient_ekf.predict(gyr, dt)
+        q    = orient_ekf.update(ACC[i], mag)
+        Q[i] = q
 
+    # integrate in world frame, all samples at once
+    acc_world = np.einsum('nij,nj->ni', quaternion_to_rotation_matrix(Q), ACC) - np.array([0,0,9.81])
+    V, P = integrate_acceleration(acc_world, t, method='euler')
+    # print position at each sample
+    for i in range(1, n):
+        print(f"Time {t[i]:.3f}s -> Position: {P[i].round(4)} m")
@@ -0,0 +1,162 @@
+"""
+Bulk loader for the multi-line IMU text logs, e.g. testing/data/4_23_25/*.txt:
+
+    0.100052 s
+    Accel X: 0.07 Y: -0.36 Z: 0.12 m/s^2
+    Mag X: 42.75 Y: 92.25 Z: 132.45uT
+    Gyro X: 0.01 Y: 0.01 Z: -0.00radians/s
+
+The whole file is matched with one multi-line regex, so every row comes from a
+single complete record and the channels can never drift out of alignment.
+Records with a missing or garbled line are skipped and counted instead, as are
+sensor lines that no timestamp line precedes.
+"""
+import re
+from pathlib import Path
+
+import numpy as np
+
+COLUMNS = ['Timestamp',
+           'Accel_X', 'Accel_Y', 'Accel_Z',
+           'Gyro_X', 'Gyro_Y', 'Gyro_Z',
+           'Mag_X', 'Mag_Y', 'Mag_Z']
+
+RECORD_DTYPE = np.dtype([(name, '<f8') for name in COLUMNS])
+
+_NUM = r'(-?\d+(?:\.\d+)?)'
+_XYZ = r'X:\s*' + _NUM + r'\s*Y:\s*' + _NUM + r'\s*Z:\s*' + _NUM
+
+# One complete record: timestamp line, then Accel, Mag and Gyro lines
+RECORD_PATTERN = re.compile(
+    r'^[ \t]*' + _NUM + r' s[ \t]*\n'
+    r'[ \t]*Accel ' + _XYZ + r'\s*m/s\^2[^\n]*\n'
+    r'[ \t]*Mag ' + _XYZ + r'\s*uT[^\n]*\n'
+    r'[ \t]*Gyro ' + _XYZ + r'\s*radians/s',
+    re.MULTILINE)
+TIME_LINE_PATTERN = re.compile(r'^[ \t]*-?\d+(?:\.\d+)? s[ \t]*$', re.MULTILINE)
+SENSOR_LINE_PATTERN = re.compile(r'^[ \t]*(?:Accel|Mag|Gyro)\b', re.MULTILINE)
+# A timestamp line and the run of sensor lines after it, complete or not
+TIME_BLOCK_PATTERN = re.compile(
+    r'^[ \t]*-?\d+(?:\.\d+)? s[ \t]*$(?:\n[ \t]*(?:Accel|Mag|Gyro)\b[^\n]*)*', re.MULTILINE)
+
+# Matched groups are (t, accel, mag, gyro); output columns are (t, accel, gyro, mag)
+_COLUMN_ORDER = [0, 1, 2, 3, 7, 8, 9, 4, 5, 6]
+
+
+def parse_imu_log_text(text, max_examples=10):
+    """
+    Parses the contents of a multi-line IMU log.
+
+    Parameters:
+        text (str): Log contents (any newline convention).
+        max_examples (int): How many malformed record and orphan line numbers
+            to report.
+
+    Returns:
+        tuple: (data, report)
+            data (ndarray): (N, 10) float array in COLUMNS order.
+            report (dict): 'records' complete records parsed,
+                           'malformed' timestamp lines not followed by a
+                           complete Accel/Mag/Gyro block,
+                           'malformed_lines' first few 1-based line numbers,
+                           'orphans' Accel/Mag/Gyro lines with no timestamp
+                           line before them,
+                           'orphan_lines' first few of their line numbers.
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    matches = list(RECORD_PATTERN.finditer(text))
+    if matches:
+        data = np.array([m.groups() for m in matches], dtype=np.float64)[:, _COLUMN_ORDER]
+    else:
+        data = np.empty((0, len(COLUMNS)))
+
+    # Any timestamp line that does not start a complete record is malformed
+    record_starts = np.fromiter((m.start() for m in matches), dtype=np.int64, count=len(matches))
+    time_starts = np.fromiter((m.start() for m in TIME_LINE_PATTERN.finditer(text)), dtype=np.int64)
+    bad = np.setdiff1d(time_starts, record_starts, assume_unique=True)
+
+    # Sensor lines belong to a complete record, or to the partial block after a
+    # malformed timestamp line; anything else has lost its timestamp
+    blocks = list(TIME_BLOCK_PATTERN.finditer(text))
+    block_starts = np.fromiter((m.start() for m in blocks), dtype=np.int64, count=len(blocks))
+    block_ends = np.fromiter((m.end() for m in blocks), dtype=np.int64, count=len(blocks))
+    complete = np.isin(block_starts, record_starts)
+    block_ends[complete] = [m.end() for m in matches]
+    sensor_starts = np.fromiter((m.start() for m in SENSOR_LINE_PATTERN.finditer(text)), dtype=np.int64)
+    orphans = sensor_starts
+    if len(blocks):
+        owner = np.searchsorted(block_starts, sensor_starts, side='right') - 1
+        covered = (owner >= 0) & (sensor_starts < block_ends[np.maximum(owner, 0)])
+        orphans = sensor_starts[~covered]
+
+    def line_numbers(positions):
+        return [text.count('\n', 0, int(pos)) + 1 for pos in positions[:max_examples]]
+
+    report = {
+        'records': len(matches),
+        'malformed': int(bad.size),
+        'malformed_lines': line_numbers(bad),
+        'orphans': int(orphans.size),
+        'orphan_lines': line_numbers(orphans),
+    }
+    return data, report
+
+
+def load_imu_log(path, structured=False):
+    """
+    Loads one multi-line IMU log file.
+
+    Parameters:
+        path (str or Path): Path to the .txt log.
+        structured (bool): Return a RECORD_DTYPE structured array instead of
+            an (N, 10) float array.
+
+    Returns:
+        tuple: (data, report) as returned by parse_imu_log_text().
+    """
+    with open(path, 'r', errors='ignore') as f:
+        data, report = parse_imu_log_text(f.read())
+    if structured:
+        data = to_structured(data)
+    return data, report
+
+
+def load_imu_log_dir(directory, pattern='*.txt', structured=False):
+    """
+    Loads every log in a directory.
+
+    Returns:
+        tuple: (logs, report)
+            logs (dict): file stem -> data array, in sorted file order.
+            report (dict): file stem -> per-file report, plus a 'total' entry
+                with summed 'records', 'malformed' and 'orphans' counts.
+    """
+    logs = {}
+    report = {}
+    total = {'records': 0, 'malformed': 0, 'orphans': 0}
+    for path in sorted(Path(directory).glob(pattern)):
+        data, file_report = load_imu_log(path, structured=structured)
+        logs[path.stem] = data
+        report[path.stem] = file_report
+        total['records'] += file_report['records']
+        total['malformed'] += file_report['malformed']
+        total['orphans'] += file_report['orphans']
+    report['total'] = total
+    return logs, report
+
+
+def to_structured(data):
+    """Views an (N, 10) float array as a RECORD_DTYPE structured array."""
+    return np.ascontiguousarray(data, dtype=np.float64).view(RECORD_DTYPE).reshape(-1)
+
+
+def print_report(name, report):
+    """Prints a one-line summary of a load report."""
+    line = f"{name}: {report['records']} records"
+    if report['malformed']:
+        line += f", {report['malformed']} malformed (lines {report.get('malformed_lines', [])})"
+    if report.get('orphans'):
+        line += (f", {report['orphans']} sensor lines without a timestamp "
+                 f"(lines {report.get('orphan_lines', [])})")
+    print(line)
@@ -1,22 +1,19 @@
+import os
+import sys
+
 import numpy as np
 import pandas as pd
 from ahrs.filters import Madgwick
 
-def quaternion_to_rotation_matrix(q):
-    w, x, y, z = q
-    return np.array([
-        [1 - 2*(y*y + z*z),   2*(x*y - w*z),   2*(x*z + w*y)],
-        [  2*(x*y + w*z),   1 - 2*(x*x + z*z), 2*(y*z - w*x)],
-        [  2*(x*z - w*y),     2*(y*z + w*x), 1 - 2*(x*x + y*y)]
-    ])
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'master', 'imu'))
+from quaternions import to_rotation_matrix as quaternion_to_rotation_matrix
+from imu_integration import integrate_acceleration
 
 # Load your data
 df = pd.read_csv('30cm_trial2_extracted.csv')
 n  = len(df)
 
 Q = np.zeros((n, 4))
-V = np.zeros((n, 3))
-P = np.zeros((n, 3))
 
 # Initialize Madgwick filter
 madgwick       = Madgwick()        # you can also pass beta=… or an initial sampleperiod here
@@ -38,12 +35,11 @@ for i in range(1, n):
     # Update orientation (no dt argument here!)
     Q[i] = madgwick.updateMARG(Q[i-1], gyr=gyr, acc=acc, mag=mag)
 
-    # Rotate accel into world frame
-    Rwb       = quaternion_to_rotation_matrix(Q[i])
-    acc_world = Rwb.dot(acc)
+# Rotate accel into world frame, every sample at once
+ACC       = df[['Accel_X','Accel_Y','Accel_Z']].to_numpy(dtype=float)
+acc_world = np.einsum('nij,nj->ni', quaternion_to_rotation_matrix(Q), ACC)
 
-    # Integrate velocity & position
-    V[i] = V[i-1] + acc_world * dt
-    P[i] = P[i-1] + V[i] * dt
+# Integrate velocity & position (V[i] = V[i-1] + a[i] dt, P[i] = P[i-1] + V[i] dt)
+V, P = integrate_acceleration(acc_world, df['Timestamp'].to_numpy(dtype=float), method='euler')
 
 print("Final displacement (m):", P[-1])
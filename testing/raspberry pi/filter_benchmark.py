@@ -0,0 +1,102 @@
+"""
+Throughput and memory of the orientation filters in the constrained mode
+(master/imu/fixed_budget.py), for sizing IMU sample rates before deploying
+on the Pi. Run it on the Pi itself; desktop numbers do not transfer.
+
+For every filter in float64 and float32 it reports:
+    samples/s     1 / mean CPU time per sample
+    max rate      the highest IMU rate whose budget the p99 sample time fits
+    overruns      samples over the budget at --rate
+    state         bytes of filter state and work buffers
+    peak alloc    peak Python/NumPy allocation inside the loop (tracemalloc),
+                  i.e. the temporaries one sample creates
+    error         mean attitude error on the simulated recording, and the
+                  largest float32 vs float64 difference
+and the process's peak resident memory at the end.
+
+Usage:
+    python filter_benchmark.py [--samples 20000] [--rate 100] [--filters madgwick ekf error_state]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'master', 'imu'))
+from fixed_budget import FILTERS, BudgetedFilter
+from orientation_ekf import attitude_error_deg, simulate_recording
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:      # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run(name, dtype, gyro, accel, mag, dt, rate):
+    f = BudgetedFilter(name, rate_hz=rate, dtype=dtype, report_interval=None)
+    n = len(gyro)
+    out = np.empty((n, 4))
+    durations = np.empty(n)
+    rows = zip(gyro.tolist(), accel.tolist(), mag.tolist())
+    clock = time.perf_counter
+
+    # Allocation churn over the first samples (tracemalloc slows the loop, so
+    # the timed run below is separate)
+    probe = BudgetedFilter(name, rate_hz=rate, dtype=dtype, report_interval=None)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(min(n, 1000)):
+        probe.step(gyro[i], accel[i], mag[i], dt)
+    churn = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    for i, (g, a, m) in enumerate(rows):
+        t0 = clock()
+        out[i] = f.step(g, a, m, dt)
+        durations[i] = clock() - t0
+    return f, out, durations, churn
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--rate', type=float, default=100.0, help='IMU rate (Hz) whose budget is checked')
+    parser.add_argument('--filters', nargs='+', choices=FILTERS, default=list(FILTERS))
+    args = parser.parse_args()
+
+    dt = 1.0 / args.rate
+    q_true, gyro, accel, mag = simulate_recording(args.samples, dt)
+
+    print(f"{args.samples} simulated samples, budget {dt * 1e3:.3f} ms per sample ({args.rate:g} Hz)")
+    print(f"{'filter':<12} {'dtype':<8} {'samples/s':>10} {'mean us':>8} {'p99 us':>8} {'max rate':>9} "
+          f"{'overruns':>9} {'state B':>8} {'peak alloc B':>13} {'error deg':>10} {'vs f64 deg':>10}")
+    for name in args.filters:
+        reference = None
+        for dtype in (np.float64, np.float32):
+            f, q, durations, churn = run(name, dtype, gyro, accel, mag, dt, args.rate)
+            r = f.report()
+            p99 = np.percentile(durations, 99)
+            error = attitude_error_deg(q, q_true).mean()
+            if reference is None:
+                reference, drift = q, 0.0
+            else:
+                drift = attitude_error_deg(q, reference).max()
+            print(f"{name:<12} {r['dtype']:<8} {r['samples_per_s']:>10.0f} {r['mean_us']:>8.1f} {p99 * 1e6:>8.1f} "
+                  f"{1.0 / p99:>7.0f}Hz {r['overruns']:>9} {r['state_bytes']:>8} {churn:>13} "
+                  f"{error:>10.3f} {drift:>10.4f}")
+
+    rss = peak_rss_kb()
+    if rss is not None:
+        print(f"peak resident memory: {rss / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())